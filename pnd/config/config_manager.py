@@ -28,6 +28,13 @@ class ConfigManager:
         self.db_type = None
         self.proj_nm = None
         self.proj_gr_nm = None
+        self.pool_min = None
+        self.pool_max = None
+        self.catalog_ttl = None
+        self.catalog_persist = None
+        self.profile_concurrency = None
+        self.profile_retries = None
+        self.profile_backoff = None
         self.__set_config_manager(self.__config_name)
 
         self.creds = None
@@ -55,6 +62,13 @@ class ConfigManager:
             self.db_type = '' if 'database_type' not in self.__config_manager[conf_name][0] else self.__config_manager[conf_name][0]["database_type"]
             self.proj_nm = '' if 'project_name' not in self.__config_manager[conf_name][0] else self.__config_manager[conf_name][0]["project_name"]
             self.proj_gr_nm = '' if 'project_gr_name' not in self.__config_manager[conf_name][0] else self.__config_manager[conf_name][0]["project_gr_name"]
+            self.pool_min = 1 if 'pool_min_size' not in self.__config_manager[conf_name][0] else int(self.__config_manager[conf_name][0]["pool_min_size"])
+            self.pool_max = 4 if 'pool_max_size' not in self.__config_manager[conf_name][0] else int(self.__config_manager[conf_name][0]["pool_max_size"])
+            self.catalog_ttl = 300 if 'catalog_ttl' not in self.__config_manager[conf_name][0] else int(self.__config_manager[conf_name][0]["catalog_ttl"])
+            self.catalog_persist = False if 'catalog_persist' not in self.__config_manager[conf_name][0] else bool(self.__config_manager[conf_name][0]["catalog_persist"])
+            self.profile_concurrency = 16 if 'profile_concurrency' not in self.__config_manager[conf_name][0] else int(self.__config_manager[conf_name][0]["profile_concurrency"])
+            self.profile_retries = 3 if 'profile_retries' not in self.__config_manager[conf_name][0] else int(self.__config_manager[conf_name][0]["profile_retries"])
+            self.profile_backoff = 5 if 'profile_backoff' not in self.__config_manager[conf_name][0] else float(self.__config_manager[conf_name][0]["profile_backoff"])
             self.__logger.info("Configure to config manager SUCCESSED. [category = '{}' | source = '{}' | query = '{}' | databaseType = '{}' | project = '{}']".format(self.cred_cat, self.cred_src, self.query_src, self.db_type, self.proj_nm))
         except Exception as e:
             self.__logger.error("Failed to configure config manager. - {}".format(e))
@@ -17,4 +17,12 @@ class Base(metaclass=ABCMeta) :
 
     @abstractmethod
     def execute(self, sql, bindvars=None, commit=False) :
+        pass
+
+    @abstractmethod
+    def ping(self) :
+        pass
+
+    @abstractmethod
+    def rollback(self) :
         pass
\ No newline at end of file
@@ -0,0 +1,129 @@
+import os
+import sys
+import atexit
+import threading
+from contextlib import contextmanager
+from oracle import Oracle
+from hive2 import Hive2
+
+current_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(current_path + '/../config')
+from pnd_logger import PndLogger
+
+os.putenv('NLS_LANG', 'KOREAN_KOREA.AL32UTF8')
+
+class ConnectionPool:
+    """
+    Session pool of connected Oracle / Hive2 objects for one ConfigManager source.
+    Sessions are validated with ping() on checkout and replaced if dead.
+    """
+    def __init__(self, conf_manager, logger_name=None) :
+        self.__logger = PndLogger("Connection Pool Class", logger_name)
+        self.__logger_name = logger_name
+        self.__cm = conf_manager
+        self.min_size = conf_manager.pool_min if conf_manager.pool_min != None else 1
+        self.max_size = conf_manager.pool_max if conf_manager.pool_max != None else 4
+        if self.max_size < 1 : self.max_size = 1
+        if self.min_size > self.max_size : self.min_size = self.max_size
+
+        self.__lock = threading.Lock()
+        self.__slots = threading.BoundedSemaphore(self.max_size)
+        self.__idle = []
+        self.__opened = 0
+        self.__prepare()
+
+    def __new_session(self) :
+        if self.__cm.db_type == 'hive' :
+            database = Hive2(self.__cm, self.__logger_name)
+        else :
+            database = Oracle(self.__cm, self.__logger_name)
+        database.connect()
+        with self.__lock :
+            self.__opened += 1
+        return database
+
+    def __close_session(self, database) :
+        try :
+            database.disconnect()
+        except Exception as e :
+            self.__logger.debug(e)
+        with self.__lock :
+            self.__opened -= 1
+
+    # min size 만큼 미리 연결
+    def __prepare(self) :
+        for i in range(0, self.min_size) :
+            try :
+                self.__idle.append(self.__new_session())
+            except Exception as e :
+                self.__logger.error("Failed to open pooled session. - {}".format(e))
+                break
+        self.__logger.info("Connection pool ready. [source = '{}' | min = {} | max = {} | opened = {}]".format(self.__cm.cred_src, self.min_size, self.max_size, self.__opened))
+
+    def acquire(self, timeout=None) :
+        if not self.__slots.acquire(timeout=timeout) :
+            raise TimeoutError("No pooled session available for '{}'".format(self.__cm.cred_src))
+        try :
+            database = None
+            while database == None :
+                with self.__lock :
+                    database = self.__idle.pop() if len(self.__idle) > 0 else None
+                if database == None :
+                    return self.__new_session()
+                if not database.ping() :
+                    self.__logger.info("Discard invalid pooled session. [source = '{}']".format(self.__cm.cred_src))
+                    self.__close_session(database)
+                    database = None
+            return database
+        except Exception :
+            self.__slots.release()
+            raise
+
+    def release(self, database, discard=False) :
+        if database == None :
+            return
+        try :
+            if discard :
+                self.__close_session(database)
+            else :
+                database.rollback()
+                with self.__lock :
+                    self.__idle.append(database)
+        finally :
+            self.__slots.release()
+
+    @contextmanager
+    def session(self, timeout=None) :
+        database = self.acquire(timeout)
+        try :
+            yield database
+        finally :
+            # 오류가 난 session도 반환하고, 다음 checkout의 ping으로 검증
+            self.release(database)
+
+    def close(self) :
+        with self.__lock :
+            idle = self.__idle
+            self.__idle = []
+        for database in idle :
+            self.__close_session(database)
+
+# source별 pool. fork된 worker process는 부모의 session을 쓰지 않도록 pid로 구분
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(conf_manager, logger_name=None) :
+    key = (os.getpid(), conf_manager.cred_cat, conf_manager.cred_src)
+    with _pools_lock :
+        if key not in _pools :
+            _pools[key] = ConnectionPool(conf_manager, logger_name)
+        return _pools[key]
+
+def close_pools() :
+    with _pools_lock :
+        keys = [key for key in _pools if key[0] == os.getpid()]
+        pools = [_pools.pop(key) for key in keys]
+    for pool in pools :
+        pool.close()
+
+atexit.register(close_pools)
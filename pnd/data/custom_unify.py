@@ -2,15 +2,15 @@ import os
 import sys
 import logging
 import json
-import requests
 import tamr_unify_client as api
 from tamr_unify_client.auth import UsernamePasswordAuth
 from urllib.parse import quote 
 
 current_path = os.path.dirname(os.path.realpath(__file__))
 
-sys.path.append(current_path + '/../src/')
+sys.path.append(current_path + '/../../src/')
 from unify import Unify
+from http_session import get_session
 
 sys.path.append(current_path + '/../config/')
 from config_manager import ConfigManager
@@ -42,7 +42,9 @@ class CustomUnify:
 
     def __set_unify(self) :
         try:
-            self.unify = Unify(self._creds["protocol"], self._creds["hostname"], self._creds["port"], self._creds["grPort"], self._creds["user"], self._creds["pwd"])            
+            # dataset catalog은 catalog_persist이면 cache 폴더에 저장하여 다른 process와 공유
+            catalog_path = os.path.abspath(current_path + "/../../cache/unify_catalog_{}.json".format(self._creds["hostname"])) if self.__cm.catalog_persist else None
+            self.unify = Unify(self._creds["protocol"], self._creds["hostname"], self._creds["port"], self._creds["grPort"], self._creds["user"], self._creds["pwd"], self.__cm.catalog_ttl, catalog_path)
         except Exception as e:
             self.__logger.info("Failed to configure Unify. - {}".format(e))
         return
@@ -51,11 +53,9 @@ class Versioned:
     def __init__(self, logger_name, unify):
         self.__logger = PndLogger("Unify-Versioned", logger_name)
         self.__unify = unify
-        self.__all_datasets = unify.get_datasets()
     
     def is_exist_dataset(self, dataset_name) :        
-        dataset = [dataset for dataset in self.__all_datasets if dataset["name"] == dataset_name]
-        return True if len(dataset) > 0 else False
+        return self.__unify.get_catalog_entry(dataset_name) != None
 
     def get_stream_dataset(self, dataset_name) :
         dataset_list = []
@@ -98,16 +98,16 @@ class Versioned:
 
     def get_dataset_metadata(self) :
         dataset_list = []
-        for dataset in self.__all_datasets :
-            if "_column_metadata" in dataset["name"] and "sample" not in dataset["name"] and ".csv" not in dataset["name"]:
-                dataset_list.append(dataset["name"])
+        for name in self.__unify.get_catalog() or {} :
+            if "_column_metadata" in name and "sample" not in name and ".csv" not in name:
+                dataset_list.append(name)
         return dataset_list
 
     def get_dataset_profiled(self) :
         dataset_list = []
-        for dataset in self.__all_datasets :
-            if "_column_metadata_profiled" in dataset["name"] and "sample" not in dataset["name"] :
-                dataset_list.append(dataset["name"])
+        for name in self.__unify.get_catalog() or {} :
+            if "_column_metadata_profiled" in name and "sample" not in name :
+                dataset_list.append(name)
         return dataset_list
 
     def get_projects(self):
@@ -115,7 +115,7 @@ class Versioned:
         headers = {"Content-Type": "application/json", "Accept": "application/json", "Authorization": self.__unify._basicCreds}
 
         try:
-            response = requests.get(url, headers=headers)
+            response = get_session().get(url, headers=headers)
             if response.status_code == 200:
                 return json.loads(response.text)
             else:
@@ -142,7 +142,7 @@ class Dedup:
                 } 
                 url = self.__unify._baseUrl + "/api/dedup/pairs/{}".format(unified_dataset)
                 headers = {"Content-Type": "application/json", "Accept": "application/json", "Authorization": self.__unify._basicCreds}
-                response = requests.get(url, params = params, headers=headers)
+                response = get_session().get(url, params = params, headers=headers)
                 if response.status_code == 200:
                     dataset_list.append(json.loads(response.text))
 
@@ -162,7 +162,7 @@ class Dedup:
                 for item in pair['items'] :
                     json_list.append("{}|{}|{}|{}".format(str(item['datasetName1']), str(item['transactionId1']), str(item['datasetName2']), str(item['transactionId2'])))
 
-            response = requests.post(url, json = json_list, headers=headers)
+            response = get_session().post(url, json = json_list, headers=headers)
             if response.status_code == 200:
                 dataset_list.append(json.loads(response.text))
 
@@ -179,7 +179,7 @@ class Dedup:
 
         try:
             self.__logger.info(json.dumps(persistent_ids))
-            response = requests.post(url, headers=headers, data=json.dumps(persistent_ids))
+            response = get_session().post(url, headers=headers, data=json.dumps(persistent_ids))
             if response.status_code == 200:
                 return True
             else:
@@ -212,7 +212,7 @@ class Dedup:
         url = self.__unify._baseUrl + "/api/dedup/pairs/labels/{}?".format(datasetName)
         headers = {"Content-Type": "application/json", "Accept": "application/json", "Authorization": self.__unify._basicCreds}
         try:            
-            response = requests.get(url, headers=headers)
+            response = get_session().get(url, headers=headers)
             if response.status_code == 200:
                 for item in response.iter_lines() :                    
                     dataset_list.append(json.loads(item))
@@ -226,7 +226,7 @@ class Dedup:
         url = self.__unify._baseUrl + "/api/dedup/pairs/labels/{}?includeUserResponse=false".format(datasetName)        
         headers = {"Content-Type": "application/json", "Accept": "application/json", "Authorization": self.__unify._basicCreds}
         try:            
-            response = requests.post(url, headers=headers, data=datasets)
+            response = get_session().post(url, headers=headers, data=datasets)
             if 200 <= int(response.status_code) and int(response.status_code) < 200 :
                 self.__logger.error("Failed to uploading mastering labels. - {}".format(response.status_code))                
             else:
@@ -239,17 +239,16 @@ class Dataset :
     def __init__(self, logger_name, unify):
         self.__logger = PndLogger("Unify-Dataset", logger_name)
         self.__unify = unify
-        self.__all_datasets = unify.get_datasets()
 
     def delete_dataset(self, dataset_name) :
-        dataset = [dataset for dataset in self.__all_datasets if dataset["name"] == dataset_name]
-        if len(dataset) == 1:
-            dataset_id = dataset[0]["id"].split("/")[-1]
+        dataset_id = self.__unify.get_dataset_id(dataset_name)
+        if dataset_id != None:
             url = self.__unify._baseUrl + "/api/dataset/datasets/{}".format(dataset_id)
             headers = {"Content-Type": "application/json", "Accept": "application/json", "Authorization": self.__unify._basicCreds}            
             try:
-                response = requests.post(url, headers=headers)
+                response = get_session().post(url, headers=headers)
                 if response.status_code == 200:
+                    self.__unify.invalidate_catalog()
                     self.__logger.info("Delete {} dataset SUCCESSED.".format(dataset_name))
                 else:
                     self.__logger.error(response.text)
@@ -261,13 +260,26 @@ class Dataset :
                 yield None
         return
     
+    # table_names의 record ID 목록 (TABLE_NAME -> record ID 목록). 실패하면 None
+    def get_table_record_ids(self, dataset_name, table_names) :
+        table_names = set(table_names)
+        if len(table_names) == 0 :
+            return {}
+        def group(record) :
+            table_name = ''.join(record["TableName"]).upper()
+            return table_name if table_name in table_names else None
+        return self.__unify.get_record_ids(dataset_name, group)
+
+    # record ID로 삭제. 실패하면 None
+    def delete_record_ids(self, dataset_name, record_ids) :
+        return self.__unify.delete_record_ids(dataset_name, record_ids)
+
     def truncate_dataset(self, dataset_name) :
-        dataset = [dataset for dataset in self.__all_datasets if dataset["name"] == dataset_name]
-        if len(dataset) == 1:            
+        if self.__unify.get_dataset_id(dataset_name) != None:            
             url = self.__unify._baseUrl + "/api/dataset/datasets/{}/truncate".format(dataset_name)
             headers = {"Content-Type": "application/json", "Accept": "application/json", "Authorization": self.__unify._basicCreds}            
             try:
-                response = requests.post(url, headers=headers)
+                response = get_session().post(url, headers=headers)
                 if response.status_code == 200:
                     self.__logger.info("Truncated {} dataset SUCCESSED.".format(dataset_name))                    
                 else:
@@ -288,7 +300,7 @@ class Persistence :
         try:            
             url = self.__unify._baseUrl + "/api/persistence/ns/{}/streaming-query".format(namespace)
             headers = {"Content-Type": "application/json", "Accept": "application/json", "Authorization": self.__unify._basicCreds}                        
-            response = requests.post(url, headers=headers, data=json.dumps(data))
+            response = get_session().post(url, headers=headers, data=json.dumps(data))
             
             if response.status_code == 200:
                 for row in json.loads(json.dumps(response.text)).split("\n") :
@@ -6,12 +6,17 @@ import json
 import datetime
 import time
 import math
+import hashlib
 import multiprocessing
+import threading
+import queue
 
 current_path = os.path.dirname(os.path.realpath(__file__))
 from oracle import Oracle
 from hive2 import Hive2
 from custom_unify import CustomUnify
+from connection_pool import get_pool, close_pools
+from export_snapshot import ExportSnapshot
 
 sys.path.append(current_path + '/../config')
 from config_manager import ConfigManager
@@ -24,40 +29,36 @@ class DataManager:
         self.__logger_name = logger_name
         self.__logger = PndLogger("Data Manager Class", logger_name)
         self.__cm = config_manager
-        self.__unify = CustomUnify(ConfigManager('unify'), logger_name)
+        self.__cm_unify = ConfigManager('unify')
+        self.__unify = CustomUnify(self.__cm_unify, logger_name)
         self.__database = None
 
+    # source별 session pool에서 session을 가져옴. 이미 가져온 session이 있으면 재사용
     def connect(self) :
-        try :            
-            if self.__cm.db_type == 'hive' :
-                self.__database = Hive2(self.__cm, self.__logger_name)
-
-            if self.__cm.db_type == 'oracle' :
-                self.__database = Oracle(self.__cm, self.__logger_name)
-
-            self.__database.connect()            
+        try :
+            if self.__database == None :
+                self.__database = get_pool(self.__cm, self.__logger_name).acquire()
         except Exception as e :
             self.__logger.error("Failed to connect database. - {}".format(e))
 
+    # session을 pool에 반환
     def disconnect(self) :
         if self.__database != None :
-            self.__database.disconnect()
+            get_pool(self.__cm, self.__logger_name).release(self.__database)
+            self.__database = None
     
     # query를 실행
     def execute_query(self, query) :
         try:
-            self.connect()
-            data_list = self.__database.execute(query)
-            self.disconnect()
-            return data_list
+            with get_pool(self.__cm, self.__logger_name).session() as database :
+                return database.execute(query)
         except Exception as e:
             self.__logger.error("Failed to execute query. - {}".format(query))
     
     def execute_query_with_params(self, query, bindvars) :
         try:            
-            self.connect()
-            self.__database.execute(query, bindvars, True)                        
-            self.disconnect()
+            with get_pool(self.__cm, self.__logger_name).session() as database :
+                database.execute(query, bindvars, True)
             return True
         except Exception as e:
             self.__logger.error("Failed to execute query. - {}".format(e))
@@ -105,23 +106,96 @@ class DataManager:
 
     def get_all_table_columns(self) :
         try:
-            data_list = []
-            tables = self.get_all_tables()
-            for table in tables :
-                table_columns = {"TABLE_NAME": table, "COLUMN_NAMES": []}                
-                statement = self.__cm.queries["getAllColumns"].format(table)                
-                cols = self.execute_query(statement)                
-                for col in cols :
-                    if type(col) == dict :
-                        if table == col["TABLE_NAME"] :
-                            table_columns["COLUMN_NAMES"].append(col["COLUMN_NAME"].upper())
-                    else :
-                        table_columns["COLUMN_NAMES"].append(col.upper())
-                data_list.append(table_columns)                
-            return data_list
+            catalog = self.get_catalog_columns()
+            if catalog == None :
+                return None
+            return [{"TABLE_NAME": table, "COLUMN_NAMES": columns} for table, columns in catalog.items()]
         except Exception as e:
             self.__logger.error(e)
 
+    # table -> 컬럼 목록. getCatalogColumns가 있으면 전체 catalog를 한 번에 조회해서 table별로 모음
+    def get_catalog_columns(self) :
+        if "getCatalogColumns" not in self.__cm.queries :
+            if self.__cm.db_type == 'hive' :
+                return self.__get_catalog_columns_by_database()
+            return self.__get_catalog_columns_by_table()
+
+        if self.__cm.db_type == 'hive' :
+            # "database.table.column" 한 row씩 (information_schema / metastore)
+            databases = set([db.upper() for db in self.get_all_databases()])
+            catalog = dict()
+            for row in self.execute_query(self.__cm.queries["getCatalogColumns"]) :
+                db, table, column = row.split('.', 2)
+                if db.upper() not in databases :
+                    continue
+                catalog.setdefault("{}.{}".format(db.upper(), table.upper()), []).append(column.upper())
+        else :
+            catalog = dict([(table, []) for table in self.get_all_tables()])
+            for col in self.execute_query(self.__cm.queries["getCatalogColumns"]) :
+                if col["TABLE_NAME"] in catalog :
+                    catalog[col["TABLE_NAME"]].append(col["COLUMN_NAME"].upper())
+        self.__logger.info("Get catalog columns SUCCESSED. [tables = {} | columns = {}]".format(len(catalog), sum([len(columns) for columns in catalog.values()])))
+        return catalog
+
+    # table마다 getAllColumns를 실행 (getCatalogColumns가 없는 oracle source)
+    def __get_catalog_columns_by_table(self) :
+        catalog = dict()
+        for table in self.get_all_tables() :
+            catalog[table] = []
+            for col in self.execute_query(self.__cm.queries["getAllColumns"].format(table)) :
+                if type(col) == dict :
+                    if table == col["TABLE_NAME"] :
+                        catalog[table].append(col["COLUMN_NAME"].upper())
+                else :
+                    catalog[table].append(col.upper())
+        return catalog
+
+    # database별 table/column 조회를 pool session 수만큼 동시에 실행 (getCatalogColumns가 없는 hive source)
+    def __get_catalog_columns_by_database(self) :
+        pool = get_pool(self.__cm, self.__logger_name)
+        databases = self.get_all_databases()
+        tasks = queue.Queue()
+        for db in databases :
+            tasks.put(db)
+        lock = threading.Lock()
+        results = dict()
+        failed = []
+
+        def worker() :
+            while True :
+                try :
+                    db = tasks.get_nowait()
+                except queue.Empty :
+                    break
+                try :
+                    columns = dict()
+                    with pool.session() as database :
+                        for t in database.execute(self.__cm.queries["getAllTables"].format(db)) :
+                            table = "{}.{}".format(db.upper(), t.upper())
+                            columns[table] = [col.upper() for col in database.execute(self.__cm.queries["getAllColumns"].format(table))]
+                    with lock :
+                        results[db] = columns
+                except Exception as e :
+                    self.__logger.error("Failed to get columns of database '{}'. - {}".format(db, e))
+                    with lock :
+                        failed.append(db)
+
+        threads = [threading.Thread(target=worker) for i in range(0, min(pool.max_size, len(databases)))]
+        for thread in threads :
+            thread.start()
+        for thread in threads :
+            thread.join()
+        # 일부 database만 있는 catalog로 테이블 목록을 갱신하지 않도록 실패로 처리
+        if len(failed) > 0 :
+            self.__logger.error("Failed to get columns of {}/{} databases. [databases = {}]".format(len(failed), len(databases), sorted(failed)))
+            return None
+
+        # database 순서대로 합침
+        catalog = dict()
+        for db in databases :
+            catalog.update(results.get(db, dict()))
+        return catalog
+
     # database에 적재되어 있는 metadata profiled 데이터의 테이블 갯수, row, column 갯수 데이터.
     def get_info_tables(self) :
         try:
@@ -129,6 +203,9 @@ class DataManager:
             statement = self.__cm.queries["getInfoTables"].format(self.__cm.cred_src)            
             if self.__cm.db_type == 'hive' :                
                 table_cols = self.get_all_table_columns()
+                if table_cols == None :
+                    self.__logger.error("Failed to get info tables. No catalog columns. [source = {}]".format(self.__cm.cred_src))
+                    return None
                 for t in table_cols :
                     temp = t["TABLE_NAME"].split('.')
                     table = {'DB_TYPE': 'HIVE', 'DB_NAME': '', 'SOURCE': self.__cm.cred_src.upper(), 'TABLE_NAME': '', 'ORIGIN_TABLE_NAME': '', 'ROW_CNT': 0, 'COL_CNT': 0, 'CREATE_DT': datetime.datetime.now().strftime('%Y-%m-%d'), 'IS_RELOAD': 0, 'COLUMN_NAMES1': '', 'COLUMN_NAMES2': ''}
@@ -149,19 +226,22 @@ class DataManager:
                     data_list.append(table)                
             else :
                 tables = self.execute_query(statement)                
-                cols = self.get_all_table_columns()                
+                catalog = self.get_catalog_columns()
+                if catalog == None :
+                    self.__logger.error("Failed to get info tables. No catalog columns. [source = {}]".format(self.__cm.cred_src))
+                    return None
                 for t in tables :
                     table = {'DB_TYPE': t['DB_TYPE'], 'DB_NAME': t['DB_NAME'], 'SOURCE': t['SOURCE'], 'TABLE_NAME': t['TABLE_NAME'], 'ORIGIN_TABLE_NAME': '{}.{}'.format(t['DB_NAME'], t['TABLE_NAME']), 'ROW_CNT': t['ROW_CNT'], 'COL_CNT': t['COL_CNT'], 'CREATE_DT': datetime.datetime.now().strftime('%Y-%m-%d'), 'IS_RELOAD': 0, 'COLUMN_NAMES1': '', 'COLUMN_NAMES2': ''}
-                    for col in cols :
-                        if t["TABLE_NAME"] == col["TABLE_NAME"] :
-                            if len(','.join(col["COLUMN_NAMES"])) < 4000 :
-                                table["COLUMN_NAMES1"] = ','.join(col["COLUMN_NAMES"])
-                                table["COLUMN_NAMES2"] = ''
-                            else :
-                                n = len(col["COLUMN_NAMES"])
-                                half = int(n/2) # py3
-                                table["COLUMN_NAMES1"] = ','.join(col["COLUMN_NAMES"][:half])
-                                table["COLUMN_NAMES2"] = ','.join(col["COLUMN_NAMES"][n-half:])
+                    columns = catalog.get(t["TABLE_NAME"])
+                    if columns != None :
+                        if len(','.join(columns)) < 4000 :
+                            table["COLUMN_NAMES1"] = ','.join(columns)
+                            table["COLUMN_NAMES2"] = ''
+                        else :
+                            n = len(columns)
+                            half = int(n/2) # py3
+                            table["COLUMN_NAMES1"] = ','.join(columns[:half])
+                            table["COLUMN_NAMES2"] = ','.join(columns[n-half:])
                     data_list.append(table)
             return data_list
         except Exception as e:
@@ -184,6 +264,7 @@ class DataManager:
                 failed = failed + 1
                 failed_tables.append(table["TABLE_NAME"])
         results[idx] = result_tables        
+        close_pools()
         self.__logger.debug("NO:[{:>2}] ({}/{}/{}) FAILED TABLES={}".format(result_tables[0]["THREAD_NO"], successed, total, failed, failed_tables))        
 
     def get_table_cnt(self, tables, results, idx) :        
@@ -220,6 +301,7 @@ class DataManager:
                 failed = failed + 1
                 failed_tables.append(table["TABLE_NAME"])            
         results[idx] = result_tables        
+        close_pools()
         if len(result_tables) > 0 :
             self.__logger.info("NO:[{:>2}] ({}/{}/{}) FAILED TABLES={}".format(result_tables[0]["THREAD_NO"], successed, total, failed, failed_tables))
         else :
@@ -232,10 +314,8 @@ class DataManager:
             
             if self.__cm.db_type == 'hive' :
                 cm = ConfigManager("tamr")
-                database = Oracle(cm)
-                database.connect()
-                data_list = database.execute(statement)
-                database.disconnect()
+                with get_pool(cm, self.__logger_name).session() as database :
+                    data_list = database.execute(statement)
             else :
                 data_list = self.execute_query(statement)
             self.__logger.info("Get table status SUCCESSED.")
@@ -243,43 +323,110 @@ class DataManager:
         except Exception as e:
             self.__logger.error("Failed to table status. - {}".format(e))        
 
-    def get_table_columns(self) :
+    # table_names를 주면 해당 테이블의 컬럼만 조회
+    # hive source의 테이블별 컬럼 목록 row (tamr DB의 getTableColumns, COLUMN_NAMES1/2)
+    def __get_hive_table_rows(self) :
+        cm = ConfigManager("tamr")
+        statement = cm.queries["getTableColumns"].format(source = self.__cm.cred_src.upper())
+        with get_pool(cm, self.__logger_name).session() as database :
+            return database.execute(statement)
+
+    # hive table row를 컬럼 row로 펼침. table_names가 있으면 그 테이블만
+    @staticmethod
+    def __hive_table_columns(tables, table_names=None) :
+        data_list = []
+        names = None if table_names == None else set(table_names)
+        for t in tables :
+            if names != None and t["TABLE_NAME"] not in names :
+                continue
+            cols = "{},{}".format(t["COLUMN_NAMES1"], t["COLUMN_NAMES2"]).split(",")                    
+            for col in cols :
+                table = {"TABLE_NAME" : t["TABLE_NAME"], "COLUMN_NAME": col, "TABLE_COLUMN": "{}-{}".format(t["TABLE_NAME"], col),  "SYS_GBN_CD": "", "MST_TYP_ENG": "", "TABLE_KO_NM": "", "ATTR_EN_NM": "", "COL_KO_NM": "", "COL_DESC": ""}
+                data_list.append(table)
+        return data_list
+
+    def get_table_columns(self, table_names=None) :
         try:
             data_list = []
             if self.__cm.db_type == 'hive' :
-                cm = ConfigManager("tamr")
-                statement = cm.queries["getTableColumns"].format(source = self.__cm.cred_src.upper())
-                database = Oracle(cm)
-                database.connect()
-                tables = database.execute(statement)
-                database.disconnect()                
-                for t in tables :
-                    cols = "{},{}".format(t["COLUMN_NAMES1"], t["COLUMN_NAMES2"]).split(",")                    
-                    for col in cols :
-                        table = {"TABLE_NAME" : t["TABLE_NAME"], "COLUMN_NAME": col, "TABLE_COLUMN": "{}-{}".format(t["TABLE_NAME"], col),  "SYS_GBN_CD": "", "MST_TYP_ENG": "", "TABLE_KO_NM": "", "ATTR_EN_NM": "", "COL_KO_NM": "", "COL_DESC": ""}
-                        data_list.append(table)
-            else :
+                data_list = self.__hive_table_columns(self.__get_hive_table_rows(), table_names)
+            elif table_names == None :
                 statement = self.__cm.queries["getTableColumns"]
                 tables = self.execute_query(statement)                
                 data_list.extend(tables)
+            else :
+                # IN 목록은 1000개까지
+                for offset in range(0, len(table_names), 1000) :
+                    names = ",".join(["'{}'".format(str(name).replace("'", "''")) for name in table_names[offset:offset + 1000]])
+                    statement = "SELECT * FROM ({}) WHERE TABLE_NAME IN ({})".format(self.__cm.queries["getTableColumns"], names)
+                    tables = self.execute_query(statement)
+                    data_list.extend(tables)
 
             return data_list
         except Exception as e:
             self.__logger.error(e)        
 
+    # 테이블별 schema fingerprint (table -> fingerprint). getTableFingerprints가 없는 source는 None
+    # hive는 이미 조회한 table row(tables)가 있으면 다시 조회하지 않음
+    def get_table_fingerprints(self, tables=None) :
+        try:
+            fingerprints = dict()
+            if self.__cm.db_type == 'hive' :
+                if tables == None :
+                    tables = self.__get_hive_table_rows()
+                for t in tables :
+                    fingerprints[t["TABLE_NAME"]] = hashlib.md5("{},{}".format(t["COLUMN_NAMES1"], t["COLUMN_NAMES2"]).encode('utf-8')).hexdigest()
+            else :
+                if "getTableFingerprints" not in self.__cm.queries :
+                    return None
+                tables = self.execute_query(self.__cm.queries["getTableFingerprints"])
+                for t in tables :
+                    fingerprints[t["TABLE_NAME"]] = str(t["FINGERPRINT"])
+            return fingerprints
+        except Exception as e:
+            self.__logger.error("Failed to get table fingerprints. - {}".format(e))
+
+    # fingerprint가 바뀐 테이블의 컬럼만 다시 조회해서 snapshot을 갱신. 갱신 결과는 (변경 테이블, 삭제 테이블), 실패하면 None
+    def refresh_schema_snapshot(self, snapshot) :
+        hive_tables = None
+        if self.__cm.db_type == 'hive' :
+            # hive는 fingerprint와 컬럼이 같은 조회 결과에서 나오므로 한 번만 조회
+            try:
+                hive_tables = self.__get_hive_table_rows()
+            except Exception as e:
+                self.__logger.error("Failed to get table columns. - {}".format(e))
+                return None
+        fingerprints = self.get_table_fingerprints(hive_tables)
+        if fingerprints == None :
+            return None
+        changed_tables, deleted_tables = snapshot.changed(fingerprints)
+        columns = dict()
+        if len(changed_tables) > 0 :
+            if hive_tables != None :
+                rows = self.__hive_table_columns(hive_tables, changed_tables)
+            else :
+                # 빈 snapshot은 테이블 목록 없이 전체 조회
+                rows = self.get_table_columns(changed_tables if len(snapshot.tables) > 0 else None)
+            if rows == None :
+                return None
+            for row in rows :
+                columns.setdefault(row["TABLE_NAME"], []).append(row)
+        for table in changed_tables :
+            snapshot.update(table, fingerprints[table], columns.get(table, []))
+        for table in deleted_tables :
+            snapshot.remove(table)
+        return changed_tables, deleted_tables
+
     def get_system_mapping_info(self) :
         try:        
             cm = ConfigManager("mdm")
-            database = Oracle(cm)
-            database.connect()
             statement = cm.queries["getSystemMappingInfo"]
-            data_list = database.execute(statement)            
+            with get_pool(cm, self.__logger_name).session() as database :
+                data_list = database.execute(statement)
             self.__logger.info("Get table mapping infomation SUCCESSED.")
             return data_list
         except Exception as e:
             self.__logger.error("Failed to table mapping infomation. - {}".format(e))
-        finally:
-            database.disconnect()
         return
 
     def get_system_from_table(self) :
@@ -295,47 +442,90 @@ class DataManager:
     def get_matrial_unique_codes(self) :
         try:
             statement = self.__cm.queries["getMatrialCodes"]
-            self.__database.connect()
+            self.connect()
             data_list = self.__database.execute(statement, None)
-            self.__database.disconnect()
             self.__logger.info("Get matrial unique codes SUCCESSED.")
             return data_list
         except Exception as e:
             self.__logger.error("Failed to get row. - {}".format(e))
+        finally:
+            self.disconnect()
         return
 
     # MATL 테이블의 column 속성 목록.
     def get_matrial_attr_columns(self) :
         try:
             statement = self.__cm.queries["getAllColumns"]
-            self.__database.connect()
+            self.connect()
             data_list = self.__database.execute(statement, None)
-            self.__database.disconnect()
             self.__logger.info("Get matrial attribute columns SUCCESSED.")
             return data_list
         except Exception as e:
             self.__logger.error("Failed to get row. - {}".format(e))
+        finally:
+            self.disconnect()
         return
 
     # MATL 테이블을 코드값 기준으로 분리한 데이터 테이블 생성.
     def create_matrial_seperated_table(self, bindvars) :
         try:
             statement = self.__cm.queries["createMixedTempTable"]
-            self.__database.connect()
+            self.connect()
             data_list = self.__database.execute(statement, bindvars)
-            self.__database.disconnect()            
             return data_list
         except Exception as e:
             self.__logger.error("Failed to create table. - {}".format(e))
+        finally:
+            self.disconnect()
         return
 
     # data 적재 부분
+    # incremental이면 export snapshot과 비교해 변경된 row만 merge, 없어진 key는 delete
+    # snapshot 또는 merge query가 없으면 전체 delete 후 insert. 적재 결과로 snapshot을 갱신
+    # key가 NULL인 row는 key로 merge/delete 할 수 없으므로 두 경로 모두 적재하지 않음 (ExportSnapshot.unique)
+    def __export_rows(self, query_name, table_name, bindvar, key_cols, incremental=False, use_reject_file=False) :
+        snapshot = ExportSnapshot(table_name, key_cols, self.__logger_name)
+        reject_name = table_name if use_reject_file else None
+        merge_query = "merge_{}".format(query_name)
+        delete_query = "delete_{}_by_key".format(query_name)
+
+        if incremental and merge_query in self.__cm.queries and delete_query in self.__cm.queries and snapshot.exists() and snapshot.load() != None :
+            previous = snapshot.hashes
+            upserts, deletes, hashes = snapshot.diff(bindvar)
+            self.__logger.info("Start merging into {}(total = {} | changed = {} | deleted = {} rows).".format(table_name, len(bindvar), len(upserts), len(deletes)))
+            # merge와 delete를 한 transaction으로 적재
+            rejects = [] if len(upserts) == 0 else self.__database.execute(self.__cm.queries[merge_query], upserts, True, commit=False, reject_name=reject_name)
+            delete_rejects = [] if len(deletes) == 0 else self.__database.execute(self.__cm.queries[delete_query], deletes, True, commit=False, reject_name=reject_name)
+            self.__database.commit()
+            # 삭제에 실패한 key는 다음 실행에서 다시 delete 되도록 snapshot에 유지
+            for row in delete_rejects or [] :
+                key = snapshot.key(row)
+                hashes[key] = previous[key]
+        else :
+            if incremental :
+                self.__logger.info("No export snapshot or merge query. Reload all rows. [table = {}]".format(table_name))
+            # delete/insert 도중 실패하면 snapshot이 없는 상태로 남아 다음 실행도 전체 reload
+            snapshot.invalidate()
+            rows, hashes = snapshot.unique(bindvar)
+            # delete와 insert를 한 transaction으로 적재. insert가 실패하면 delete도 rollback
+            self.__database.execute(self.__cm.queries["delete_{}".format(query_name)], None, commit=False)
+            self.__logger.info("Deleted table {}.".format(table_name))
+            self.__logger.info("Start inserting into {}({} rows).".format(table_name, len(rows)))
+            rejects = self.__database.execute(self.__cm.queries["insert_{}".format(query_name)], rows, True, commit=False, reject_name=reject_name)
+            self.__database.commit()
+
+        # 적재에 실패한 row는 다음 실행에서 다시 merge 되도록 snapshot에서 제외
+        for row in rejects or [] :
+            hashes.pop(snapshot.key(row), None)
+        snapshot.save(hashes)
+        return
+
     # 최종 결과 dataset을 누적 적재
     def insert_clusters_schema_hist(self, bindvars) :
         try:
-            self.__database.connect()            
+            self.connect()            
             version = self.__database.execute(self.__cm.queries["getMaxVersionClusterSchemaHist"], None)
-            self.__database.execute(self.__cm.queries["delete_mdm_clusters_schema_hist"], None)
+            self.__database.execute(self.__cm.queries["delete_mdm_clusters_schema_hist"], None, commit=False)
             self.__logger.info("Deleted table MDM_CLUSTERS_SCHEMA_HIST.")
             statement = self.__cm.queries["insert_mdm_clusters_schema_hist"]
             cols = ['entityid','originsourceid','originentityid','business_type','distinct_value_count','column_name','max_value','column_name_tokenized','empty_value_count','min_value','table_name','column_name_tokenized_std','fab','record_count','system_name','clustername','persistentid','col_ko_nm','ver','create_dt','sourceid','attr_en_nm','column_type','col_desc','top_100_values','pattern','non_numeric_top_values','numeric_top_values','top_n_values']
@@ -355,20 +545,19 @@ class DataManager:
             bindvar = list({var["entityid"]: var for var in bindvar}.values())
             bindvar = list({var["originentityid"]: var for var in bindvar}.values())
             self.__logger.info("Start inserting the cluster into MDM_CLUSTERS_SCHEMA_HIST({} rows).".format(len(bindvar)))
-            self.__database.execute(statement, bindvar, True)
-            self.__database.disconnect()
+            self.__database.execute(statement, bindvar, True, commit=False)
+            self.__database.commit()
             self.__logger.info("Clusters Insert to datbase SUCCESSED. [table = MDM_CLUSTERS_SCHEMA_HIST | version = {}]".format(version[0]["VERSION"]))
         except Exception as e:
             self.__logger.error("Failed to insert row. - {}".format(e))
+        finally:
+            self.disconnect()
         return
 
     # 최종 결과 dataset
-    def insert_clusters_schema(self, bindvars) :
+    def insert_clusters_schema(self, bindvars, incremental=False) :
         try:
-            self.__database.connect()
-            self.__database.execute(self.__cm.queries["delete_mdm_clusters_schema"], None)
-            self.__logger.info("Deleted table MDM_CLUSTERS_SCHEMA.")
-            statement = self.__cm.queries["insert_mdm_clusters_schema"]
+            self.connect()
             cols = ["entityid","originsourceid","originentityid","business_type","distinct_value_count","column_name","max_value","column_name_tokenized","empty_value_count","min_value","table_name","column_name_tokenized_std","fab","record_count","system_name","clustername","persistentid","create_dt","column_type","top_100_values","locked"]
             bindvar = []
             for var in bindvars:    
@@ -385,22 +574,19 @@ class DataManager:
                 bindvar.append(dic)
             
             #bindvar = list({var["entityid"]: var for var in bindvar}.values())
-            self.__logger.info("Start inserting the cluster into MDM_CLUSTERS_SCHEMA({} rows).".format(len(bindvar)))            
-            self.__database.execute(statement, bindvar, True)
-            self.__database.disconnect()
+            self.__export_rows("mdm_clusters_schema", "MDM_CLUSTERS_SCHEMA", bindvar, ["entityid"], incremental)
             self.__logger.info("Clusters Insert to datbase SUCCESSED. [table = MDM_CLUSTERS_SCHEMA]")
         except Exception as e:
             self.__logger.error("Failed to insert row. - {}".format(e))
+        finally:
+            self.disconnect()
 
         return
 
     # cluster별 value 정보 dataset
-    def insert_top_values(self, bindvars) :
+    def insert_top_values(self, bindvars, incremental=False) :
         try:
-            self.__database.connect()
-            self.__database.execute(self.__cm.queries["delete_top_values"], None)
-            self.__logger.info("Deleted table MDM_TOP_VALUES_CNT.")
-            statement = self.__cm.queries["insert_top_values"]
+            self.connect()
             bindvar = []
             cols = ["persistent_id", "table_name", "column_name", "value_name", "value_count", "record_count", "distinct_count", "value_ratio", "create_dt"]
             
@@ -410,22 +596,18 @@ class DataManager:
                 bindvar.append(row)
             
             #bindvar = list({var["persistent_id"] and var["table_name"] and var["column_name"] and var["value_name"]: var for var in bindvar}.values())
-            self.__logger.info("Start inserting the top and value count into MDM_TOP_VALUES_CNT({} rows).".format(len(bindvar)))
-            self.__database.execute(statement, bindvar, True)            
-            self.__database.disconnect()
+            self.__export_rows("top_values", "MDM_TOP_VALUES_CNT", bindvar, ["persistent_id", "table_name", "column_name", "value_name"], incremental)
             self.__logger.info("Top and Values Insert to datbase SUCCESSED. [table = MDM_TOP_VALUES_CNT]")
         except Exception as e:
             self.__logger.error("Failed to insert row. - {}".format(e))
+        finally:
+            self.disconnect()
         return
 
     # cluster alias와 publish date dataset 
-    def insert_clusters_master(self, bindvars) :
+    def insert_clusters_master(self, bindvars, incremental=False) :
         try:
-            self.__database.connect()
-            self.__database.execute(self.__cm.queries["delete_mdm_clusters_master"], None)
-            self.__logger.info("Deleted table MDM_CLUSTERS_MASTER.")
-            
-            statement = self.__cm.queries["insert_mdm_clusters_master"]
+            self.connect()
             cols = ['persistentid','cluster_name','cluster_full_name','cluster_alias','create_dt']
             bindvar = []
             for var in bindvars:
@@ -440,12 +622,12 @@ class DataManager:
                             dic[key] = ''.join(value) if type(value) == list else str(value)                            
                 bindvar.append(dic)
             
-            self.__logger.info("Start inserting the clusters into MDM_CLUSTERS_MASTER({} rows).".format(len(bindvar)))
-            self.__database.execute(statement, bindvar, True)
-            self.__database.disconnect()
+            self.__export_rows("mdm_clusters_master", "MDM_CLUSTERS_MASTER", bindvar, ["persistentid"], incremental)
             self.__logger.info("Clusters Insert to datbase SUCCESSED. [table = MDM_CLUSTERS_MASTER]")            
         except Exception as e:
             self.__logger.error("Failed to insert row. - {}".format(e))
+        finally:
+            self.disconnect()
         return
 
     # cluster master의 publish 날짜를 update.
@@ -458,23 +640,20 @@ class DataManager:
                 bindvar.append(dic)
 
             self.__logger.info("Start updating the publish date to MDM_CLUSTERS_MASTER({} rows).".format(len(bindvars)))
-            self.__database.connect()
+            self.connect()
             if len(bindvars) > 0 :
                 self.__database.execute(statement, bindvars, True)
-            self.__database.disconnect()
             self.__logger.info("Clusters Update to datbase SUCCESSED. [table = MDM_CLUSTERS_MASTER]")
         except Exception as e:
             self.__logger.error("Failed to update row. - {}".format(e))
+        finally:
+            self.disconnect()
         return
 
     # ingest 완료된 dataset.
-    def insert_metadata(self, bindvars) :
+    def insert_metadata(self, bindvars, incremental=False) :
         try:
-            self.__database.connect()
-            self.__database.execute(self.__cm.queries["delete_tamr_metadata"], None)
-            self.__logger.info("Deleted table TAMR_METADATA.")
-            
-            statement = self.__cm.queries["insert_tamr_metadata"]
+            self.connect()
             cols = ['source','top100frequencies','columnname','tablename','top100values','columntype','tamr_profiling_seq','emptyvaluecount','minvalue','meanvalue','maxvalue','stddevvalue','recordcount','distinctvaluecount','tamrseq','create_dt']
             bindvar = []
             for var in bindvars:
@@ -487,22 +666,18 @@ class DataManager:
                 bindvar.append(dic)
 
             bindvar = list({var["tamr_profiling_seq"]: var for var in bindvar}.values())
-            self.__logger.info("Start inserting the clusters into TAMR_METADATA({} rows).".format(len(bindvar)))
-            self.__database.execute(statement, bindvar)
-            self.__database.disconnect()
+            self.__export_rows("tamr_metadata", "TAMR_METADATA", bindvar, ["tamr_profiling_seq"], incremental, True)
             self.__logger.info("Clusters Insert to datbase SUCCESSED. [table = TAMR_METADATA]")
         except Exception as e:
             self.__logger.error("Failed to insert row. - {}".format(e))
+        finally:
+            self.disconnect()
         return
 
     # profiled 완료된 dataset.
-    def insert_profiled(self, bindvars) :
+    def insert_profiled(self, bindvars, incremental=False) :
         try:
-            self.__database.connect()
-            self.__database.execute(self.__cm.queries["delete_tamr_profiled"], None)
-            self.__logger.info("Deleted table TAMR_PROFILED.")
-
-            statement = self.__cm.queries["insert_tamr_profiled"]
+            self.connect()
             cols = ['source', 'columnname','tablename','columntype','tamr_profiling_seq','emptyvaluecount','minvalue','meanvalue','maxvalue','stddevvalue','recordcount','distinctvaluecount','tamrseq','column_name_tokenized','business_type','length','keys','sys_gbn_cd','mst_typ_eng','col_desc','col_ko_nm','attr_en_nm','create_dt', 'top_n_values']
             bindvar = []
             for var in bindvars:
@@ -515,18 +690,18 @@ class DataManager:
                 bindvar.append(dic)
 
             bindvar = list({var["tamr_profiling_seq"]: var for var in bindvar}.values())
-            self.__logger.info("Start inserting the clusters into TAMR_PROFILED({} rows).".format(len(bindvar)))
-            self.__database.execute(statement, bindvar)
-            self.__database.disconnect()
+            self.__export_rows("tamr_profiled", "TAMR_PROFILED", bindvar, ["tamr_profiling_seq"], incremental, True)
             self.__logger.info("Clusters Insert to datbase SUCCESSED. [table = TAMR_PROFILED]")
         except Exception as e:
             self.__logger.error("Failed to insert row. - {}".format(e))
+        finally:
+            self.disconnect()
         return
 
     # comment에 명시된 mixed table 및 column.
     def insert_mixed_tables(self, bindvars) : 
         try:            
-            self.__database.connect()            
+            self.connect()            
             statement = self.__cm.queries["getMixedTables"]
             mixed_tables = [row["TABLE_COLUMN"] for row in self.__database.execute(statement, None)]
             statement = self.__cm.queries["insert_tamr_mixed_tables"]            
@@ -551,15 +726,20 @@ class DataManager:
                         bindvar.append(dic)
             
             self.__logger.info("Start inserting the mixed table TAMR_MIXED_TABLES({} rows).".format(len(bindvar)))
-            self.__database.execute(statement, bindvar)
-            self.__database.disconnect()
+            self.__database.execute(statement, bindvar, True, reject_name="TAMR_MIXED_TABLES")
             self.__logger.info("Mixed tables Insert to datbase SUCCESSED. [table = TAMR_MIXED_TABLES]")
         except Exception as e:
             self.__logger.error("Failed to insert row. - {}".format(e))
+        finally:
+            self.disconnect()
         return
     
     # legacy table 및 tamr ingest 완료된 table 현황. 
     def insert_table_status(self, bindvars) :
+        # 테이블 목록 조회에 실패한 source는 갱신하지 않음
+        if bindvars == None :
+            self.__logger.error("Skip inserting table status. No table list.")
+            return
         try:
             #self.__database.execute(self.__cm.queries["delete_tamr_table_status"], None)
             #self.__logger.info("Deleted table TAMR_TABLE_STATUS.")            
@@ -583,7 +763,7 @@ class DataManager:
     # 큐브 알람 전달. 
     def insert_feedback_notification(self, bindvars) :
         try:
-            self.__database.connect()            
+            self.connect()            
             seq = self.__database.execute(self.__cm.queries["getMaxSeqNotification"], None)
 
             statement = self.__cm.queries["insert_tamr_notifications"]
@@ -598,23 +778,25 @@ class DataManager:
  
             self.__logger.info("Start inserting notification CUBE_BOT_MSG.".format(len(bindvar)))
             self.__database.execute(statement, bindvar)
-            self.__database.disconnect()
             self.__logger.info("Notification Insert to datbase SUCCESSED. [table = CUBE_BOT_MSG]")
         except Exception as e:
             self.__logger.error("Failed to insert row. - {}".format(e))
+        finally:
+            self.disconnect()
         return
 
     def insert_dataset_ui(self) :
         try:
-            self.__database.connect()            
+            self.connect()            
             statement = self.__cm.queries["insert_data_ui"]
             
             self.__logger.info("Start execute procedure SYNC_ALL.")
             self.__database.execute_proc(statement)
-            self.__database.disconnect()
             self.__logger.info("Procedure call SUCCESSED.")
         except Exception as e:
             self.__logger.error("Failed call procedure. - {}".format(e))
+        finally:
+            self.disconnect()
         return
 
     ################################# unify #################################
@@ -634,37 +816,63 @@ class DataManager:
         self.__unify.dedup.generate_golden_records(project_name)
         return
 
+    # golden record draft에 published cluster 이름과 alias(override 우선, 없으면 golden record)를 persistentId 기준으로 붙임
     def get_golden_record(self) :
         try:
+            proj_nm = self.__cm_unify.proj_nm
+            drafts = []
+            # persistentId -> 값. 같은 id가 여러 건이면 첫번째 row를 사용
+            cluster_names = dict()
+            golden_record_aliases = dict()
+            override_aliases = dict()
+            failed = []
+
+            def read_drafts() :
+                for row in self.__unify.versioned.get_golden_records_draft(proj_nm) :
+                    drafts.append({"persistentId": row["persistentId"], "cluster_full_name": row["COLUMN_NAME_TOKENIZED_STD"], "column_name": row["COLUMN_NAME"]})
+
+            def read_index(stream, value_column, index) :
+                for row in stream(proj_nm) :
+                    if row["persistentId"] not in index :
+                        index[row["persistentId"]] = row[value_column]
+
+            def run(target, *args) :
+                try :
+                    target(*args)
+                except Exception as e :
+                    failed.append(e)
+
+            # 4개 dataset을 동시에 받음. 가장 큰 published clusters with data는 row를 남기지 않고 id별 cluster 이름만 index
+            readers = [
+                (read_drafts, ),
+                (read_index, self.__unify.versioned.get_unified_dataset_dedup_published_clusters_with_data, "clusterName", cluster_names),
+                (read_index, self.__unify.versioned.get_golden_records, "COLUMN_NAME_TOKENIZED", golden_record_aliases),
+                (read_index, self.__unify.versioned.get_golden_records_overrides, "value", override_aliases)
+            ]
+            threads = [threading.Thread(target=run, args=reader) for reader in readers]
+            for thread in threads :
+                thread.start()
+            for thread in threads :
+                thread.join()
+            if len(failed) > 0 :
+                raise failed[0]
+
             dataset_list = []
-            golden_record_draft_dataset = [{"persistentId": row["persistentId"], "cluster_full_name": row["COLUMN_NAME_TOKENIZED_STD"], "column_name": row["COLUMN_NAME"]} for row in self.__unify.versioned.get_golden_records_draft(self.__cm_unify.proj_nm)]
-            published_dataset = [{"persistentId": row["persistentId"], "cluster_name": row["clusterName"]} for row in self.__unify.versioned.get_unified_dataset_dedup_published_clusters_with_data(self.__unify.proj_nm)]
-            golden_records = [{"persistentId": row["persistentId"], "cluster_alias": row["COLUMN_NAME_TOKENIZED"]} for row in self.__unify.versioned.get_golden_records(self.__unify.proj_nm)]
-            golden_record_override_dataset = [{"persistentId": row["persistentId"], "cluster_alias": row["value"]} for row in self.__unify.versioned.get_golden_records_overrides(self.__unify.proj_nm)]
-            golden_record_alias = []
-            golden_record_alias.extend(golden_record_override_dataset)
-            
-            ids = [row["persistentId"] for row in golden_record_alias]
-            for row in golden_records :
-                if row["persistentId"] not in ids :
-                    golden_record_alias.append(row)
-            
-            for data in golden_record_draft_dataset :
-                for pub in published_dataset:
-                    if data["persistentId"] == pub["persistentId"] :
-                        data = { **data, **pub }
-                        break                                
-                for alias in golden_record_alias:
-                    if data["persistentId"] == alias["persistentId"] :
-                        data = { **data, **{"cluster_alias": str(alias["cluster_alias"]).strip()} }
-                        self.__logger.debug(data)
-                        break
-                
+            for data in drafts :
+                persistent_id = data["persistentId"]
+                if persistent_id in cluster_names :
+                    data["cluster_name"] = cluster_names[persistent_id]
+                if persistent_id in override_aliases :
+                    data["cluster_alias"] = str(override_aliases[persistent_id]).strip()
+                elif persistent_id in golden_record_aliases :
+                    data["cluster_alias"] = str(golden_record_aliases[persistent_id]).strip()
+
                 if 'cluster_name' not in data :
-                    data = {**data, **{"cluster_name": data["column_name"]}}
+                    data["cluster_name"] = data["column_name"]
                 if 'cluster_alias' not in data :
-                    data = {**data, **{"cluster_alias": ""}}
-                dataset_list.append(data)            
+                    data["cluster_alias"] = ""
+                dataset_list.append(data)
+            self.__logger.info("Get golden records SUCCESSED. [drafts = {} | published = {} | golden records = {} | overrides = {}]".format(len(drafts), len(cluster_names), len(golden_record_aliases), len(override_aliases)))
 
             return dataset_list
         except Exception as e:
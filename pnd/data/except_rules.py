@@ -0,0 +1,120 @@
+#!/bin/python
+import os
+import re
+import sys
+import yaml
+
+current_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(current_path + '/../config')
+from pnd_logger import PndLogger
+
+class ExceptRules:
+    """
+    Table/column exclusion rules of one source, loaded from conf/except/default.yaml and conf/except/<source>.yaml,
+    or from conf/except/<rule_set>/ for a consumer with its own rules (e.g. rule_set="schema" for ExceptManager).
+    The table rules and the column rules are each compiled once into a single regex. Decisions are memoized and the
+    matches are counted per rule, to be logged once by report() instead of on every hit.
+    """
+    kinds = ["names", "contains", "prefixes", "patterns"]
+
+    def __init__(self, source, logger_name=None, rule_set=None) :
+        self.__logger = PndLogger("Except Rules Class", logger_name)
+        self.__source = source
+        self.__path_of_rules = os.path.abspath(current_path + "/../conf/except")
+        if rule_set is not None :
+            self.__path_of_rules += "/{}".format(rule_set)
+        rules = self.load()
+        self.__table_regex, self.__table_labels = self.__compile(rules["tables"])
+        self.__column_regex, self.__column_labels = self.__compile(rules["columns"])
+        # 값 -> 일치한 rule label ('' 이면 제외 대상 아님)
+        self.__table_decisions = dict()
+        self.__column_decisions = dict()
+        # rule label -> 제외 건수
+        self.table_counts = dict()
+        self.column_counts = dict()
+
+    def load(self) :
+        rules = {"tables": {}, "columns": {}}
+        for name in ["default", self.__source] :
+            file_name = self.__path_of_rules + "/{}.yaml".format(name)
+            if not os.path.exists(file_name) :
+                continue
+            try :
+                with open(file_name, 'r', encoding='utf-8') as f :
+                    loaded = yaml.safe_load(f) or {}
+            except Exception as e :
+                self.__logger.error("Failed to load except rules. [file = '{}'] - {}".format(file_name, e))
+                continue
+            for target in rules :
+                for kind, values in (loaded.get(target) or {}).items() :
+                    if kind not in self.kinds :
+                        self.__logger.error("Unknown except rule kind '{}'. [file = '{}']".format(kind, file_name))
+                        continue
+                    rules[target].setdefault(kind, []).extend([str(value) for value in values or []])
+        self.__logger.info("Loaded except rules. [source = '{}' | tables = {} | columns = {}]".format(
+            self.__source, sum(len(values) for values in rules["tables"].values()), sum(len(values) for values in rules["columns"].values())))
+        return rules
+
+    def __compile(self, rules) :
+        # rule마다 named group으로 감싼 하나의 정규식. 일치한 rule은 lastgroup으로 구분
+        patterns = []
+        labels = []
+        for kind in self.kinds :
+            for value in rules.get(kind, []) :
+                if kind == "names" :
+                    pattern = "^{}$".format(re.escape(value))
+                elif kind == "contains" :
+                    pattern = re.escape(value)
+                elif kind == "prefixes" :
+                    pattern = "^{}".format(re.escape(value))
+                else :
+                    pattern = value
+                try :
+                    re.compile(pattern)
+                except re.error as e :
+                    self.__logger.error("Invalid except rule pattern '{}'. - {}".format(value, e))
+                    continue
+                patterns.append("(?P<r{}>{})".format(len(labels), pattern))
+                labels.append("{}: {}".format(kind, value))
+        if len(patterns) == 0 :
+            return None, labels
+        return re.compile("|".join(patterns)), labels
+
+    @staticmethod
+    def __match(regex, labels, value) :
+        if regex is None :
+            return ''
+        matched = regex.search(value)
+        if matched is None :
+            return ''
+        return labels[int(matched.lastgroup[1:])]
+
+    def except_table(self, table) :
+        table = ''.join(table)
+        decision = self.__table_decisions.get(table)
+        if decision is None :
+            decision = self.__match(self.__table_regex, self.__table_labels, table)
+            self.__table_decisions[table] = decision
+        if decision == '' :
+            return False
+        self.table_counts[decision] = self.table_counts.get(decision, 0) + 1
+        return True
+
+    # column 규칙은 value만 보므로 value 기준으로 memoize
+    def except_column(self, table_name, column_name, value) :
+        except_value = ''.join(value)
+        decision = self.__column_decisions.get(except_value)
+        if decision is None :
+            decision = self.__match(self.__column_regex, self.__column_labels, except_value)
+            self.__column_decisions[except_value] = decision
+        if decision == '' :
+            return False
+        self.column_counts[decision] = self.column_counts.get(decision, 0) + 1
+        return True
+
+    def report(self, name=None) :
+        prefix = "[Source={}]".format(self.__source) if name is None else "[Source={}] [{}]".format(self.__source, name)
+        self.__logger.info("{} Excepted tables={} columns={}".format(prefix, sum(self.table_counts.values()), sum(self.column_counts.values())))
+        for target, counts in [("table", self.table_counts), ("column", self.column_counts)] :
+            for label, count in sorted(counts.items(), key=lambda item: item[1], reverse=True) :
+                self.__logger.info("{} Except {} rule [{}] matched {}".format(prefix, target, label, count))
@@ -0,0 +1,94 @@
+import os
+import sys
+import json
+import hashlib
+
+current_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(current_path + '/../config')
+from pnd_logger import PndLogger
+
+class ExportSnapshot:
+    """
+    Snapshot of the last exported rows (natural key -> row hash) for one export table.
+    diff() compares the outgoing rows with the snapshot and returns only the rows to merge / delete.
+    """
+    # 매 실행마다 바뀌는 값은 변경 비교에서 제외
+    volatile_cols = ['create_dt', 'ver']
+
+    def __init__(self, name, key_cols, logger_name=None) :
+        self.__logger = PndLogger("Export Snapshot Class", logger_name)
+        self.name = name
+        self.key_cols = key_cols
+        self.__path_of_snapshots = os.path.abspath(current_path + "/../../snapshot/export")
+        self.__file_name = self.__path_of_snapshots + "/{}.json".format(name)
+        self.hashes = None
+
+    def exists(self) :
+        return os.path.exists(self.__file_name)
+
+    def load(self) :
+        try :
+            with open(self.__file_name, 'r', encoding='utf-8') as f :
+                self.hashes = json.load(f)
+            self.__logger.info("Loaded export snapshot. [name = '{}' | keys = {}]".format(self.name, len(self.hashes)))
+        except Exception as e :
+            self.__logger.error("Failed to load export snapshot. - {}".format(e))
+            self.hashes = None
+        return self.hashes
+
+    # 전체 reload 전에 호출. 적재 도중 실패해도 이전 snapshot으로 diff 하지 않도록 삭제
+    def invalidate(self) :
+        if os.path.exists(self.__file_name) :
+            os.remove(self.__file_name)
+            self.__logger.info("Invalidated export snapshot. [name = '{}']".format(self.name))
+        self.hashes = None
+
+    def save(self, hashes) :
+        if not os.path.exists(self.__path_of_snapshots):
+            os.makedirs(self.__path_of_snapshots)
+        # 중간에 실패해도 이전 snapshot이 남도록 임시 파일에 쓴 뒤 교체
+        with open(self.__file_name + ".tmp", 'w', encoding='utf-8') as f :
+            json.dump(hashes, f)
+        os.replace(self.__file_name + ".tmp", self.__file_name)
+        self.hashes = hashes
+        self.__logger.info("Saved export snapshot. [name = '{}' | keys = {}]".format(self.name, len(hashes)))
+
+    def key(self, row) :
+        return json.dumps([row.get(col) for col in self.key_cols], ensure_ascii=False)
+
+    def hash(self, row) :
+        values = {key: value for key, value in row.items() if key not in self.volatile_cols}
+        return hashlib.md5(json.dumps(values, sort_keys=True, default=str, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    # key 컬럼 중 NULL이 있으면 key 기준 merge/delete로 찾을 수 없음 (Oracle은 ''도 NULL)
+    def null_key(self, row) :
+        return any(row.get(col) is None or row.get(col) == '' for col in self.key_cols)
+
+    # (key별 첫번째 row 목록, 그 row의 hash). 중복 key는 첫번째 row만, NULL key row는 적재/snapshot 모두에서 제외
+    def unique(self, rows) :
+        unique_rows = []
+        hashes = dict()
+        null_cnt = 0
+        for row in rows :
+            if self.null_key(row) :
+                null_cnt += 1
+                continue
+            key = self.key(row)
+            if key not in hashes :
+                hashes[key] = self.hash(row)
+                unique_rows.append(row)
+        if null_cnt > 0 :
+            self.__logger.error("Skipped {} rows with NULL key. [name = '{}' | key = {}]".format(null_cnt, self.name, self.key_cols))
+        return unique_rows, hashes
+
+    # (merge 대상 row, delete 대상 key bindvar, 현재 snapshot). unique()와 같은 row만 비교하므로 merge bindvar에 중복 key가 없음
+    def diff(self, rows) :
+        previous = self.hashes if self.hashes != None else {}
+        unique_rows, current = self.unique(rows)
+        upserts = []
+        for row in unique_rows :
+            key = self.key(row)
+            if previous.get(key) != current[key] :
+                upserts.append(row)
+        deletes = [dict(zip(self.key_cols, json.loads(key))) for key in previous if key not in current]
+        return upserts, deletes, current
@@ -56,6 +56,19 @@ class Hive2(Base):
             pass
         return
 
+    # 세션 유효성 확인 (pool checkout 시 사용)
+    def ping(self):
+        try:
+            self.__cursor.execute("SELECT 1")
+            self.__cursor.fetchall()
+            return True
+        except Exception:
+            return False
+
+    # hive는 transaction이 없음
+    def rollback(self):
+        return
+
     def execute_proc(self, sql):
         try:            
             self.__cursor.callproc(sql, [])            
@@ -1,5 +1,6 @@
 import os
 import sys
+import csv
 import cx_Oracle
 import logging
 import datetime
@@ -59,6 +60,25 @@ class Oracle(Base):
             pass
         return
 
+    # 세션 유효성 확인 (pool checkout 시 사용)
+    def ping(self):
+        try:
+            self.__db.ping()
+            return True
+        except Exception:
+            return False
+
+    def commit(self):
+        self.__db.commit()
+        return
+
+    def rollback(self):
+        try:
+            self.__db.rollback()
+        except cx_Oracle.DatabaseError:
+            pass
+        return
+
     def execute_proc(self, sql):
         try:            
             self.__cursor.callproc(sql, [])            
@@ -68,37 +88,41 @@ class Oracle(Base):
             raise
         return
 
-    def execute(self, sql, bindvars=None, insert_once=False, commit=True):        
+    # insert_once : executemany(batcherrors)로 interval 단위 적재. 실패한 row는 reject_name 파일에 기록
+    #   batcherrors가 아닌 오류(ORA-01653, 연결 끊김 등)는 rollback 후 raise. commit=False면 앞선 delete까지 취소됨
+    # bindvars가 있으면 적재에 실패한 row 목록을 반환
+    def execute(self, sql, bindvars=None, insert_once=False, commit=True, reject_name=None):        
         total_cnt = 0 if bindvars == None else len(bindvars)
         success_cnt = 0
         failed_cnt = 0
+        rejects = []
         try:
             if total_cnt != 0 :
                 self.__cursor.prepare(sql)
                 if insert_once :
                     interval = 10000
-                    rows_set = [bindvars[i * interval:(i + 1) * interval] for i in range((len(bindvars) + interval - 1) // interval)]
-                    self.__logger.debug("// = {} % = {}".format(total_cnt // interval, total_cnt % interval))
-                    self.__logger.debug("interval = {} iterate count = {}".format(interval, len(rows_set)))
+                    self.__set_input_sizes(bindvars)
+                    self.__logger.debug("interval = {} iterate count = {}".format(interval, (total_cnt + interval - 1) // interval))
 
-                    for set in rows_set :
+                    for offset in range(0, total_cnt, interval) :
+                        rows = bindvars[offset:offset + interval]
                         try :
-                            self.__cursor.executemany(None, set)
-                            if commit: 
-                                self.__db.commit()
-                                success_cnt += len(set)
-                        except :                            
-                            for var in set :
-                                try :
-                                    self.__cursor.execute(sql, var)
-                                    if commit: 
-                                        self.__db.commit()
-                                        success_cnt += 1
-                                except Exception as e:
-                                    self.__logger.error(e)
-                                    self.__logger.error(var)
-                                    failed_cnt += 1                                        
+                            self.__cursor.executemany(None, rows, batcherrors=True)
+                        except cx_Oracle.DatabaseError :
+                            self.__logger.error("Rolled back after {} inserted rows.".format(success_cnt))
+                            self.rollback()
+                            raise
+                        errors = self.__cursor.getbatcherrors()
+                        if commit: 
+                            self.__db.commit()
+                        for error in errors :
+                            rejects.append((rows[error.offset], error.message))
+                        failed_cnt += len(errors)
+                        success_cnt += len(rows) - len(errors)
                         self.__logger.info("Inserted rows {}".format(success_cnt))
+
+                    if len(rejects) > 0 :
+                        self.__write_rejects(rejects, reject_name)
                 else :
                     current_cnt = 0
                     logging_interval = 10000 if total_cnt > 100000 else 1000
@@ -112,6 +136,7 @@ class Oracle(Base):
                         except Exception as e :
                             self.__logger.error(e)
                             self.__logger.error(var)
+                            rejects.append((var, str(e)))
                             failed_cnt += 1
                         
                         if current_cnt != 0 and current_cnt % logging_interval == 0 : 
@@ -119,6 +144,7 @@ class Oracle(Base):
 
                         current_cnt += 1
                 self.__logger.info("Total = {}    Successed = {}   Failed = {}".format(total_cnt, success_cnt, failed_cnt))
+                return [var for var, message in rejects]
             else :
                 self.__cursor.execute(sql)
                 if self.__cursor.description != None :
@@ -137,6 +163,41 @@ class Oracle(Base):
             raise
         return
 
+    # executemany 전에 bind 변수의 type/size를 고정하여 batch 중간의 재할당을 방지
+    def __set_input_sizes(self, bindvars) :
+        sizes = dict()
+        rows = bindvars if type(bindvars[0]) == dict else [dict(enumerate(var)) for var in bindvars]
+        for row in rows :
+            for key, value in row.items() :
+                if type(value) == str :
+                    sizes[key] = max(sizes.get(key, 1), len(value.encode('utf-8')))
+        # 4000 byte를 넘는 문자열은 LONG_STRING으로 bind
+        sizes = {key: (cx_Oracle.LONG_STRING if size > 4000 else size) for key, size in sizes.items()}
+        if type(bindvars[0]) == dict :
+            self.__cursor.setinputsizes(**sizes)
+        else :
+            self.__cursor.setinputsizes(*[sizes.get(i) for i in range(0, len(bindvars[0]))])
+
+    # 적재에 실패한 row를 logs/reject 아래 csv로 저장
+    def __write_rejects(self, rejects, reject_name=None) :
+        if reject_name == None :
+            for var, message in rejects :
+                self.__logger.error(message)
+                self.__logger.error(var)
+            return
+
+        path_of_rejects = os.path.abspath(current_path + "/../../logs/reject")
+        if not os.path.exists(path_of_rejects):
+            os.makedirs(path_of_rejects)
+        file_name = path_of_rejects + "/{}_{}.csv".format(reject_name, datetime.datetime.now().strftime('%Y-%m-%d_%H%M%S'))
+        header = list(rejects[0][0].keys()) if type(rejects[0][0]) == dict else list(range(0, len(rejects[0][0])))
+        with open(file_name, 'w', newline='', encoding='utf-8') as f :
+            writer = csv.writer(f)
+            writer.writerow(header + ['error'])
+            for var, message in rejects :
+                writer.writerow([var[key] for key in header] + [message])
+        self.__logger.error("Rejected rows {} - {}".format(len(rejects), file_name))
+
     def __factory(self, cursor) :
         columnNames = [d[0] for d in cursor.description]
  
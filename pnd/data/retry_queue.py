@@ -0,0 +1,85 @@
+import os
+import sys
+import json
+import datetime
+
+current_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(current_path + '/../config')
+from pnd_logger import PndLogger
+
+TRANSIENT = "transient"
+PERMANENT = "permanent"
+
+def classify_error(status_code, message) :
+    """
+    Classify a df-connect profiling error
+    :param status_code: HTTP status code, or None if the request itself failed (timeout, connection error)
+    :param message: Error message or response text
+    :return: TRANSIENT if retrying may succeed. Otherwise PERMANENT.
+    """
+    # 원본 DB 오류는 재시도해도 같은 결과
+    if message != None and "ORA-" in message :
+        return PERMANENT
+    # read timeout은 df-connect에서 profile이 아직 실행 중일 수 있으므로 다시 보내지 않음 (중복 profile 방지)
+    if status_code == None and message != None and "Read timed out" in message :
+        return PERMANENT
+    if status_code == None or status_code >= 500 :
+        return TRANSIENT
+    return PERMANENT
+
+class RetryQueue:
+    """
+    Persisted queue of tables whose df-connect profiling failed, for one profile dataset.
+    The next run can resume only these tables instead of re-sampling everything.
+    """
+    def __init__(self, name, logger_name=None) :
+        self.__logger = PndLogger("Retry Queue Class", logger_name)
+        self.name = name
+        self.__path_of_queues = os.path.abspath(current_path + "/../../snapshot/retry")
+        self.__file_name = self.__path_of_queues + "/{}.json".format(name)
+        self.entries = dict()
+        self.load()
+
+    def load(self) :
+        if not os.path.exists(self.__file_name) :
+            self.entries = dict()
+            return self.entries
+        try :
+            with open(self.__file_name, 'r', encoding='utf-8') as f :
+                self.entries = json.load(f)
+            self.__logger.info("Loaded retry queue. [name = '{}' | tables = {}]".format(self.name, len(self.entries)))
+        except Exception as e :
+            self.__logger.error("Failed to load retry queue. - {}".format(e))
+            self.entries = dict()
+        return self.entries
+
+    def save(self) :
+        if not os.path.exists(self.__path_of_queues):
+            os.makedirs(self.__path_of_queues)
+        # 중간에 실패해도 이전 queue가 남도록 임시 파일에 쓴 뒤 교체
+        with open(self.__file_name + ".tmp", 'w', encoding='utf-8') as f :
+            json.dump(self.entries, f, ensure_ascii=False, default=str)
+        os.replace(self.__file_name + ".tmp", self.__file_name)
+        self.__logger.info("Saved retry queue. [name = '{}' | tables = {}]".format(self.name, len(self.entries)))
+
+    def add(self, key, table, kind, message, attempts) :
+        previous = self.entries.get(key)
+        self.entries[key] = {
+            "table": table,
+            "kind": kind,
+            "message": message,
+            "attempts": attempts + (previous["attempts"] if previous != None else 0),
+            "failed_dt": datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+    def remove(self, key) :
+        self.entries.pop(key, None)
+
+    def __contains__(self, key) :
+        return key in self.entries
+
+    def __len__(self) :
+        return len(self.entries)
+
+    def tables(self) :
+        return [entry["table"] for entry in self.entries.values()]
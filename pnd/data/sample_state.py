@@ -0,0 +1,88 @@
+import os
+import sys
+import json
+import math
+import hashlib
+
+current_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(current_path + '/../config')
+from pnd_logger import PndLogger
+
+class SampleState:
+    """
+    Signature (column set, row count band, LAST_MOD_DT) of every table at its last successful profile, for one profile dataset.
+    changed() returns only the tables whose signature differs, so unchanged tables are not profiled again.
+    """
+    # row 수는 10배마다 4구간으로 나누어 비교 (약 1.8배 이상 변하면 다시 profile)
+    row_bands_per_decade = 4
+
+    def __init__(self, name, logger_name=None) :
+        self.__logger = PndLogger("Sample State Class", logger_name)
+        self.name = name
+        self.__path_of_states = os.path.abspath(current_path + "/../../snapshot/sample")
+        self.__file_name = self.__path_of_states + "/{}.json".format(name)
+        self.signatures = dict()
+        self.load()
+
+    def load(self) :
+        if not os.path.exists(self.__file_name) :
+            self.signatures = dict()
+            return self.signatures
+        try :
+            with open(self.__file_name, 'r', encoding='utf-8') as f :
+                self.signatures = json.load(f)
+            self.__logger.info("Loaded sample state. [name = '{}' | tables = {}]".format(self.name, len(self.signatures)))
+        except Exception as e :
+            self.__logger.error("Failed to load sample state. - {}".format(e))
+            self.signatures = dict()
+        return self.signatures
+
+    def save(self) :
+        if not os.path.exists(self.__path_of_states):
+            os.makedirs(self.__path_of_states)
+        # 중간에 실패해도 이전 state가 남도록 임시 파일에 쓴 뒤 교체
+        with open(self.__file_name + ".tmp", 'w', encoding='utf-8') as f :
+            json.dump(self.signatures, f, ensure_ascii=False)
+        os.replace(self.__file_name + ".tmp", self.__file_name)
+        self.__logger.info("Saved sample state. [name = '{}' | tables = {}]".format(self.name, len(self.signatures)))
+
+    @staticmethod
+    def key(table) :
+        return "{}.{}".format(table["DB_NAME"], table["TABLE_NAME"]).upper()
+
+    def signature(self, table) :
+        # 컬럼 목록이 있으면 목록의 hash, 없으면 컬럼 수로 비교
+        if table.get("COL_HASH") != None :
+            columns = str(table["COL_HASH"])
+        elif table.get("COLUMN_NAMES1") != None or table.get("COLUMN_NAMES2") != None :
+            columns = hashlib.md5("{}{}".format(table.get("COLUMN_NAMES1") or "", table.get("COLUMN_NAMES2") or "").encode('utf-8')).hexdigest()
+        else :
+            columns = str(table.get("COL_CNT"))
+        row_cnt = int(table.get("ROW_CNT") or 0)
+        return {
+            "columns": columns,
+            "row_band": int(math.log10(row_cnt + 1) * self.row_bands_per_decade),
+            "last_mod_dt": None if table.get("LAST_MOD_DT") == None else str(table["LAST_MOD_DT"])
+        }
+
+    # (변경된 테이블 목록, 변경 사유별 건수)
+    def changed(self, tables) :
+        changed_tables = []
+        reasons = {"new": 0, "columns": 0, "row_band": 0, "last_mod_dt": 0}
+        for table in tables :
+            previous = self.signatures.get(self.key(table))
+            if previous == None :
+                reasons["new"] += 1
+                changed_tables.append(table)
+                continue
+            current = self.signature(table)
+            diff = [name for name in ["columns", "row_band", "last_mod_dt"] if previous.get(name) != current[name]]
+            for name in diff :
+                reasons[name] += 1
+            if len(diff) > 0 :
+                changed_tables.append(table)
+        self.__logger.info("Changed tables {}/{} {}".format(len(changed_tables), len(tables), reasons))
+        return changed_tables, reasons
+
+    def mark(self, table) :
+        self.signatures[self.key(table)] = self.signature(table)
@@ -0,0 +1,66 @@
+import os
+import sys
+import json
+
+current_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(current_path + '/../config')
+from pnd_logger import PndLogger
+
+class SchemaSnapshot:
+    """
+    Column catalog of one source at the last run of one consumer (name = source, or source_consumer): per table the column rows (getTableColumns) and the schema fingerprint (getTableFingerprints).
+    changed() compares the current fingerprints with the snapshot, so column details are fetched only for the tables whose fingerprint differs.
+    """
+    def __init__(self, name, logger_name=None) :
+        self.__logger = PndLogger("Schema Snapshot Class", logger_name)
+        self.name = name
+        self.__path_of_snapshots = os.path.abspath(current_path + "/../../snapshot/schema")
+        self.__file_name = self.__path_of_snapshots + "/{}.json".format(name)
+        # table -> {"fingerprint": fingerprint, "columns": [column row, ...]}
+        self.tables = dict()
+        self.load()
+
+    def exists(self) :
+        return os.path.exists(self.__file_name)
+
+    def load(self) :
+        if not self.exists() :
+            self.tables = dict()
+            return self.tables
+        try :
+            with open(self.__file_name, 'r', encoding='utf-8') as f :
+                self.tables = json.load(f)
+            self.__logger.info("Loaded schema snapshot. [name = '{}' | tables = {}]".format(self.name, len(self.tables)))
+        except Exception as e :
+            self.__logger.error("Failed to load schema snapshot. - {}".format(e))
+            self.tables = dict()
+        return self.tables
+
+    def save(self) :
+        if not os.path.exists(self.__path_of_snapshots):
+            os.makedirs(self.__path_of_snapshots)
+        # 중간에 실패해도 이전 snapshot이 남도록 임시 파일에 쓴 뒤 교체
+        with open(self.__file_name + ".tmp", 'w', encoding='utf-8') as f :
+            json.dump(self.tables, f, default=str, ensure_ascii=False)
+        os.replace(self.__file_name + ".tmp", self.__file_name)
+        self.__logger.info("Saved schema snapshot. [name = '{}' | tables = {}]".format(self.name, len(self.tables)))
+
+    # (fingerprint가 다르거나 새로 생긴 테이블 목록, 없어진 테이블 목록)
+    def changed(self, fingerprints) :
+        changed_tables = sorted([table for table, fingerprint in fingerprints.items() if table not in self.tables or self.tables[table]["fingerprint"] != fingerprint])
+        deleted_tables = sorted([table for table in self.tables if table not in fingerprints])
+        self.__logger.info("Changed tables {}/{} | Deleted tables {}".format(len(changed_tables), len(fingerprints), len(deleted_tables)))
+        return changed_tables, deleted_tables
+
+    def update(self, table, fingerprint, columns) :
+        self.tables[table] = {"fingerprint": fingerprint, "columns": columns}
+
+    def remove(self, table) :
+        self.tables.pop(table, None)
+
+    # table -> TABLE_COLUMN key set
+    def table_columns(self) :
+        return {table: set([row["TABLE_COLUMN"] for row in info["columns"]]) for table, info in self.tables.items()}
+
+    def rows(self) :
+        return [row for info in self.tables.values() for row in info["columns"]]
@@ -29,6 +29,7 @@ if __name__ == "__main__":
     logger = PndLogger("Export Cluster", process_name)
     parser = argparse.ArgumentParser()  
     parser.add_argument("-t", "--type", dest="type", help="Export Clusters to Database", choices=["schema", "schema_hist", "values", "master", "metadata", "profiled", "table_status", "mixed", "pub_dt"], type=str, default=None)
+    parser.add_argument("-i", "--incremental", dest="incremental", help="Merge only changed rows since the last export", action="store_true")
     args = parser.parse_args()
     dm = DataManager(ConfigManager("tamr"), process_name)
 
@@ -38,17 +39,17 @@ if __name__ == "__main__":
         logger.info("Finish.")    
     elif args.type == 'schema' :
         logger.info("Start insert cluster schema.")
-        dm.insert_clusters_schema(dm.get_unified_published_clusters())
+        dm.insert_clusters_schema(dm.get_unified_published_clusters(), args.incremental)
         logger.info("Finish.")
     elif args.type == 'values' :
         logger.info("Start insert top and values.")
-        dm.insert_top_values(dm.get_unified_published_clusters_top_values_to_rows())
+        dm.insert_top_values(dm.get_unified_published_clusters_top_values_to_rows(), args.incremental)
         logger.info("Finish.")
     elif args.type == 'master' :
         logger.info("start insert cluster master.")
         dm.update_golden_record("Schema_Discovery_GR")
         logger.info("Golden record updated completed.")
-        dm.insert_clusters_master(dm.get_golden_record())        
+        dm.insert_clusters_master(dm.get_golden_record(), args.incremental)        
         logger.info("Insert Golden record completed.")
         # dm.update_clusters_publish_date(dm.get_unified_published_clusters_date())
         dm.insert_dataset_ui()
@@ -56,11 +57,11 @@ if __name__ == "__main__":
         logger.info("Finish.")    
     elif args.type == 'metadata' :
         logger.info("start insert metadata dataset.")        
-        dm.insert_metadata(dm.get_unified_metadata())
+        dm.insert_metadata(dm.get_unified_metadata(), args.incremental)
         logger.info("Finish.") 
     elif args.type == 'profiled' :
         logger.info("start insert profiled dataset.")
-        dm.insert_profiled(dm.get_unified_metadata_profiled())
+        dm.insert_profiled(dm.get_unified_metadata_profiled(), args.incremental)
         logger.info("Finish.") 
     elif args.type == 'mixed' :
         logger.info("start insert mixed tables.")
@@ -147,6 +148,7 @@ if __name__ == "__main__":
         for hive in hive_tables :
             if hive["TABLE_NAME"] not in oracle_table_names :
                 all_tables.append(hive)
+        pm.report_except()
         
         ######### oracle과 hive의 테이블 컬럼 수가 변경되었을 경우 다시 샘플링 ######### 
         for tb in all_tables :
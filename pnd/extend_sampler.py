@@ -12,6 +12,7 @@ import re
 import json
 import base64
 import requests
+import time
 from os.path import basename
 from chardet.universaldetector import UniversalDetector
 from tamr_unify_client.auth import UsernamePasswordAuth
@@ -20,6 +21,7 @@ current_path = os.path.dirname(os.path.realpath(__file__))
 
 sys.path.append(current_path + '/../src/')
 from data_preprocessor import DataPreprocessor
+from http_session import get_session, profile_timeout
 
 sys.path.append(current_path + '/config')
 from config_manager import ConfigManager
@@ -28,6 +30,7 @@ from pnd_logger import PndLogger
 sys.path.append(current_path + '/data')
 from data_manager import DataManager
 from custom_unify import CustomUnify
+from retry_queue import RetryQueue, classify_error, TRANSIENT
 
 class MixedSampler :
     def __init__(self, data_manager) :
@@ -47,75 +50,57 @@ class MixedSampler :
         self._jdbc_user = self.__cm_database.creds["user"]
         self._jdbc_password = self.__cm_database.creds["pwd"]
         self._url = "{}://{}:{}/api/jdbcIngest/profile".format(self.__cm_unify.creds["protocol"], self.__cm_unify.creds["hostname"], self.__cm_unify.creds["connectPort"])
-
-    def get_sampled_data(self) :
-        create_table_statement = "declare table_cnt number; begin select count(*) into table_cnt from user_tables where table_name = '{}'; if table_cnt > 0 then execute immediate 'drop table {}'; end if; execute immediate 'create table {} as select CN_MATL_DESC,ITG_MATL_ID,LEAF_CLASS_CD,LEAF_CLASS_NM,LOCK_CMT,MATC_MATL_DET_CATG_VAL,MATL_0_LEVEL_CD,MATL_1_LEVEL_CD,MATL_2_LEVEL_CD,MATL_3_LEVEL_CD,MATL_4_LEVEL_CD,MATL_5_LEVEL_CD,MATL_CHGR_CD_LVAL,MATL_DESC,MATL_GRP_DET_GBN_CD,MATL_GRP_ID,MATL_ID,MATL_NM_1,MATL_NM_2,MDM_STAT_CD,ORG_MATL_ID,PLANT_LVAL,PLANT_MATL_LVAL,PLANT_PURCHASE_GRP_LVAL,RGL_IRRGL_MATL_LVAL,SAP_MATL_DET_GRP_CD,SAP_MATL_STAT_LVAL,SAP_PLANT_LVAL,SHE_APPROVE_RSLT_VAL,SHE_USE_LVAL,SHORT_MATL_DESC,TECH_ATTR_GBN_CD,UOM_CD,USE_PLANT_LVAL,VENDOR_NM,VENDOR_PARTS_NO{} from TGF_MATL_M where matl_grp_det_gbn_cd = ''{}'' and tech_attr_gbn_cd = ''{}'''; end;"
-        drop_table_statement = "drop table {}"
+        # profile 요청은 df-connect가 끝날 때까지 응답이 없으므로 별도 read timeout (기본은 제한 없음)
+        self._profile_timeout = self.__cm_database.creds.get("profileTimeout")
+
+    def get_sampled_data(self, resume=False, retries=5, backoff=5) :
+        """
+        Profile every material table through df-connect. Transient errors are retried with backoff in the same run and
+        every table still failing is kept in the retry queue.
+        :param resume: Profile only the tables left in the retry queue by the last run
+        :param retries: Number of retries for transient errors
+        :param backoff: Seconds to wait before the first retry. Doubled on every retry
+        :return: None
+        """
         mat_codes = self.__dm.get_matrial_unique_codes()
         mat_attr_columns = self.__dm.get_matrial_attr_columns()
-        fail_cnt = 0
-        success_cnt = 0
-        failed_mat_codes = []
+        retry_queue = RetryQueue(self._profileDatasetName, "sampling")
+        if resume :
+            mat_codes = [code for code in mat_codes if self.__bindvar(code, [])["table_name"] in retry_queue]
+            self.__logger.info("[Source=mixed] Resume {} failed tables. (retry queue={})".format(len(mat_codes), len(retry_queue)))
 
+        # table_name -> (code, 오류 종류, 오류 메시지, 시도 횟수)
+        failed_mat_codes = dict()
         for code in mat_codes :
-            bindvar = {"table_name": "", "grp_cd": "", "attr_cd": "", "add_columns" : ""}
-            add_cols = ','.join(['{} as "{}"'.format(row["TECH_COL_ID"], row["ATTR_EN_NM"].upper()) for row in mat_attr_columns if row["MATL_GRP_DET_GBN_CD"] == code["MATL_GRP_DET_GBN_CD"] and row["TECH_ATTR_GBN_CD"] == code["TECH_ATTR_GBN_CD"]])
-
-            bindvar["table_name"] = "TGF_MATL_M__{}__{}".format(code["MATL_GRP_DET_GBN_CD"],code["TECH_ATTR_GBN_CD"]).replace(" ", "_").upper()
-            bindvar["grp_cd"] = code["MATL_GRP_DET_GBN_CD"]
-            bindvar["attr_cd"] = code["TECH_ATTR_GBN_CD"]
-            bindvar["add_columns"] = "," + add_cols if len(add_cols) > 0 else ""
-        
-            create_query = create_table_statement.format(bindvar["table_name"], bindvar["table_name"], bindvar["table_name"], bindvar["add_columns"], bindvar["grp_cd"], bindvar["attr_cd"])
-            drop_query = drop_table_statement.format(bindvar["table_name"])
-        
-            dm.execute_query(create_query)
-            result = self.profile(bindvar["table_name"])
-
-            if result == False :
-                fail_cnt += 1
-                self.__logger.info("[Source=mixed] Profiling table {} failed.".format(bindvar["table_name"]))
-                failed_mat_codes.append(code)
+            table_name, error = self.__sample(code, mat_attr_columns)
+            if error == None :
+                retry_queue.remove(table_name)
+                self.__logger.info("[Source=mixed] Profiling table {} Completed.".format(table_name))
             else :
-                success_cnt += 1
-                self.__logger.info("[Source=mixed] Profiling table {} Completed.".format(bindvar["table_name"]))                
-            dm.execute_query(drop_query)
-        
-        attempt_cnt = 1
-        while len(failed_mat_codes) != 0 :
-            self.__logger.info("[Source=mixed] Profiling number of retries [{}].".format(attempt_cnt))
-            idx = 0
-            success_cnt = 0
-            fail_cnt = 0
-
-            for code in failed_mat_codes :
-                bindvar = {"table_name": "", "grp_cd": "", "attr_cd": "", "add_columns" : ""}
-                add_cols = ','.join(['{} as "{}"'.format(row["TECH_COL_ID"], row["ATTR_EN_NM"].upper()) for row in mat_attr_columns if row["MATL_GRP_DET_GBN_CD"] == code["MATL_GRP_DET_GBN_CD"] and row["TECH_ATTR_GBN_CD"] == code["TECH_ATTR_GBN_CD"]])
-
-                bindvar["table_name"] = "TGF_MATL_M__{}__{}".format(code["MATL_GRP_DET_GBN_CD"],code["TECH_ATTR_GBN_CD"]).replace(" ", "_").upper()
-                bindvar["grp_cd"] = code["MATL_GRP_DET_GBN_CD"]
-                bindvar["attr_cd"] = code["TECH_ATTR_GBN_CD"]
-                bindvar["add_columns"] = "," + add_cols if len(add_cols) > 0 else ""
-        
-                create_query = create_table_statement.format(bindvar["table_name"], bindvar["table_name"], bindvar["table_name"], bindvar["add_columns"], bindvar["grp_cd"], bindvar["attr_cd"])
-                drop_query = drop_table_statement.format(bindvar["table_name"])
-        
-                dm.execute_query(create_query)
-                result = self.profile(bindvar["table_name"])
+                failed_mat_codes[table_name] = (code, classify_error(*error), error[1], 1)
+                self.__logger.info("[Source=mixed] Profiling table {} failed.".format(table_name))
 
-                if result == False :
-                    fail_cnt += 1
-                    self.__logger.info("[Source=mixed] Profiling table {} failed.".format(bindvar["table_name"]))                    
+        # 일시적인 오류만 재시도
+        for attempt_cnt in range(1, retries + 1) :
+            transient = [table_name for table_name in failed_mat_codes if failed_mat_codes[table_name][1] == TRANSIENT]
+            if len(transient) == 0 :
+                break
+            time.sleep(backoff * 2 ** (attempt_cnt - 1))
+            self.__logger.info("[Source=mixed] Profiling number of retries [{}]. (tables={})".format(attempt_cnt, len(transient)))
+            for table_name in transient :
+                code = failed_mat_codes[table_name][0]
+                table_name, error = self.__sample(code, mat_attr_columns)
+                if error == None :
+                    del failed_mat_codes[table_name]
+                    retry_queue.remove(table_name)
+                    self.__logger.info("[Source=mixed] Profiling table {} Completed.".format(table_name))
                 else :
-                    success_cnt += 1
-                    self.__logger.info("[Source=mixed] Profiling table {} Completed.".format(bindvar["table_name"]))
-                    failed_mat_codes.remove(bindvar["table_name"])
-                dm.execute_query(drop_query)
+                    failed_mat_codes[table_name] = (code, classify_error(*error), error[1], failed_mat_codes[table_name][3] + 1)
+                    self.__logger.info("[Source=mixed] Profiling table {} failed.".format(table_name))
 
-            if attempt_cnt > 5 :
-                self.__logger.info("[Source=mixed] attempt count over stop.")
-                break
-            attempt_cnt += 1
+        for table_name, (code, kind, message, attempts) in failed_mat_codes.items() :
+            retry_queue.add(table_name, code, kind, message, attempts)
+        retry_queue.save()
 
         self.__logger.info("[Source=mixed] Profiling Completed.")        
         if len(failed_mat_codes) != 0 :
@@ -123,6 +108,31 @@ class MixedSampler :
         else : 
             self.__logger.info("[Source=mixed] All tables profiling SUCCESSED.")
 
+    def __bindvar(self, code, mat_attr_columns) :
+        bindvar = {"table_name": "", "grp_cd": "", "attr_cd": "", "add_columns" : ""}
+        add_cols = ','.join(['{} as "{}"'.format(row["TECH_COL_ID"], row["ATTR_EN_NM"].upper()) for row in mat_attr_columns if row["MATL_GRP_DET_GBN_CD"] == code["MATL_GRP_DET_GBN_CD"] and row["TECH_ATTR_GBN_CD"] == code["TECH_ATTR_GBN_CD"]])
+
+        bindvar["table_name"] = "TGF_MATL_M__{}__{}".format(code["MATL_GRP_DET_GBN_CD"],code["TECH_ATTR_GBN_CD"]).replace(" ", "_").upper()
+        bindvar["grp_cd"] = code["MATL_GRP_DET_GBN_CD"]
+        bindvar["attr_cd"] = code["TECH_ATTR_GBN_CD"]
+        bindvar["add_columns"] = "," + add_cols if len(add_cols) > 0 else ""
+        return bindvar
+
+    # 자재 코드별 임시 테이블을 만들어 profile 후 삭제. (테이블명, 오류 또는 None) 반환
+    def __sample(self, code, mat_attr_columns) :
+        create_table_statement = "declare table_cnt number; begin select count(*) into table_cnt from user_tables where table_name = '{}'; if table_cnt > 0 then execute immediate 'drop table {}'; end if; execute immediate 'create table {} as select CN_MATL_DESC,ITG_MATL_ID,LEAF_CLASS_CD,LEAF_CLASS_NM,LOCK_CMT,MATC_MATL_DET_CATG_VAL,MATL_0_LEVEL_CD,MATL_1_LEVEL_CD,MATL_2_LEVEL_CD,MATL_3_LEVEL_CD,MATL_4_LEVEL_CD,MATL_5_LEVEL_CD,MATL_CHGR_CD_LVAL,MATL_DESC,MATL_GRP_DET_GBN_CD,MATL_GRP_ID,MATL_ID,MATL_NM_1,MATL_NM_2,MDM_STAT_CD,ORG_MATL_ID,PLANT_LVAL,PLANT_MATL_LVAL,PLANT_PURCHASE_GRP_LVAL,RGL_IRRGL_MATL_LVAL,SAP_MATL_DET_GRP_CD,SAP_MATL_STAT_LVAL,SAP_PLANT_LVAL,SHE_APPROVE_RSLT_VAL,SHE_USE_LVAL,SHORT_MATL_DESC,TECH_ATTR_GBN_CD,UOM_CD,USE_PLANT_LVAL,VENDOR_NM,VENDOR_PARTS_NO{} from TGF_MATL_M where matl_grp_det_gbn_cd = ''{}'' and tech_attr_gbn_cd = ''{}'''; end;"
+        drop_table_statement = "drop table {}"
+        bindvar = self.__bindvar(code, mat_attr_columns)
+        create_query = create_table_statement.format(bindvar["table_name"], bindvar["table_name"], bindvar["table_name"], bindvar["add_columns"], bindvar["grp_cd"], bindvar["attr_cd"])
+        drop_query = drop_table_statement.format(bindvar["table_name"])
+
+        self.__dm.execute_query(create_query)
+        try :
+            error = self.profile(bindvar["table_name"])
+        finally :
+            self.__dm.execute_query(drop_query)
+        return bindvar["table_name"], error
+
     def profile(self, table):
         queryConfig = \
             {
@@ -142,12 +152,18 @@ class MixedSampler :
             }        
         self.__logger.debug("df connect info = {}".format(queryConfig["queryTargetList"]))
         headers = {'Content-Type': 'application/json', 'Accept': 'application/json', 'Authorization': self._basicCreds}
-        response = requests.post(self._url, headers=headers, data=json.dumps(queryConfig))
+        try :
+            response = get_session().post(self._url, headers=headers, data=json.dumps(queryConfig),
+                                          timeout=profile_timeout(self._profile_timeout))
+        except Exception as e :
+            self.__logger.error("Request to profile {} has failed".format(table))
+            self.__logger.error(e)
+            return None, str(e)
         if response.status_code != 200:
             self.__logger.error("Request to profile {} has failed".format(table))
             self.__logger.error(response.text)
-            return False
-        return
+            return response.status_code, response.text
+        return None
 
 if __name__ == "__main__" :
     logger_name = "sampling"
@@ -158,6 +174,7 @@ if __name__ == "__main__" :
     parser_sampling = subparsers.add_parser("sample", help="sample help")
     parser_sampling.add_argument("-n", "--name", dest="name", type=str, choices=["mixed", "erp", "dap"], default=None, required=True, help="name of data source")
     parser_sampling.add_argument("-r", "--reload", dest="does_reload", help="reload all tables", action="store_true")
+    parser_sampling.add_argument("--resume", dest="resume", help="sample only the tables failed in the last run", action="store_true")
     args = parser.parse_args()
     
     cm = ConfigManager(args.name, logger_name)
@@ -180,7 +197,7 @@ if __name__ == "__main__" :
     if args.name == "mixed" :
         logger.info("Sampling mixed...")
         sampler = MixedSampler(dm)
-        sampler.get_sampled_data()        
+        sampler.get_sampled_data(args.resume)        
 
     if args.name == "erp" :
         logger.info("Sampling ERP...")
@@ -13,18 +13,26 @@ sys.path.append(current_path + '/data')
 from data_manager import DataManager
 from custom_unify import CustomUnify
 from except_manager import ExceptManager
+from schema_snapshot import SchemaSnapshot
 
 class SchemaCompare :
     def __init__(self, database, logger_nm=None):
         logger_name = "compare" if logger_nm is None else logger_nm
         self.__logger = PndLogger("Schema Compare Class", logger_name)
         self.__source = database
-        self.__dm = DataManager(database, "unify", logger_name)
-        self.__dm_mdm = DataManager("mdm", "unify", logger_name)
-        self.__cm_unify = ConfigManager("unify", logger_name)
-        self.__cm_mdm = ConfigManager("mdm", logger_name)
+        self.__dm = DataManager(ConfigManager(database), logger_name)
+        self.__dm_mdm = DataManager(ConfigManager("mdm"), logger_name)
+        self.__cm_unify = ConfigManager("unify")
+        self.__cm_mdm = ConfigManager("mdm")
         self.__unify = CustomUnify(self.__cm_unify, logger_name)
         self.__em = ExceptManager(database, logger_nm)
+        # 마지막 실행 시점의 컬럼 catalog. 있으면 unify metadata 대신 비교 기준으로 사용
+        self.__snapshot = SchemaSnapshot(database, logger_name)
+        self.__snapshot_refreshed = None
+        # 갱신 전 snapshot의 테이블 항목. profile에 실패한 테이블은 저장할 때 이 항목으로 되돌림
+        self.__previous_snapshot_tables = dict()
+        # fingerprint가 바뀐 테이블 (None이면 전체 테이블을 비교)
+        self.__changed_tables = None
         
         self.is_exist_dataset = False
         self.is_exist()
@@ -35,16 +43,26 @@ class SchemaCompare :
         self.database_tables = None
         self.lake_table_info = None
         self.lake_fabs_info = None
+        # table -> TABLE_COLUMN key set (database / metadata dataset)
+        self.__database_columns = dict()
+        self.__metadata_columns = dict()
+        # 삭제되지 않은 테이블의 TABLE_COLUMN key set (is_deleted_column)
+        self.__column_index = frozenset()
+        # LAKE_TABLE_NM -> lake table 정보
+        self.__lake_table_index = dict()
         
         self.new_tables = []
         self.deleted_tables = []
         self.updated_tables = []
+        # new/deleted/updated 테이블 목록과 테이블별 추가/삭제된 컬럼
+        self.diff = {"new_tables": [], "deleted_tables": [], "updated_tables": [], "added_columns": {}, "removed_columns": {}}
         
         if self.is_exist_dataset :
             self.__init_dataset_properties()
             self.__new_tables()
             self.__deleted_tables()
             self.__updated_tables()
+            self.__em.report_except()
             self.__logger.info("Compare Tables  All={}  New={}  Update={}  Deleted={}".format(len(self.database_tables), len(self.new_tables), len(self.updated_tables), len(self.deleted_tables)))
 
     def is_exist(self) :
@@ -61,24 +79,75 @@ class SchemaCompare :
         if self.__source == 'mixed' and "ZTECH" not in table_column :
             return False
 
-        database_columns = [row["TABLE_COLUMN"] for row in self.all_table_columns if row["TABLE_NAME"] not in self.deleted_tables]
-        return True if table_column not in database_columns else False
+        return table_column not in self.__column_index
+
+    @staticmethod
+    def __split_table_column(table_column) :
+        # "TABLE-COLUMN" -> (TABLE, COLUMN)
+        table, column = (str(table_column).split("-", 1) + [""])[:2]
+        return table.strip(), column.strip()
+
+    def __index_columns(self, table_columns) :
+        index = dict()
+        for table_column in table_columns :
+            table, column = self.__split_table_column(table_column)
+            index.setdefault(table, set()).add(table_column)
+        return index
+
+    def __refresh_snapshot(self) :
+        if self.__snapshot_refreshed == None :
+            self.__previous_snapshot_tables = dict(self.__snapshot.tables)
+            self.__snapshot_refreshed = self.__dm.refresh_schema_snapshot(self.__snapshot)
+        return self.__snapshot_refreshed
+
+    # 비교 결과를 처리한 뒤 호출. 다음 실행은 이 snapshot과 fingerprint가 다른 테이블만 비교
+    # failed_tables는 이전 항목으로 되돌려서 (없던 테이블은 빼서) 다음 실행에서 다시 new/updated로 찾도록 함
+    def save_snapshot(self, failed_tables=None) :
+        if self.__refresh_snapshot() == None :
+            return
+        for table in failed_tables or [] :
+            if table in self.__previous_snapshot_tables :
+                self.__snapshot.tables[table] = self.__previous_snapshot_tables[table]
+            else :
+                self.__snapshot.remove(table)
+        self.__snapshot.save()
 
     def __init_dataset_properties(self) :
         try:
             dataset_name = "{}_column_metadata".format(self.__source)
-            #  table_column 별 spec 정보 목록
-            self.all_table_columns = [row for row in self.__dm.get_all_table_columns()]
-            # source의 column_metadata 
-            self.metadata_dataset = [row for row in self.__dm.get_stream_dataset_by_name(dataset_name)]
-            # source의 metadata table 목록
-            self.metadata_tables = list(set([''.join(row["TableName"]) for row in self.metadata_dataset]))
-            # database의 table 목록
-            self.database_tables = list(set([''.join(row["TABLE_NAME"]) for row in self.__dm.get_all_table()]))
+            previous_exists = self.__snapshot.exists()
+            previous_columns = self.__snapshot.table_columns()
+            if self.__refresh_snapshot() != None :
+                # fingerprint가 바뀐 테이블의 컬럼만 조회하고 나머지는 snapshot에서 가져옴
+                self.all_table_columns = self.__snapshot.rows()
+                self.database_tables = frozenset(self.__snapshot.tables)
+            else :
+                #  table_column 별 spec 정보 목록
+                self.all_table_columns = [row for row in self.__dm.get_table_columns()]
+                # database의 table 목록
+                self.database_tables = frozenset([''.join(row) for row in self.__dm.get_all_tables()])
+
+            if previous_exists and self.__snapshot_refreshed != None :
+                # 이전 snapshot을 metadata로 사용. fingerprint가 같은 테이블은 비교하지 않음
+                self.metadata_dataset = []
+                self.metadata_tables = frozenset(previous_columns)
+                self.__metadata_columns = previous_columns
+                self.__changed_tables = frozenset(self.__snapshot_refreshed[0])
+            else :
+                # source의 column_metadata 
+                self.metadata_dataset = [row for row in self.__dm.get_stream_dataset_by_name(dataset_name)]
+                # source의 metadata table 목록
+                self.metadata_tables = frozenset([''.join(row["TableName"]) for row in self.metadata_dataset])
+                self.__metadata_columns = self.__index_columns([row["Tamr_Profiling_Seq"] for row in self.metadata_dataset])
             # lake table 명칭 변환 정보 목록
             self.lake_table_info = self.__dm_mdm.execute_query(self.__cm_mdm.queries["getTableInfo"])
             # lake fab 명칭 변환 정보 목록
             self.lake_fabs_info = list(set([row["FAB_LAKE"] for row in self.lake_table_info]))
+            for info in self.lake_table_info :
+                self.__lake_table_index.setdefault(info["LAKE_TABLE_NM"], info)
+
+            # 테이블별 컬럼 index. 비교는 모두 set 연산으로 수행
+            self.__database_columns = self.__index_columns([row["TABLE_COLUMN"] for row in self.all_table_columns])
             
             self.__logger.info("All Talble Columns = {} | Metadata Dataset Rows/Tables = {}/{} | Database Tables = {}".format(len(self.all_table_columns), len(self.metadata_dataset), len(self.metadata_tables), len(self.database_tables)))
             self.__logger.debug("metadata tables={}".format(self.metadata_tables))
@@ -90,9 +159,10 @@ class SchemaCompare :
     # 새로 추가된 테이블 목록
     def __new_tables(self) :
         try :
-            new_tables = [row for row in self.database_tables if row not in self.metadata_tables and self.__em.except_table(row) == False]
+            new_tables = sorted([row for row in self.database_tables - self.metadata_tables if self.__em.except_table(row) == False])
             self.__logger.info("New count={}  tables={}".format(len(new_tables), ",".join(new_tables)))
             self.new_tables = new_tables
+            self.diff["new_tables"] = list(new_tables)
         except Exception as e :
             self.__logger.error(e)
         return
@@ -100,29 +170,41 @@ class SchemaCompare :
     # 삭제된 테이블 목록
     def __deleted_tables(self) :        
         try :
-            deleted_tables = list(set([row for row in self.metadata_tables if row not in self.database_tables and self.__em.except_table(row) == False]))        
+            deleted_tables = sorted([row for row in self.metadata_tables - self.database_tables if self.__em.except_table(row) == False])
             self.__logger.debug("Deleted count={}  tables={} ".format(len(deleted_tables), ",".join(deleted_tables)))
             self.deleted_tables = deleted_tables
+            self.diff["deleted_tables"] = list(deleted_tables)
         except Exception as e :
             self.__logger.error(e)
         return
 
-    # 변경된 테이블 목록
+    # 변경된 테이블 목록 (database에 컬럼이 추가된 테이블). 테이블별 추가/삭제 컬럼은 diff에 기록
     def __updated_tables(self) :
-        metadata_columns = [row["Tamr_Profiling_Seq"] for row in self.metadata_dataset if row["TableName"] not in self.deleted_tables]
-        database_tables = list(set([''.join(row) for row in self.database_tables if row not in self.deleted_tables and self.__em.except_table(row) == False]))
-        database_columns = [row["TABLE_COLUMN"] for row in self.all_table_columns if row["TABLE_NAME"] in database_tables and row["TABLE_NAME"] not in self.deleted_tables]
-        updated_tables = []
-
-        for db in database_columns :
-            table = str(db.split("-")[0]).strip()
-            if db not in metadata_columns and table not in self.new_tables and self.__em.except_table(table) == False :
-                updated_tables.append(str(db.split("-")[0]).strip())
-                #self.__logger.debug("[{}]Updated table_column - {}".format(self.__source, db))
-
-        updated_tables = list(set(updated_tables))
+        deleted_tables = frozenset(self.deleted_tables)
+        new_tables = frozenset(self.new_tables)
+        self.__column_index = frozenset([table_column for table, table_columns in self.__database_columns.items() if table not in deleted_tables for table_column in table_columns])
+
+        added_columns = dict()
+        removed_columns = dict()
+        tables = self.database_tables if self.__changed_tables == None else self.database_tables & self.__changed_tables
+        for table in tables :
+            if table in new_tables or self.__em.except_table(table) :
+                continue
+            database_columns = self.__database_columns.get(table, set())
+            metadata_columns = self.__metadata_columns.get(table, set())
+            added = database_columns - metadata_columns
+            removed = metadata_columns - database_columns
+            if len(added) > 0 :
+                added_columns[table] = sorted([self.__split_table_column(table_column)[1] for table_column in added])
+            if len(removed) > 0 :
+                removed_columns[table] = sorted([self.__split_table_column(table_column)[1] for table_column in removed])
+
+        updated_tables = sorted(added_columns.keys())
         self.__logger.debug("Updated count={}  tables={} ".format(len(updated_tables), ",".join(updated_tables)))
         self.updated_tables = updated_tables
+        self.diff["updated_tables"] = list(updated_tables)
+        self.diff["added_columns"] = added_columns
+        self.diff["removed_columns"] = removed_columns
         return
 
     # unify에서 metadata를 삭제
@@ -135,15 +217,13 @@ class SchemaCompare :
 
     def get_convert_system_fab_name(self, table_name) :
         result = { "SYSTEM":None, "FAB":"" }
-        system_tamr = None
         
-        for info in self.lake_table_info :
-            if info["LAKE_TABLE_NM"] == table_name :
-                self.__logger.debug("Matched table = {}    system = {}".format(table_name, info["SYSTEM_NM"]))
-                result["SYSTEM"] = info["SYSTEM_NM"]
-                break
-            else:
-                self.__logger.debug("Unmatched table = {}    system = {}".format(table_name, info["SYSTEM_NM"]))
+        info = self.__lake_table_index.get(table_name)
+        if info != None :
+            self.__logger.debug("Matched table = {}    system = {}".format(table_name, info["SYSTEM_NM"]))
+            result["SYSTEM"] = info["SYSTEM_NM"]
+        else:
+            self.__logger.debug("Unmatched table = {}".format(table_name))
 
         return result
 
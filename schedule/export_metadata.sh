@@ -1,3 +1,3 @@
 cd /home/pnd/customers-skhynix
 source setup.sh
-/usr/local/bin/python3 pnd/export.py -t metadata
\ No newline at end of file
+/usr/local/bin/python3 pnd/export.py -t metadata -i
\ No newline at end of file
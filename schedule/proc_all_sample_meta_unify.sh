@@ -2,8 +2,8 @@ cd /home/pnd/customers-skhynix
 source setup.sh
 /usr/local/bin/python3 src/run.py sample -m connect -s oracle -n mdm 
 /usr/local/bin/python3 src/run.py sample -m connect -s oracle -n mixed
-/usr/local/bin/python3 src/run.py sample -m connect -s oracle -n legacy
+/usr/local/bin/python3 src/run.py sample -m connect -s oracle -n legacy -i
 /usr/local/bin/python3 src/run.py metadata -m connect -s oracle -n mdm -d /home/pnd/customers-skhynix/token_tamr_combined.csv
 /usr/local/bin/python3 src/run.py metadata -m connect -s oracle -n mixed -d /home/pnd/customers-skhynix/token_tamr_combined.csv
 /usr/local/bin/python3 src/run.py metadata -m connect -s oracle -n legacy -d /home/pnd/customers-skhynix/token_tamr_combined.csv
-/usr/local/bin/python3 src/run.py unify -r
\ No newline at end of file
+/usr/local/bin/python3 src/run.py unify -r --delta
\ No newline at end of file
@@ -14,8 +14,13 @@ import time
 from chardet.universaldetector import UniversalDetector
 from custom_logger import CustomLogger
 from unify import Unify
+from token_normalizer import TokenNormalizer
 from collections import OrderedDict
-from multiprocessing import Process
+from multiprocessing import Process, Queue, Event
+import queue
+import threading
+import itertools
+import io
 
 path_of_src = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(path_of_src + '/../pnd')
@@ -34,6 +39,11 @@ class DataMultiPreprocessor(object):
     """
     This is a class to generate metadata from source data csv files and save metadata into csv files
     """
+    # writer process의 파일 buffer 크기
+    write_buffer_size = 4 * 1024 * 1024
+    # queue put/get 및 process join 대기 시간(초). 대기 중에도 stop 여부를 주기적으로 확인
+    queue_timeout = 1
+
     def __init__(self, input_folder, output_folder, unify_config, source_config, path_to_token_dict=None):
 
         self.input_folder = input_folder
@@ -47,18 +57,25 @@ class DataMultiPreprocessor(object):
             self.token_dictionary = self._get_token_dict(path_to_token_dict)
         else:
             self.token_dictionary = None
+        self._token_normalizer = TokenNormalizer(self.token_dictionary)
 
         # pnd customize
         self.pnd_logger = PndLogger("Data Multi Preprocessor", "preprocess")
         self._pm = ProfileManager(self._source_config["name"], True, "preprocess")        
         self._legacy_extend_columns = None        
         self._all_table_columns = self._pm.getAllTableColumns()
+        # worker process에서 record마다 O(1)로 조회하도록 TABLE_COLUMN 기준 index를 미리 생성 (fork 후 읽기 전용으로 공유)
+        self._table_column_index = dict()
+        for row in self._all_table_columns if self._all_table_columns is not None else [] :
+            self._table_column_index.setdefault(row["TABLE_COLUMN"], []).append(row)
 
         if self._source_config["name"] == 'legacy' :
             cm = ConfigManager("tamr")
             dm = DataManager(ConfigManager("tamr"), "preprocess")
-            self.__table_system_info = dm.get_system_from_table()
+            self.__table_system_info = self._pm.index_system_info(dm.get_system_from_table())
             self.__legacy_extend_columns = dm.execute_query(cm.queries["getColumnDictLegacy"])
+            # DIC_PHY_NM 기준 index. 같은 컬럼이 여러 건이면 마지막 row를 사용
+            self.__legacy_extend_column_index = {row["DIC_PHY_NM"]: row for row in (self.__legacy_extend_columns if self.__legacy_extend_columns is not None else [])}
             # self._erp_all_table_columns = dm_mdm.execute_query(cm.queries["getAllColumnsForErp"])
         
     def _get_token_dict(self, path_to_dict):
@@ -99,14 +116,7 @@ class DataMultiPreprocessor(object):
         :param column_name: Already tokenized column name
         :return: Column name with token normalized using dictionary
         """
-        result = column_name.lower()
-        if self.token_dictionary is None:
-            return result
-        tokens = self.token_dictionary.keys()
-        for token in tokens:
-            regex_token = re.compile(r'\b{}\b'.format(token), re.IGNORECASE)
-            result = regex_token.sub(self.token_dictionary[token], result)
-        return result
+        return self._token_normalizer.normalize(column_name)
 
     @staticmethod
     def _get_keys(phrases):
@@ -186,156 +196,215 @@ class DataMultiPreprocessor(object):
             types.append('alphanumeric')
         return ' '.join(types), ' '.join([str(item) for item in n_digits])
 
-    def worker(self, id, writer, data_list) :        
-        # if id == 0:
-        #     self.pnd_logger.info("header created...")
-        #     writer.writeheader()
-        cur_idx = 0
-        end_idx = len(data_list)
-        success_cnt = 0
-        exp_cnt = 0
-        for line in data_list:            
-            cur_idx += 1
-            try:
-                record = json.loads(line)
-                
-                # blob 과 clob 타입인 컬럼은 제외
-                if self._pm.except_column(''.join(record['TableName']), ''.join(record['ColumnName']), ''.join(record['ColumnType'])) :
-                    exp_cnt += 1                    
-                    continue
-               
-                # 비교 컬럼 설정
-                keyword = record["Tamr_Profiling_Seq"].upper()
-                mixed_column_tmp = None
-                column_name = ''.join(record['ColumnName'])
-
-                if self._source_config["name"] in ["mdm", "mixed"] :
-                    for row in self._all_table_columns :
-                        if keyword == row["TABLE_COLUMN"] :
-                            record['ATTR_EN_NM'] = row['ATTR_EN_NM']
-                            mixed_column_tmp = row['TECH_COL_ID'] if self._source_config["name"] == "mixed" else ""
-                            p = re.compile("[^0-9]")
-                            if re.match("^PROP$|^SAP$|^ZTECH$|^ATTR$|^BOM$", "".join(p.findall(''.join(record['ColumnName'])))) is not None and \
-                                re.search("[ㄱ-ㅣ가-힣|\(|\)|\[|\]]+", row["ATTR_EN_NM"]) is None and \
-                                row["ATTR_EN_NM"] is not None:
-                                column_name = ''.join(row["ATTR_EN_NM"])
-                            
-                if len(record['ColumnName']) > 0:
-                    column_name_tokenized = ' '.join(self._tokenize_column_name(column_name))
-                    column_name_standardized = self._normalize_column_name(column_name_tokenized)
-                else:
-                    column_name = ''
-                    column_name_tokenized = ''
-                    column_name_standardized = ''
-
-                keys = ''
-                top_n_values = []
-                top_n_values_freq = ''
-                patterns = ''
-                patterns_freq = ''
-                if record['Top100Values'] is not None and len(str(record['Top100Values'][0]).strip()) > 0:
-                    keys = self._get_keys(record['Top100Values'])                                                            
+    # profiled record 1건을 metadata row로 변환. 제외 대상이면 None
+    def _process_record(self, line) :
+        record = json.loads(line)
+        
+        # blob 과 clob 타입인 컬럼은 제외
+        if self._pm.except_column(''.join(record['TableName']), ''.join(record['ColumnName']), ''.join(record['ColumnType'])) :
+            return None
+
+        # 비교 컬럼 설정
+        keyword = record["Tamr_Profiling_Seq"].upper()
+        mixed_column_tmp = None
+        column_name = ''.join(record['ColumnName'])
+        matched_rows = self._table_column_index.get(keyword, [])
+
+        if self._source_config["name"] in ["mdm", "mixed"] :
+            for row in matched_rows :
+                if keyword == row["TABLE_COLUMN"] :
+                    record['ATTR_EN_NM'] = row['ATTR_EN_NM']
+                    mixed_column_tmp = row['TECH_COL_ID'] if self._source_config["name"] == "mixed" else ""
+                    p = re.compile("[^0-9]")
+                    if re.match("^PROP$|^SAP$|^ZTECH$|^ATTR$|^BOM$", "".join(p.findall(''.join(record['ColumnName'])))) is not None and \
+                        re.search("[ㄱ-ㅣ가-힣|\(|\)|\[|\]]+", row["ATTR_EN_NM"]) is None and \
+                        row["ATTR_EN_NM"] is not None:
+                        column_name = ''.join(row["ATTR_EN_NM"])
                     
-                    sorted_Top100Values = OrderedDict(sorted(json.loads(record['Top100Counts'][0]).items(), key=lambda x: x[1], reverse=True))
-                    top_n_values = list(sorted_Top100Values.keys())[:20]
-
-                    if 'Top100Frequencies' in record and record['Top100Frequencies'] is not None and record['Top100Frequencies'][0] != '':
-                        if record['Top100Frequencies'][0] == "{}":
-                            record['Top100Frequencies'] = [""]
-                            top_n_values_freq = {}                            
-                        else:
-                            try:
-                                top_n_values_freq = json.loads(record['Top100Frequencies'][0])
-                            except Exception as e:
-                                self.pnd_logger.error(e)
-                                top_n_values_freq = {}
-                            record['Top100Frequencies'] = ['"""' + record['Top100Frequencies'][0] + '"""']
-                    else:
+        if len(record['ColumnName']) > 0:
+            column_name_tokenized = ' '.join(self._tokenize_column_name(column_name))
+            column_name_standardized = self._normalize_column_name(column_name_tokenized)
+        else:
+            column_name = ''
+            column_name_tokenized = ''
+            column_name_standardized = ''
+
+        keys = ''
+        top_n_values = []
+        top_n_values_freq = ''
+        patterns = ''
+        patterns_freq = ''
+        if record['Top100Values'] is not None and len(str(record['Top100Values'][0]).strip()) > 0:
+            keys = self._get_keys(record['Top100Values'])                                                            
+            
+            sorted_Top100Values = OrderedDict(sorted(json.loads(record['Top100Counts'][0]).items(), key=lambda x: x[1], reverse=True))
+            top_n_values = list(sorted_Top100Values.keys())[:20]
+
+            if 'Top100Frequencies' in record and record['Top100Frequencies'] is not None and record['Top100Frequencies'][0] != '':
+                if record['Top100Frequencies'][0] == "{}":
+                    record['Top100Frequencies'] = [""]
+                    top_n_values_freq = {}                            
+                else:
+                    try:
+                        top_n_values_freq = json.loads(record['Top100Frequencies'][0])
+                    except Exception as e:
+                        self.pnd_logger.error(e)
                         top_n_values_freq = {}
-                        for value in top_n_values:
-                            top_n_values_freq[value] =  1./len(top_n_values)
-                    patterns_freq = self._get_patterns(top_n_values_freq)
-                    patterns = ' '.join(list(set(patterns_freq.keys())))
-
-                business_type, length = self._get_business_types_and_length(top_n_values)
-                top_n_values = ', '.join(top_n_values)
-                for key in record.keys():
-                    if isinstance(record[key], list):
-                        record[key] = ' '.join(record[key])
-
-                record['Tamr_Profiling_Seq'] = record['Tamr_Profiling_Seq'].upper()
-                record['column_name_tokenized'] = column_name_tokenized.upper()
-                record['column_name_tokenized_std'] = column_name_standardized.upper()
-                record['business_type'] = business_type
-                record['length'] = length
-                record['keys'] = keys
-                record['patterns'] = patterns                
-                record['Top100Frequencies'] = ""
-                record['KEY_DOM_NM'] = ""
-                record['top_n_values'] = top_n_values
-
-                if self._source_config["name"] == "mixed" :
+                    record['Top100Frequencies'] = ['"""' + record['Top100Frequencies'][0] + '"""']
+            else:
+                top_n_values_freq = {}
+                for value in top_n_values:
+                    top_n_values_freq[value] =  1./len(top_n_values)
+            patterns_freq = self._get_patterns(top_n_values_freq)
+            patterns = ' '.join(list(set(patterns_freq.keys())))
+
+        business_type, length = self._get_business_types_and_length(top_n_values)
+        top_n_values = ', '.join(top_n_values)
+        for key in record.keys():
+            if isinstance(record[key], list):
+                record[key] = ' '.join(record[key])
+
+        record['Tamr_Profiling_Seq'] = record['Tamr_Profiling_Seq'].upper()
+        record['column_name_tokenized'] = column_name_tokenized.upper()
+        record['column_name_tokenized_std'] = column_name_standardized.upper()
+        record['business_type'] = business_type
+        record['length'] = length
+        record['keys'] = keys
+        record['patterns'] = patterns                
+        record['Top100Frequencies'] = ""
+        record['KEY_DOM_NM'] = ""
+        record['top_n_values'] = top_n_values
+
+        if self._source_config["name"] == "mixed" :
+            record['SYSTEM_NAME'] = "GMDM"
+            record['FAB'] = "ALL"                    
+            record['ColumnName'] = mixed_column_tmp if mixed_column_tmp is not None else record['ColumnName']
+            row = matched_rows[-1] if len(matched_rows) > 0 else {}
+            record['KEY_DOM_NM'] =  "" if 'KEY_DOM_NM' not in row else str(row['KEY_DOM_NM']).replace("FAB", "공장").replace("스텝", "공정").replace("상세공장", "공장").replace("PKT", "패키지").replace("제조사", "업체")
+        elif self._source_config["name"] == "mdm" :
+            for row in matched_rows : 
+                if keyword == row["TABLE_COLUMN"] :                            
                     record['SYSTEM_NAME'] = "GMDM"
-                    record['FAB'] = "ALL"                    
-                    record['ColumnName'] = mixed_column_tmp if mixed_column_tmp is not None else record['ColumnName']
+                    record['FAB'] = "ALL"                            
+                    record['COL_DESC'] =  "" if 'COL_DESC' not in row else row['COL_DESC']
+                    record['COL_KO_NM'] =  "" if 'COL_KO_NM' not in row else row['COL_KO_NM']
                     record['KEY_DOM_NM'] =  "" if 'KEY_DOM_NM' not in row else str(row['KEY_DOM_NM']).replace("FAB", "공장").replace("스텝", "공정").replace("상세공장", "공장").replace("PKT", "패키지").replace("제조사", "업체")
-                elif self._source_config["name"] == "mdm" :
-                    for row in self._all_table_columns : 
-                        if keyword == row["TABLE_COLUMN"] :                            
-                            record['SYSTEM_NAME'] = "GMDM"
-                            record['FAB'] = "ALL"                            
-                            record['COL_DESC'] =  "" if 'COL_DESC' not in row else row['COL_DESC']
-                            record['COL_KO_NM'] =  "" if 'COL_KO_NM' not in row else row['COL_KO_NM']
-                            record['KEY_DOM_NM'] =  "" if 'KEY_DOM_NM' not in row else str(row['KEY_DOM_NM']).replace("FAB", "공장").replace("스텝", "공정").replace("상세공장", "공장").replace("PKT", "패키지").replace("제조사", "업체")
-                elif self._source_config["name"] == "legacy" :                    
-                    record["SYSTEM_NAME"] = self._pm.get_convert_system_fab_name(self.__table_system_info, str(record["TableName"]).replace("__", "_"))["SYSTEM"]
-                    record["FAB"] = self._pm.get_convert_system_fab_name(self.__table_system_info, record["TableName"])["FAB"]                    
-                    for row in self.__legacy_extend_columns : 
-                        if record['ColumnName'] == row["DIC_PHY_NM"] :
-                            record['COL_DESC'] =  "" if 'DIC_DESC' not in row else row['DIC_DESC']
-                            record['COL_KO_NM'] =  "" if 'DIC_LOG_NM' not in row else str(row['DIC_LOG_NM']).replace("FAB", "공장").replace("스텝", "공정").replace("상세공장", "공장").replace("PKT", "패키지").replace("제조사", "업체")
-                            record['KEY_DOM_NM'] =  "" if 'KEY_DOM_NM' not in row else str(row['KEY_DOM_NM']).replace("FAB", "공장").replace("스텝", "공정").replace("상세공장", "공장").replace("PKT", "패키지").replace("제조사", "업체")
-                    # if str(record['Tamr_Profiling_Seq']).startswith("ERP_") :
-                    #     for row in self._erp_all_table_columns : 
-                    #         if keyword == row["TABLE_COLUMN"] :
-                    #             record['ATTR_EN_NM'] =  "" if 'ATTR_EN_NM' not in row else row['ATTR_EN_NM']
-                    #             record['COL_DESC'] =  "" if 'DIC_DESC' not in row else row['DIC_DESC']                            
-                    #             record['KEY_DOM_NM'] = ""
-                    # else :                        
-                    #     for row in self.__legacy_extend_columns : 
-                    #         if record['ColumnName'] == row["DIC_PHY_NM"] :
-                    #             record['COL_DESC'] =  "" if 'DIC_DESC' not in row else row['DIC_DESC']
-                    #             record['COL_KO_NM'] =  "" if 'DIC_LOG_NM' not in row else str(row['DIC_LOG_NM']).replace("FAB", "공장").replace("스텝", "공정").replace("상세공장", "공장").replace("PKT", "패키지").replace("제조사", "업체")
-                    #             record['KEY_DOM_NM'] =  "" if 'KEY_DOM_NM' not in row else str(row['KEY_DOM_NM']).replace("FAB", "공장").replace("스텝", "공정").replace("상세공장", "공장").replace("PKT", "패키지").replace("제조사", "업체")
-
-                record['ColumnName'] = record['ColumnName'].upper()
-                # profiled 데이터에 아래 패턴의 컬럼 및 데이터가 있을 경우 profiled에서 제외
-                if self._pm.except_column(''.join(record['TableName']), ''.join(record['ColumnName']), ''.join(record['ColumnName'])) :
-                    exp_cnt += 1                    
-                elif self._pm.except_column(''.join(record['TableName']), ''.join(record['ColumnName']), ''.join(record['KEY_DOM_NM'])) :
-                    exp_cnt += 1                                    
-                elif self._pm.except_column(''.join(record['TableName']), ''.join(record['ColumnName']), ''.join(record['column_name_tokenized_std'])) :
-                    exp_cnt += 1
-                else :                      
-                    writer.writerow(record)
-                    success_cnt += 1
-                
-                self.pnd_logger.info("[Source={}] [Thread No={}] {} / {} rows completed, success={} , except={}".format(self._source_config["name"], id, cur_idx, end_idx, success_cnt, exp_cnt))
-            except Exception as e:
-                exp_cnt += 1
-                self.pnd_logger.error(e)                
+        elif self._source_config["name"] == "legacy" :                    
+            record["SYSTEM_NAME"] = self._pm.get_convert_system_fab_name(self.__table_system_info, str(record["TableName"]).replace("__", "_"))["SYSTEM"]
+            record["FAB"] = self._pm.get_convert_system_fab_name(self.__table_system_info, record["TableName"])["FAB"]                    
+            row = self.__legacy_extend_column_index.get(record['ColumnName'])
+            if row is not None :
+                if record['ColumnName'] == row["DIC_PHY_NM"] :
+                    record['COL_DESC'] =  "" if 'DIC_DESC' not in row else row['DIC_DESC']
+                    record['COL_KO_NM'] =  "" if 'DIC_LOG_NM' not in row else str(row['DIC_LOG_NM']).replace("FAB", "공장").replace("스텝", "공정").replace("상세공장", "공장").replace("PKT", "패키지").replace("제조사", "업체")
+                    record['KEY_DOM_NM'] =  "" if 'KEY_DOM_NM' not in row else str(row['KEY_DOM_NM']).replace("FAB", "공장").replace("스텝", "공정").replace("상세공장", "공장").replace("PKT", "패키지").replace("제조사", "업체")
+            # if str(record['Tamr_Profiling_Seq']).startswith("ERP_") :
+            #     for row in self._erp_all_table_columns : 
+            #         if keyword == row["TABLE_COLUMN"] :
+            #             record['ATTR_EN_NM'] =  "" if 'ATTR_EN_NM' not in row else row['ATTR_EN_NM']
+            #             record['COL_DESC'] =  "" if 'DIC_DESC' not in row else row['DIC_DESC']                            
+            #             record['KEY_DOM_NM'] = ""
+            # else :                        
+            #     for row in self.__legacy_extend_columns : 
+            #         if record['ColumnName'] == row["DIC_PHY_NM"] :
+            #             record['COL_DESC'] =  "" if 'DIC_DESC' not in row else row['DIC_DESC']
+            #             record['COL_KO_NM'] =  "" if 'DIC_LOG_NM' not in row else str(row['DIC_LOG_NM']).replace("FAB", "공장").replace("스텝", "공정").replace("상세공장", "공장").replace("PKT", "패키지").replace("제조사", "업체")
+            #             record['KEY_DOM_NM'] =  "" if 'KEY_DOM_NM' not in row else str(row['KEY_DOM_NM']).replace("FAB", "공장").replace("스텝", "공정").replace("상세공장", "공장").replace("PKT", "패키지").replace("제조사", "업체")
+
+        record['ColumnName'] = record['ColumnName'].upper()
+        # profiled 데이터에 아래 패턴의 컬럼 및 데이터가 있을 경우 profiled에서 제외
+        if self._pm.except_column(''.join(record['TableName']), ''.join(record['ColumnName']), ''.join(record['ColumnName'])) :
+            return None
+        elif self._pm.except_column(''.join(record['TableName']), ''.join(record['ColumnName']), ''.join(record['KEY_DOM_NM'])) :
+            return None
+        elif self._pm.except_column(''.join(record['TableName']), ''.join(record['ColumnName']), ''.join(record['column_name_tokenized_std'])) :
+            return None
+        return record
+
+    # bounded queue에 timeout 단위로 put을 재시도. stop이 설정되면 포기하고 False 반환
+    def _put(self, target_queue, item, stop) :
+        while not stop.is_set() :
+            try :
+                target_queue.put(item, timeout=self.queue_timeout)
+                return True
+            except queue.Full :
+                continue
+        return False
+
+    # queue에서 timeout 단위로 get을 재시도. stop이 설정되면 None(종료 표시)을 반환
+    def _get(self, source_queue, stop) :
+        while not stop.is_set() :
+            try :
+                return source_queue.get(timeout=self.queue_timeout)
+            except queue.Empty :
+                continue
+        return None
 
+    # in_queue에서 (seq, lines) chunk를 받아 변환 결과를 (seq, rows)로 out_queue에 전달. None을 받거나 stop이 설정되면 종료
+    def worker(self, id, field_names, in_queue, out_queue, stop) :        
+        cur_idx = 0
+        success_cnt = 0
+        exp_cnt = 0
+        while True :
+            chunk = self._get(in_queue, stop)
+            if chunk is None :
+                break
+            seq, data_list = chunk
+            # writer process가 그대로 쓸 수 있도록 csv 문자열로 만들어 전달
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=field_names)
+            for line in data_list:            
+                cur_idx += 1
+                try:
+                    record = self._process_record(line)
+                    if record is None :
+                        exp_cnt += 1
+                    else :
+                        writer.writerow(record)
+                        success_cnt += 1
+                except Exception as e:
+                    exp_cnt += 1
+                    self.pnd_logger.error(e)                
+            # writer가 비정상 종료되어 stop이 설정되면 더 이상 기다리지 않음
+            if not self._put(out_queue, (seq, buffer.getvalue()), stop) :
+                break
+            self.pnd_logger.info("[Source={}] [Thread No={}] {} rows completed, success={} , except={}".format(self._source_config["name"], id, cur_idx, success_cnt, exp_cnt))
+
+        self._put(out_queue, None, stop)
+        self._pm.report_except("Thread No={}".format(id))
         self.pnd_logger.info("[Source={}] [Thread No={}] Generate metadta completed.".format(self._source_config['name'], id))
 
-    def process_unify_dataset(self, source_type):        
-        path_of_src = os.path.dirname(os.path.realpath(__file__))
-        path_of_tmp = os.path.abspath(path_of_src + "/../tmp/")
-        path_of_output = os.path.abspath(path_of_src + "/../output/")
-
-        if not os.path.exists(path_of_tmp):
-            os.makedirs(path_of_tmp)
-        if not os.path.exists(path_of_output):
-            os.makedirs(path_of_output)
+    # 결과 파일은 이 process만 기록. ordered이면 입력 순번대로, 아니면 도착한 순서대로 기록
+    def writer(self, path_of_file, field_names, out_queue, workers, ordered=True) :
+        pending = {}
+        next_seq = 0
+        finished = 0
+        with open(path_of_file, 'w', buffering=self.write_buffer_size) as output_file_csv :
+            csv.DictWriter(output_file_csv, fieldnames=field_names).writeheader()
+            while finished < workers :
+                item = out_queue.get()
+                if item is None :
+                    finished += 1
+                    continue
+                if not ordered :
+                    output_file_csv.write(item[1])
+                    continue
+                pending[item[0]] = item[1]
+                while next_seq in pending :
+                    output_file_csv.write(pending.pop(next_seq))
+                    next_seq += 1
+        if len(pending) > 0 :
+            self.pnd_logger.error("[Source={}] {} chunks were not written. (missing chunk no={})".format(self._source_config['name'], len(pending), next_seq))
+            sys.exit(1)
+
+    # profile dataset을 한 줄(json)씩 반환. cache이면 tmp 파일에도 기록하고, replay이면 Unify 대신 tmp 파일에서 읽음
+    def _profile_lines(self, path_of_cache, cache=False, replay=False) :
+        if replay and os.path.exists(path_of_cache) :
+            self.pnd_logger.info("Replay profile dataset from {}".format(path_of_cache))
+            with open(path_of_cache, 'r') as input_file_json :
+                for line in input_file_json :
+                    yield line
+            return
 
         myUnify = Unify(
             self._unify_config["protocol"],
@@ -345,75 +414,124 @@ class DataMultiPreprocessor(object):
             self._unify_config["user"],
             self._unify_config["pwd"]
         )
-        output_file_json = open(path_of_tmp + '/' + self._source_config['profileDatasetName'], 'w')
-
-        field_names = None
-        for line in myUnify.stream_dataset(self._source_config['profileDatasetName']):
-            if field_names is None:
-                field_names = list(line.keys())
-            output_file_json.write(json.dumps(line) + '\n')
-        output_file_json.close()
-
-        # erp_input_file_json = None
-        # if self._source_config["name"] == "legacy" :
-        #     output_file_json = open(path_of_tmp + '/erp_column_metadata' , 'w')
-        #     for line in myUnify.stream_dataset("erp_column_metadata"):
-        #         output_file_json.write(json.dumps(line) + '\n')
-        #     output_file_json.close()
-        #     erp_input_file_json = open(path_of_tmp + '/erp_column_metadata', 'r')
-        
-        ## 테스트시 사용
-        #erp_input_file_json = None
-        #if self._source_config["name"] == "legacy" :
-        #    erp_input_file_json = open(path_of_tmp + '/erp_column_metadata', 'r')
-        #field_names = ['MinValue', 'Top100Values', 'StdDevValue', 'TableName', 'MaxValue', 'MeanValue', 'TAMRSEQ', 'TotalValueCount', 'EmptyValueCount', 'ColumnType', 'RecordCount', 'Tamr_Profiling_Seq', 'ColumnName', 'Top100Counts', 'DistinctValueCount', 'Top100Frequencies']
+        output_file_json = open(path_of_cache + '.tmp', 'w') if cache else None
+        try :
+            for line in myUnify.stream_dataset(self._source_config['profileDatasetName']):
+                if line is None :
+                    raise Exception("Failed to stream profile dataset {}".format(self._source_config['profileDatasetName']))
+                line = json.dumps(line) + '\n'
+                if output_file_json is not None :
+                    output_file_json.write(line)
+                yield line
+        finally :
+            if output_file_json is not None :
+                output_file_json.close()
+        # 끝까지 받은 경우에만 replay cache로 사용
+        if output_file_json is not None :
+            os.replace(path_of_cache + '.tmp', path_of_cache)
+
+    # lines를 chunk_size 단위로 나누어 순번과 함께 in_queue에 넣고, 끝나면 worker 수만큼 종료 표시(None)를 넣음
+    # stop이 설정되면 (writer 비정상 종료, worker 전체 종료) 남은 line은 버리고 종료
+    def _feed(self, lines, in_queue, workers, chunk_size, state, stop) :
+        seq = 0
+        chunk = []
+        try :
+            for line in lines :
+                chunk.append(line)
+                state["rows"] += 1
+                if len(chunk) == chunk_size :
+                    if not self._put(in_queue, (seq, chunk), stop) :
+                        return
+                    seq += 1
+                    chunk = []
+            if len(chunk) > 0 :
+                self._put(in_queue, (seq, chunk), stop)
+        except Exception as e :
+            state["failed"] = True
+            self.pnd_logger.error(e)
+        finally :
+            for i in range(0, workers) :
+                self._put(in_queue, None, stop)
+
+    def process_unify_dataset(self, source_type, cache=False, replay=False, chunk_size=500, ordered=True):
+        """
+        Generate metadata from the profile dataset. Records stream from Unify through a bounded queue into the worker
+        processes, and a single writer process writes the encoded rows, so memory does not grow with the dataset size.
+        :param source_type: Source type
+        :param cache: Keep the streamed profile dataset in tmp/ for replay
+        :param replay: Read the profile dataset from the tmp/ cache instead of Unify, if it exists
+        :param chunk_size: Number of records sent to a worker at once
+        :param ordered: Write rows in the order of the profile dataset. If False, chunks are written as they complete
+        :return: True if successful. Otherwise False.
+        """
+        path_of_src = os.path.dirname(os.path.realpath(__file__))
+        path_of_tmp = os.path.abspath(path_of_src + "/../tmp/")
+        path_of_output = os.path.abspath(path_of_src + "/../output/")
 
-        field_names.extend(['column_name_tokenized', 'column_name_tokenized_std','business_type', 'length', 'keys', 'top_n_values', 'patterns', 'SYSTEM_NAME', 'FAB', 'COL_DESC', 'COL_KO_NM', 'ATTR_EN_NM', 'KEY_DOM_NM'])
-        input_file_json = open(path_of_tmp + '/' + self._source_config['profileDatasetName'], 'r')
-        json_data = [row for row in input_file_json]
+        if not os.path.exists(path_of_tmp):
+            os.makedirs(path_of_tmp)
+        if not os.path.exists(path_of_output):
+            os.makedirs(path_of_output)
 
-        # if erp_input_file_json is not None :
-        #     erp_json_data = [row for row in erp_input_file_json]
-        #     json_data.extend(erp_json_data)
+        lines = self._profile_lines(path_of_tmp + '/' + self._source_config['profileDatasetName'], cache, replay)
+        first_line = next(lines, None)
+        if first_line is None :
+            self.pnd_logger.error("[Source={}] Profile dataset is empty.".format(self._source_config['name']))
+            return False
+        field_names = list(json.loads(first_line).keys())
+        field_names.extend(['column_name_tokenized', 'column_name_tokenized_std','business_type', 'length', 'keys', 'top_n_values', 'patterns', 'SYSTEM_NAME', 'FAB', 'COL_DESC', 'COL_KO_NM', 'ATTR_EN_NM', 'KEY_DOM_NM'])
 
-        self.pnd_logger.info("Total Profiling Rows = {}".format(len(json_data)))
-       
         max_thread = os.cpu_count()
-        # job 목록을 설정.
-        job_list = []        
-        interval = int(len(json_data) / max_thread)
-        if interval == 0:
-            interval = 1
-        quot =  len(json_data) // interval if len(json_data) % interval == 0 else len(json_data) // interval + 1
-        loop_cnt = 0
-        
-        while loop_cnt < quot :            
-            job = {"thread_no": loop_cnt, "rows": json_data[loop_cnt * interval:(loop_cnt + 1) * interval] }
-            job_list.append(job)
-            loop_cnt += 1
-        
-        self.pnd_logger.info("source={}   rows={}   max_thread={}   interval={}".format(self._source_config['name'], len(json_data), max_thread, interval))
-        
-        # 헤더 생성
-        with open(path_of_output + '/' + self._source_config['profileDatasetName'] + '_profiled.csv', 'w') as output_file_csv :
-            writer = csv.DictWriter(output_file_csv, fieldnames=field_names)
-            writer.writeheader()
-            
-        # row 생성
-        with open(path_of_output + '/' + self._source_config['profileDatasetName'] + '_profiled.csv', 'a') as output_file_csv :
-            writer = csv.DictWriter(output_file_csv, fieldnames=field_names)
-            process_list = []
-            
-            #프로세스 스레드 목록을 생성.
-            for job in job_list :                
-                proc = Process(target=self.worker, args=(job["thread_no"], writer, job["rows"]))
-                process_list.append(proc)
-                self.pnd_logger.info("[Source={}] [Thread No={}] Rows={}".format(self._source_config['name'], job["thread_no"], len(job["rows"])))
-                proc.start()
-
-            for proc in process_list :
-                proc.join()
-
+        in_queue = Queue(maxsize=max_thread * 2)
+        out_queue = Queue(maxsize=max_thread * 2)
+        stop = Event()
+        self.pnd_logger.info("source={}   max_thread={}   chunk_size={}".format(self._source_config['name'], max_thread, chunk_size))
+
+        # writer, worker process를 생성. fork 이후에 feeder thread를 시작
+        path_of_file = path_of_output + '/' + self._source_config['profileDatasetName'] + '_profiled.csv'
+        writer = Process(target=self.writer, args=(path_of_file, field_names, out_queue, max_thread, ordered))
+        writer.start()
+        process_list = []
+        for thread_no in range(0, max_thread) :
+            proc = Process(target=self.worker, args=(thread_no, field_names, in_queue, out_queue, stop))
+            process_list.append(proc)
+            proc.start()
+
+        state = {"rows": 0, "failed": False}
+        feeder = threading.Thread(target=self._feed, args=(itertools.chain([first_line], lines), in_queue, max_thread, chunk_size, state, stop), daemon=True)
+        feeder.start()
+
+        running = list(process_list)
+        while len(running) > 0 :
+            for proc in list(running) :
+                proc.join(timeout=self.queue_timeout)
+                if proc.is_alive() :
+                    continue
+                running.remove(proc)
+                # 비정상 종료된 worker 대신 종료 표시를 보내 writer가 기다리지 않도록 함
+                if proc.exitcode != 0 and not stop.is_set() :
+                    state["failed"] = True
+                    self.pnd_logger.error("[Source={}] Worker exited with code {}.".format(self._source_config['name'], proc.exitcode))
+                    self._put(out_queue, None, stop)
+            # writer가 비정상 종료되면 out_queue를 비울 process가 없으므로 stop을 설정하고 남은 worker를 종료
+            if not writer.is_alive() and writer.exitcode != 0 and not stop.is_set() :
+                state["failed"] = True
+                self.pnd_logger.error("[Source={}] Writer exited with code {}.".format(self._source_config['name'], writer.exitcode))
+                stop.set()
+                for proc in running :
+                    proc.terminate()
+        # worker가 모두 종료되었으므로 in_queue에서 대기 중인 feeder도 종료
+        stop.set()
+        writer.join()
+        # feeder가 Unify stream에서 막혀 있을 수 있으므로 실패한 경우 기다리지 않음 (daemon thread)
+        if not state["failed"] :
+            feeder.join()
+        completed = writer.exitcode == 0
+
+        self.pnd_logger.info("Total Profiling Rows = {}".format(state["rows"]))
+        if not completed or state["failed"] :
+            self.pnd_logger.error("[Source={}] Generate metadata failed.".format(self._source_config['name']))
+            return False
         self.pnd_logger.info("[Source={}] Generate metadata completed.".format(self._source_config['name']))        
         self.logger.info("[Source={}] Generate metadata completed.".format(self._source_config['name']))        
         return True
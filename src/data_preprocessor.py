@@ -5,11 +5,15 @@ import re
 from os.path import basename
 import json
 import os
+from multiprocessing import Process, Queue, Pipe, Array
+from multiprocessing.connection import wait
 import pandas as pd
 import numpy as np
 from chardet.universaldetector import UniversalDetector
 from custom_logger import CustomLogger
 from unify import Unify
+from token_normalizer import TokenNormalizer
+from column_profiler import ColumnProfiler
 
 import sys
 path_of_src = os.path.dirname(os.path.realpath(__file__))
@@ -24,7 +28,12 @@ class DataPreprocessor(object):
     """
     This is a class to generate metadata from source data csv files and save metadata into csv files
     """
-    def __init__(self, input_folder, output_folder, unify_config, source_config, path_to_token_dict=None):
+    def __init__(self, input_folder, output_folder, unify_config, source_config, path_to_token_dict=None,
+                 processes=None, chunk_size=100000):
+        """
+        :param processes: Number of files profiled at the same time by process_local_files. Defaults to the CPU count
+        :param chunk_size: Number of rows of a file read at once by process_local_files
+        """
 
         self.input_folder = input_folder
         self.output_folder = output_folder
@@ -37,6 +46,9 @@ class DataPreprocessor(object):
             self.token_dictionary = self._get_token_dict(path_to_token_dict)
         else:
             self.token_dictionary = None
+        self._token_normalizer = TokenNormalizer(self.token_dictionary)
+        self._processes = processes if processes is not None else os.cpu_count()
+        self._column_profiler = ColumnProfiler(top_n=100, chunk_size=chunk_size)
 
         # self.compare_schema = SchemaCompare(self._source_config["name"])
         # self._all_table_columns = self.compare_schema.all_table_columns
@@ -86,14 +98,7 @@ class DataPreprocessor(object):
         :param column_name: Already tokenized column name
         :return: Column name with token normalized using dictionary
         """
-        result = column_name.lower()
-        if self.token_dictionary is None:
-            return result
-        tokens = self.token_dictionary.keys()
-        for token in tokens:
-            regex_token = re.compile(r'\b{}\b'.format(token), re.IGNORECASE)
-            result = regex_token.sub(self.token_dictionary[token], result)
-        return result
+        return self._token_normalizer.normalize(column_name)
 
     @staticmethod
     def _get_keys(phrases):
@@ -334,9 +339,128 @@ class DataPreprocessor(object):
 
         return True
 
+    @staticmethod
+    def _detect_encoding(input_file):
+        """
+        Detect the encoding of a file from its first lines
+        :param input_file: Path of the file
+        :return: Dictionary of encoding and confidence
+        """
+        detector = UniversalDetector()
+        with open(input_file, 'rb') as lines:
+            for line in lines:
+                detector.feed(line)
+                if detector.done: break
+        detector.close()
+        return detector.result
+
+    def _profile_file(self, input_file):
+        """
+        Generate the metadata records of all columns of one sampled file
+        :param input_file: Path of the csv file
+        :return: Tuple of (table name, list of metadata records, list of candidate primary keys)
+        """
+        self.logger.info("Processing {}".format(input_file))
+        encoding = self._detect_encoding(input_file)
+        self.logger.info("Detected encoding: {}".format(encoding))
+
+        table_name = input_file.replace(input_file[:input_file.find('.')+1], '')
+        profiles = self._column_profiler.profile(input_file, encoding['encoding'])
+        self.logger.info('Found columns for {}: {}'.format(table_name, [profile['column_name'] for profile in profiles]))
+        records = []
+        candidate_keys = []
+        for profile in profiles:
+            record = {}
+            column_name = profile['column_name']
+            if profile['unique']:
+                candidate_keys.append(column_name)
+
+            column_name_tokenized = ' '.join(self._tokenize_column_name(column_name))
+            column_name_standardized = self._normalize_column_name(column_name_tokenized)
+
+            record['table_name'] = table_name
+            record['column_name'] = column_name
+            record['column_name_tokenized'] = column_name_tokenized
+            record['column_name_tokenized_std'] = column_name_standardized
+            record['business_type'] = profile['business_type']
+            record['length'] = profile['length']
+            record['keys'] = profile['keys']
+            record['top_n_values'] = profile['top_n_values']
+            record['top_n_values_freq'] = profile['top_n_values_freq']
+            record['patterns_freq'] = profile['patterns_freq']
+            record['patterns'] = profile['patterns']
+
+            # keyword = record["Tamr_Profiling_Seq"]
+            # table_column = [str(row["TABLE_COLUMN"]).strip() for row in self._all_table_columns]
+
+            # if self.compare_schema.is_deleted_column(keyword.strip()) :
+            #     self.logger.debug("[{}]Removed Unify Table-Column = {}".format(self._source_config['name'], keyword))
+            #     record['top_n_values'] = 'REMOVED'
+            # else :
+            #     record['top_n_values'] = top_n_values
+
+            # if self._source_config["name"] == "mixed" :
+            #     record['SYS_GBN_CD'] = "GMDM"
+            #     record['MST_TYP_ENG'] = "MATERIAL"                    
+            #     record['ATTR_EN_NM'] = ''.join([row['ATTR_EN_NM'] for row in self._all_table_columns if keyword == row["TABLE_COLUMN"]]).strip()                    
+            #     record['column_name'] = ''.join([row['TECH_COL_ID'] for row in self._all_table_columns if keyword == row["TABLE_COLUMN"]]).strip()
+            #     record['KEY_DOM_NM'] = ""
+            #     if len(record['column_name']) == 0 : record['column_name'] = column_name
+            # elif self._source_config["name"] == "mdm" :
+            #     for row in self._all_table_columns : 
+            #         if keyword == row["TABLE_COLUMN"] :
+            #             record['SYS_GBN_CD'] = "" if 'SYS_GBN_CD' not in row else row['SYS_GBN_CD']
+            #             record['MST_TYP_ENG'] =  "" if 'MST_TYP_ENG' not in row else row['MST_TYP_ENG']
+            #             record['COL_DESC'] =  "" if 'COL_DESC' not in row else row['COL_DESC']
+            #             record['COL_KO_NM'] =  "" if 'COL_KO_NM' not in row else row['COL_KO_NM']
+            #             record['ATTR_EN_NM'] =  "" if 'ATTR_EN_NM' not in row else row['ATTR_EN_NM']
+            #             record['KEY_DOM_NM'] = ""
+            # elif self._source_config["name"] == "legacy" :
+            #     for row in self.__legacy_extend_columns : 
+            #         if record['column_name'] == row["DIC_PHY_NM"] :                            
+            #             record['COL_DESC'] =  "" if 'DIC_DESC' not in row else row['DIC_DESC']
+            #             record['COL_KO_NM'] =  "" if 'DIC_LOG_NM' not in row else str(row['DIC_LOG_NM']).replace("FAB", "공장")                            
+            #             record['KEY_DOM_NM'] =  "" if 'KEY_DOM_NM' not in row else str(row['KEY_DOM_NM']).replace("FAB", "공장")
+            # elif self._source_config["name"] == "erp" :
+            #     for row in self.__legacy_extend_columns : 
+            #         if record['column_name'] == row["DIC_PHY_NM"] :
+            #             record['ATTR_EN_NM'] =  "" if 'ATTR_EN_NM' not in row else row['ATTR_EN_NM']
+            #             record['COL_DESC'] =  "" if 'DIC_DESC' not in row else row['DIC_DESC'] 
+            #             record['KEY_DOM_NM'] = ""
+            
+            records.append(record)
+        return table_name, records, candidate_keys
+
+    def _profile_worker(self, in_queue, conn, current, index):
+        """
+        Profile the files taken from in_queue until the end marker
+        :param in_queue: Queue of (seq, path), followed by None
+        :param conn: Pipe of this worker to send (seq, result of _profile_file or None if it failed) for every file, and
+        None when finished
+        :param current: Shared array of the seq each worker is profiling (-1 if none)
+        :param index: Index of this worker in current
+        :return: None
+        """
+        while True:
+            item = in_queue.get()
+            if item is None:
+                break
+            seq, input_file = item
+            current[index] = seq
+            try:
+                result = self._profile_file(input_file)
+            except Exception as e:
+                self.logger.error("Failed to process {}: {}".format(input_file, e))
+                result = None
+            conn.send((seq, result))
+            current[index] = -1
+        conn.send(None)
+        conn.close()
+
     def process_local_files(self):
         """
-        Process all files under input folder
+        Process all files under input folder. Files are profiled in parallel by worker processes and the metadata is
+        written in the order of the input files.
         :return: True if successful. Otherwise None
         """
 
@@ -344,6 +468,12 @@ class DataPreprocessor(object):
         fieldnames = ['table_name', 'column_name', 'column_name_tokenized', 'column_name_tokenized_std',
                             'business_type', 'length', 'keys', 'top_n_values', 'top_n_values_freq', 'patterns_freq', 'patterns', 'SYS_GBN_CD', 'MST_TYP_ENG', 'COL_DESC', 'COL_KO_NM', 'ATTR_EN_NM']
 
+        input_files = glob.glob(self.input_folder + '/*.csv')
+        if len(input_files) == 0:
+            self.logger.error("No input csv files are found in the input folder {}".format(self.input_folder))
+            return None
+        input_files = [input_file for input_file in input_files if os.path.getsize(input_file) > 0]
+
         output_file = open(self.output_folder + '/' + 'table_column_metadata.csv', 'w', encoding='utf-8')
         output_writer = csv.DictWriter(output_file, fieldnames=fieldnames, delimiter=",", quotechar="\"", escapechar="\\",
                                        quoting=csv.QUOTE_ALL)
@@ -352,127 +482,68 @@ class DataPreprocessor(object):
         candidate_primary_keys_file = open(self.output_folder + '/' + 'table_candidate_primary_keys.csv', 'w', encoding='utf-8')
         candidate_primary_keys_file.write('table,candidate_keys\n')
 
-        detector = UniversalDetector()
-        input_files = glob.glob(self.input_folder + '/*.csv')
-        if len(input_files) == 0:
-            self.logger.error("No input csv files are found in the input folder {}".format(self.input_folder))
-            return None
-        for input_file in input_files:
-            if os.path.getsize(input_file) == 0:
-                continue
-            self.logger.info("Processing {}".format(input_file))
-            detector.reset()
-
-            for line in open(input_file, 'rb'):
-                detector.feed(line)
-                if detector.done: break
-            detector.close()
-            encoding = detector.result
-            self.logger.info("Detected encoding: {}".format(encoding))
-
-            my_df = pd.read_csv(
-                input_file,
-                delimiter=',',
-                quotechar='"',
-                escapechar='\\',
-                encoding=encoding['encoding'],
-                index_col=None
-            )
-            my_df = my_df.apply(lambda x: x.str.strip() if x.dtype == "object" else x)
-            my_df = my_df.replace(r'^\s*$', np.nan, regex=True)
-            
-            column_names = list(my_df)           
-            
-            table_name = input_file.replace(input_file[:input_file.find('.')+1], '')            
-            self.logger.info('Found columns for {}: {}'.format(table_name, column_names))
-            candidate_keys = []
-
-            for column_name in column_names:
-                record = {}
-                keys = ''
-                values_count = my_df[column_name].value_counts(normalize=True, dropna=True)
-                top_values = values_count.index.tolist()
-
-                if len(my_df) == my_df[column_name].nunique():
-                    candidate_keys.append(column_name)
-
-                if len(top_values) > 0:
-                    keys = self._get_keys(top_values)
-
-                top_n_values = ''
-                top_n_values_freq = ''
-                patterns_freq = ''
-                patterns = ''
-                if keys == '':
-                    top_n_values = [str(item).replace('"', '') for item in top_values[:100]]
-                    top_n_values_freq = values_count.nlargest(100).to_dict()
-                    patterns_freq = self._get_patterns(top_n_values_freq)
-                    patterns = ' '.join(list(patterns_freq.keys()))
-                    patterns_freq = json.dumps(patterns_freq)
-                    top_n_values_freq = json.dumps(top_n_values_freq)
-                    business_type, length = self._get_business_types_and_length(top_n_values)
-                    top_n_values = ', '.join(top_n_values)
-                else:
-                    business_type, length = '', ''
-
-                column_name_tokenized = ' '.join(self._tokenize_column_name(column_name))
-                column_name_standardized = self._normalize_column_name(column_name_tokenized)
-                # business_type = self._get_business_types(top_n_values)
-
-                unique_id = table_name + '.' + column_name
-                record['table_name'] = table_name
-                record['column_name'] = column_name
-                record['column_name_tokenized'] = column_name_tokenized
-                record['column_name_tokenized_std'] = column_name_standardized
-                record['business_type'] = business_type
-                record['length'] = length
-                record['keys'] = keys
-                record['top_n_values'] = top_n_values
-                record['top_n_values_freq'] = top_n_values_freq
-                record['patterns_freq'] = patterns_freq
-                record['patterns'] = patterns
-
-                # keyword = record["Tamr_Profiling_Seq"]
-                # table_column = [str(row["TABLE_COLUMN"]).strip() for row in self._all_table_columns]
-
-                # if self.compare_schema.is_deleted_column(keyword.strip()) :
-                #     self.logger.debug("[{}]Removed Unify Table-Column = {}".format(self._source_config['name'], keyword))
-                #     record['top_n_values'] = 'REMOVED'
-                # else :
-                #     record['top_n_values'] = top_n_values
-
-                # if self._source_config["name"] == "mixed" :
-                #     record['SYS_GBN_CD'] = "GMDM"
-                #     record['MST_TYP_ENG'] = "MATERIAL"                    
-                #     record['ATTR_EN_NM'] = ''.join([row['ATTR_EN_NM'] for row in self._all_table_columns if keyword == row["TABLE_COLUMN"]]).strip()                    
-                #     record['column_name'] = ''.join([row['TECH_COL_ID'] for row in self._all_table_columns if keyword == row["TABLE_COLUMN"]]).strip()
-                #     record['KEY_DOM_NM'] = ""
-                #     if len(record['column_name']) == 0 : record['column_name'] = column_name
-                # elif self._source_config["name"] == "mdm" :
-                #     for row in self._all_table_columns : 
-                #         if keyword == row["TABLE_COLUMN"] :
-                #             record['SYS_GBN_CD'] = "" if 'SYS_GBN_CD' not in row else row['SYS_GBN_CD']
-                #             record['MST_TYP_ENG'] =  "" if 'MST_TYP_ENG' not in row else row['MST_TYP_ENG']
-                #             record['COL_DESC'] =  "" if 'COL_DESC' not in row else row['COL_DESC']
-                #             record['COL_KO_NM'] =  "" if 'COL_KO_NM' not in row else row['COL_KO_NM']
-                #             record['ATTR_EN_NM'] =  "" if 'ATTR_EN_NM' not in row else row['ATTR_EN_NM']
-                #             record['KEY_DOM_NM'] = ""
-                # elif self._source_config["name"] == "legacy" :
-                #     for row in self.__legacy_extend_columns : 
-                #         if record['column_name'] == row["DIC_PHY_NM"] :                            
-                #             record['COL_DESC'] =  "" if 'DIC_DESC' not in row else row['DIC_DESC']
-                #             record['COL_KO_NM'] =  "" if 'DIC_LOG_NM' not in row else str(row['DIC_LOG_NM']).replace("FAB", "공장")                            
-                #             record['KEY_DOM_NM'] =  "" if 'KEY_DOM_NM' not in row else str(row['KEY_DOM_NM']).replace("FAB", "공장")
-                # elif self._source_config["name"] == "erp" :
-                #     for row in self.__legacy_extend_columns : 
-                #         if record['column_name'] == row["DIC_PHY_NM"] :
-                #             record['ATTR_EN_NM'] =  "" if 'ATTR_EN_NM' not in row else row['ATTR_EN_NM']
-                #             record['COL_DESC'] =  "" if 'DIC_DESC' not in row else row['DIC_DESC'] 
-                #             record['KEY_DOM_NM'] = ""
-                
-                #if "dt" not in  record['KEY_DOM_NM'] :
-                output_writer.writerow(record)
-
-            candidate_primary_keys_file.write('"{}","{}"\n'.format(table_name, ','.join(candidate_keys)))
+        n_workers = max(1, min(self._processes, len(input_files)))
+        self.logger.info("Profiling {} files with {} processes".format(len(input_files), n_workers))
+        in_queue = Queue()
+        for seq, input_file in enumerate(input_files):
+            in_queue.put((seq, input_file))
+        for i in range(0, n_workers):
+            in_queue.put(None)
+        # one pipe per worker: a crashed worker closes only its own pipe and can not block the others
+        current = Array('i', [-1] * n_workers)
+        workers = []
+        active = {}
+        for i in range(0, n_workers):
+            reader, writer = Pipe(duplex=False)
+            worker = Process(target=self._profile_worker, args=(in_queue, writer, current, i))
+            worker.start()
+            writer.close()
+            workers.append(worker)
+            active[reader] = i
+
+        pending = {}
+        next_seq = 0
+        failed = []
+
+        def write(seq, result):
+            if result is None:
+                failed.append(input_files[seq])
+            else:
+                table_name, records, candidate_keys = result
+                output_writer.writerows(records)
+                candidate_primary_keys_file.write('"{}","{}"\n'.format(table_name, ','.join(candidate_keys)))
+
+        while len(active) > 0:
+            for reader in wait(list(active.keys())):
+                try:
+                    item = reader.recv()
+                except EOFError:
+                    # the worker exited without its end marker. its current file never gets a result
+                    i = active.pop(reader)
+                    seq = current[i]
+                    workers[i].join()
+                    self.logger.error("Profiling process exited with code {} while processing {}".format(
+                        workers[i].exitcode, input_files[seq] if seq >= 0 else None))
+                    if seq >= next_seq and seq not in pending:
+                        pending[seq] = None
+                    continue
+                if item is None:
+                    active.pop(reader)
+                    reader.close()
+                    continue
+                pending[item[0]] = item[1]
+            while next_seq in pending:
+                write(next_seq, pending.pop(next_seq))
+                next_seq += 1
+        for worker in workers:
+            worker.join()
+        # files left without a result (e.g. every worker crashed) are failed, the other results are written in order
+        for seq in range(next_seq, len(input_files)):
+            write(seq, pending.pop(seq, None))
         output_file.close()
-        return True
\ No newline at end of file
+        candidate_primary_keys_file.close()
+
+        if len(failed) > 0:
+            self.logger.error("Failed to process {} files: {}".format(len(failed), failed))
+            return None
+        return True
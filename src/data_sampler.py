@@ -1,11 +1,390 @@
+import csv
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
 from abc import ABC, abstractmethod
 
 
 class DataSampler(ABC):
 
+    # Rows fetched per round trip and bytes buffered per output file, unless set in the source config
+    fetch_size = 1000
+    write_buffer_size = 1024 * 1024
+    # Max number of pooled connections
+    pool_size = 4
+    # Tables sampled at the same time in local mode and seconds allowed per table (None for no limit), unless set in
+    # the source config
+    max_concurrent_tables = 4
+    table_timeout = None
+    # Completed tables of the local mode, kept in the output directory
+    manifest_name = '.sample_manifest.json'
+
     def __init__(self):
         super().__init__()
 
     @abstractmethod
     def get_sampled_data(self):
         pass
+
+    def _set_stream_options(self, config):
+        """
+        Read the optional streaming options of the source config
+        :param config: Source config (fetchSize, writeBufferSize)
+        """
+        self.fetch_size = config.get('fetchSize', self.fetch_size)
+        self.write_buffer_size = config.get('writeBufferSize', self.write_buffer_size)
+
+    def _set_parallel_options(self, config):
+        """
+        Read the optional local mode concurrency options of the source config
+        :param config: Source config (maxConcurrentTables, tableTimeout)
+        """
+        self.max_concurrent_tables = config.get('maxConcurrentTables', self.max_concurrent_tables)
+        if self.max_concurrent_tables < 1:
+            self.logger.error("Value for parameter maxConcurrentTables is illegal: {}".format(self.max_concurrent_tables))
+            self.logger.error("Will use the default value 4 for maxConcurrentTables instead")
+            self.max_concurrent_tables = 4
+        self.table_timeout = config.get('tableTimeout', self.table_timeout)
+
+    def _fetch_batches(self, cur):
+        """
+        Read the result of an executed query in batches of fetch_size rows
+        :param cur: Cursor of the executed query
+        :return: Generator of lists of rows
+        """
+        while True:
+            rows = cur.fetchmany(self.fetch_size)
+            if not rows:
+                break
+            yield rows
+
+    def _open_csv(self, path):
+        """
+        Open a sample csv file for streaming writes
+        :param path: File path
+        :return: Tuple of (file, csv writer)
+        """
+        output_file = open(path, 'w', encoding='utf-8', newline='', buffering=self.write_buffer_size)
+        writer = csv.writer(output_file, delimiter=',', quotechar='"', escapechar='\\', doublequote=False,
+                            quoting=csv.QUOTE_ALL, lineterminator='\n')
+        return output_file, writer
+
+    @staticmethod
+    def _column_names(schema):
+        """
+        Strip the table prefix (table.column) from the column names of a cursor description
+        :param schema: Tuple of column names
+        :return: List of column names
+        """
+        return [column_name.split('.')[1] if '.' in column_name else column_name for column_name in schema]
+
+    def _acquire_connection(self, database):
+        """
+        Take a connection to database from the pool of the sampler
+        :param database: Database (Hive) or sid (Oracle)
+        :return: Connection if successful, otherwise None
+        """
+        raise NotImplementedError
+
+    def _open_connections(self, pool_size):
+        """
+        Size the pool of the sampler for pool_size concurrent connections, before the workers start
+        :param pool_size: Max number of pooled connections
+        """
+        pass
+
+    def _release_connection(self, database, conn, discard=False):
+        """
+        Return a connection taken with _acquire_connection
+        :param database: Database (Hive) or sid (Oracle)
+        :param conn: Connection
+        :param discard: Close the connection instead of keeping it for reuse
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def _distinct_query(table, columns):
+        """
+        Build one query that counts the values of every column of table in a single scan. Each result row is the
+        column values, one grouping() flag per column (0 for the column the row is grouped by) and the count.
+        :param table: Table name
+        :param columns: Column names
+        :return: Query
+        """
+        return 'SELECT {}, {}, COUNT(*) FROM {} GROUP BY GROUPING SETS ({})'.format(
+            ', '.join(columns),
+            ', '.join(['GROUPING({})'.format(column) for column in columns]),
+            table,
+            ', '.join(['({})'.format(column) for column in columns])
+        )
+
+    @staticmethod
+    def _read_columns_file(columns_file, output_dir):
+        """
+        Group the columns of a columns file by table, leaving out columns whose output file already exists
+        :param columns_file: File containing the full column path database.table.column, one per line
+        :param output_dir: Absolute path to output directory
+        :return: OrderedDict of (database, table) to list of columns
+        """
+        tables = OrderedDict()
+        with open(columns_file, 'r') as columns:
+            for line in columns:
+                line = line.strip()
+                if '.' not in line:
+                    continue
+                database, table, column = line.split('.')
+                filepath = output_dir + '/' + database + '.' + table + '.' + column + '.csv'
+                if len(glob.glob(filepath)) == 1 and os.path.getsize(filepath) > 50000:
+                    continue
+                tables.setdefault((database, table), [])
+                if column not in tables[(database, table)]:
+                    tables[(database, table)].append(column)
+        return tables
+
+    def _count_values(self, database, table, columns, retries=3):
+        """
+        Count the values of columns of a table with one _distinct_query
+        :param database: Database (Hive) or sid (Oracle)
+        :param table: Table name
+        :param columns: Column names
+        :param retries: Number of attempts
+        :return: List of dictionaries of value to count, one per column, if successful. Otherwise None
+        """
+        query = self._distinct_query(table, columns)
+        n_runs = 0
+        while n_runs < retries:
+            conn = self._acquire_connection(database)
+            if conn is None:
+                return None
+            try:
+                cur = conn.cursor()
+                cur.arraysize = self.fetch_size
+                cur.execute(query)
+                counts = [dict() for column in columns]
+                for rows in self._fetch_batches(cur):
+                    for row in rows:
+                        groupings = row[len(columns):2 * len(columns)]
+                        if 0 not in groupings:
+                            continue
+                        i = groupings.index(0)
+                        counts[i][row[i]] = counts[i].get(row[i], 0) + row[-1]
+                self._release_connection(database, conn)
+                return counts
+            except Exception as e:
+                self.logger.error(e)
+                self._release_connection(database, conn, discard=True)
+                n_runs += 1
+        return None
+
+    def _get_table_distinct_values(self, database, table, columns, output_dir, top_k=None):
+        """
+        Count the values of all requested columns of a table in one scan and save each column into its own file.
+        If the combined query fails (e.g. a LOB or complex type column can not be grouped), it is not retried and
+        every column is counted with its own query instead, so only the failing columns are lost.
+        :param database: Database (Hive) or sid (Oracle)
+        :param table: Table name
+        :param columns: Column names
+        :param output_dir: Absolute path to output directory
+        :param top_k: If set, keep only the k most frequent values of each column
+        :return: True if at least one column was counted. Otherwise False
+        """
+        self.logger.info("Getting distinct values for {} columns of '{}.{}'".format(len(columns), database, table))
+        counts = self._count_values(database, table, columns, retries=1 if len(columns) > 1 else 3)
+        if counts is None and len(columns) > 1:
+            self.logger.info("Counting the columns of '{}.{}' one by one".format(database, table))
+            counts = []
+            for column in columns:
+                column_counts = self._count_values(database, table, [column])
+                if column_counts is None:
+                    self.logger.error("Failed to get distinct values for '{}.{}.{}'".format(database, table, column))
+                counts.append(column_counts[0] if column_counts is not None else None)
+            if all(column_counts is None for column_counts in counts):
+                counts = None
+        if counts is None:
+            self.logger.error("Failed to get distinct values for '{}.{}'".format(database, table))
+            return False
+
+        for column, column_counts in zip(columns, counts):
+            if column_counts is None:
+                continue
+            values = [(str(value), count) for value, count in column_counts.items()
+                      if value is not None and str(value).strip() != '' and self._is_ascii(str(value))]
+            if top_k is not None:
+                values = sorted(values, key=lambda item: item[1], reverse=True)[:top_k]
+            if len(values) == 0:
+                continue
+            data = [('primaryKey', column)] + [[str(i), value] for i, (value, count) in enumerate(values)]
+            self._write_to_file(database, table + '.' + column, data, output_dir)
+        return True
+
+    def get_distinct_values(self, columns_file, output_dir, top_k=None, workers=4):
+        """
+        Get distinct values in each column and save into file. Columns are grouped by table so that every table is
+        scanned once, and up to workers tables are scanned at the same time on pooled connections.
+        :param columns_file: File containing the full column path database.table.column
+        :param output_dir: Absolute path to output directory
+        :param top_k: If set, keep only the k most frequent values of each column
+        :param workers: Number of tables scanned at the same time
+        :return: None
+        """
+        self.logger.info("Processing columns in {}".format(columns_file))
+        tables = self._read_columns_file(columns_file, output_dir)
+        tasks = queue.Queue()
+        for (database, table), columns in tables.items():
+            tasks.put((database, table, columns))
+
+        def worker():
+            while True:
+                try:
+                    database, table, columns = tasks.get_nowait()
+                except queue.Empty:
+                    break
+                self._get_table_distinct_values(database, table, columns, output_dir, top_k)
+
+        self._open_connections(workers)
+        threads = [threading.Thread(target=worker) for i in range(0, min(workers, len(tables)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self._close_connections()
+
+    def _close_connections(self):
+        """
+        Close the pooled connections
+        """
+        pass
+
+    @staticmethod
+    def _watchdog(deadline, cancel):
+        """
+        Call cancel once deadline has passed, from a timer thread
+        :param deadline: time.time() value, or None for no limit
+        :param cancel: Function interrupting the running work
+        :return: Started timer to cancel when the work is done, or None
+        """
+        if deadline is None:
+            return None
+        timer = threading.Timer(max(0., deadline - time.time()), cancel)
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    def _load_manifest(self, output_dir):
+        """
+        Read the manifest of completed tables in output_dir
+        :param output_dir: Absolute path to output directory
+        :return: Dictionary of database.table to completion info. Empty if there is no manifest
+        """
+        path = output_dir + '/' + self.manifest_name
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as manifest_file:
+                return json.load(manifest_file)
+        except Exception as e:
+            self.logger.error("Failed to read manifest {}: {}".format(path, e))
+            return {}
+
+    def _save_manifest(self, output_dir, manifest):
+        """
+        Write the manifest of completed tables under a temporary name and rename it, so that an interrupted run
+        keeps the previous manifest
+        :param output_dir: Absolute path to output directory
+        :param manifest: Dictionary of database.table to completion info
+        :return: None
+        """
+        path = output_dir + '/' + self.manifest_name
+        with open(path + '.tmp', 'w', encoding='utf-8') as manifest_file:
+            json.dump(manifest, manifest_file, indent=1, sort_keys=True)
+        os.replace(path + '.tmp', path)
+
+    def _sample_table_on_pool(self, database, table, output_dir, deadline=None):
+        """
+        Sample one table on a pooled connection, used by the local mode workers
+        :param database: Database (Hive) or sid (Oracle)
+        :param table: Table name
+        :param output_dir: Absolute path to output directory
+        :param deadline: time.time() value after which the table is abandoned, or None for no limit
+        :return: True if successful. Otherwise False
+        """
+        raise NotImplementedError
+
+    def _sample_tables(self, tables, output_dir, does_reload=False):
+        """
+        Sample tables with up to maxConcurrentTables workers on pooled connections. Every completed table is
+        recorded in the manifest of output_dir right away, and tables in the manifest whose file still exists are
+        skipped unless does_reload is set. Failed tables are left out of the manifest so the next run retries them.
+        :param tables: List of (database, table)
+        :param output_dir: Absolute path to output directory
+        :param does_reload: Sample every table again
+        :return: True. Failed tables are logged and left out of the manifest
+        """
+        manifest = {} if does_reload else self._load_manifest(output_dir)
+        tasks = queue.Queue()
+        for database, table in tables:
+            key = database + '.' + table
+            if key in manifest and os.path.exists(output_dir + '/' + key + '.csv'):
+                continue
+            manifest.pop(key, None)
+            tasks.put((database, table))
+        n_tables = tasks.qsize()
+        self.logger.info("Sampling {} tables, {} already completed, {} at a time".format(
+            n_tables, len(tables) - n_tables, self.max_concurrent_tables))
+        if n_tables == 0:
+            return True
+
+        self._open_connections(self.max_concurrent_tables)
+        lock = threading.Lock()
+        completed = []
+        failed = []
+        started = time.time()
+
+        def worker():
+            while True:
+                try:
+                    database, table = tasks.get_nowait()
+                except queue.Empty:
+                    break
+                table_started = time.time()
+                deadline = table_started + self.table_timeout if self.table_timeout else None
+                key = database + '.' + table
+                n_bytes = None
+                try:
+                    successful = self._sample_table_on_pool(database, table, output_dir, deadline)
+                    if successful:
+                        n_bytes = os.path.getsize(output_dir + '/' + key + '.csv')
+                except Exception as e:
+                    self.logger.error(e)
+                    successful = False
+                with lock:
+                    if successful:
+                        manifest[key] = {
+                            'bytes': n_bytes,
+                            'seconds': round(time.time() - table_started, 1),
+                            'completed': time.strftime('%Y-%m-%d %H:%M:%S')
+                        }
+                        self._save_manifest(output_dir, manifest)
+                        completed.append(key)
+                    else:
+                        failed.append(key)
+                        self.logger.error("Failed to get data for '{}'".format(key))
+                    self.logger.info("Progress: {}/{} tables, {} failed, {:.0f}s elapsed".format(
+                        len(completed) + len(failed), n_tables, len(failed), time.time() - started))
+
+        threads = [threading.Thread(target=worker) for i in range(0, min(self.max_concurrent_tables, n_tables))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self._close_connections()
+
+        self.logger.info("Sampled {} of {} tables in {:.0f}s, {} failed".format(
+            len(completed), n_tables, time.time() - started, len(failed)))
+        if len(failed) > 0:
+            self.logger.error("Failed tables: {}".format(failed))
+        return True
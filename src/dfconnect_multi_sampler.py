@@ -6,8 +6,12 @@ import requests
 import json
 import time
 import copy
+import csv
+import datetime
 from custom_logger import CustomLogger
+from http_session import get_session, profile_timeout
 from data_sampler import DataSampler
+from sampling_strategy import get_sampling_strategy
 from tamr_unify_client.auth import UsernamePasswordAuth
 #from tamr_unify_client import Client
 from multiprocessing import Process, Manager, Pool
@@ -21,6 +25,8 @@ from pnd_logger import PndLogger
 sys.path.append(path_of_src + '/../pnd/data')
 from custom_unify import CustomUnify
 from profile_manager import ProfileManager
+from retry_queue import RetryQueue, classify_error, TRANSIENT, PERMANENT
+from sample_state import SampleState
 
 class DfConnectMultiSampler(DataSampler):
     """
@@ -48,6 +54,7 @@ class DfConnectMultiSampler(DataSampler):
         self._jdbc_user = jdbc_user
         self._jdbc_password = jdbc_password
         self.url = '{}://{}:{}/api/jdbcIngest/profile'.format(self._unify_protocol, self._unify_hostname, self._connectPort)        
+        self._sampling = get_sampling_strategy(source_config, 'hive' if jdbc_url.startswith('jdbc:hive2') else 'oracle')
 
         # pnd custom        
         self.pnd_logger = PndLogger("DfConnectMultiSampler", "sampling")       
@@ -63,62 +70,108 @@ class DfConnectMultiSampler(DataSampler):
     #     if self._source_conf['name'] == 'legacy' :
     #         return self.source_sampler.get_tables(database)
 
-    def profile(self, tables, results, idx, profileDatasetName=None):
+    def profile_table(self, table, profileDatasetName=None):
         """
-        Call df-connect to profile table and save metadata into a Unify dataset
-        :param table: Table name to profile
+        Call df-connect to profile one table and save metadata into a Unify dataset
+        :param table: Table to profile (TABLE_NAME, EXECUTE_QUERY)
+        :param profileDatasetName: Dataset to save metadata. Defaults to the source profile dataset
+        :return: None if successful. Otherwise (HTTP status code or None, error message).
+        """
+        url = self._jdbc_url
+        # if self._source_conf['name'] == 'legacy' :
+        #     url = url + "/{}?hive.resultset.use.unique.column.names=false".format(table["DATABASE"])
+
+        queryConfig = \
+            {
+                "queryConfig": {
+                    "jdbcUrl":  url,
+                    "dbUsername": self._jdbc_user,
+                    "dbPassword": self._jdbc_password,
+                    "fetchSize": 1
+                },
+                "queryTargetList": [
+                    {
+                        "query": table['EXECUTE_QUERY'],
+                        "datasetName": self._profileDatasetName if profileDatasetName is None else profileDatasetName, 
+                        "primaryKey": []
+                    }
+                ]
+            }        
+        
+        headers = {'Content-Type': 'application/json', 'Accept': 'application/json', 'Authorization': self._basicCreds}
+        try :
+            response = get_session().post(self.url, headers=headers, data=json.dumps(queryConfig),
+                                       timeout=profile_timeout(self._source_conf.get('profileTimeout')))
+        except Exception as e :
+            return None, str(e)
+        if response.status_code != 200:
+            return response.status_code, response.text
+        return None
+
+    def profile(self, tasks, results, worker_no, retries=3, backoff=5, profileDatasetName=None):
+        """
+        Take tables from the shared task queue until the end marker and profile each one.
+        Transient errors (HTTP 5xx, timeout) are retried with backoff. Permanent errors (ORA-) are not.
+        :param tasks: Shared queue of tables, largest first, followed by one None per worker
+        :param results: Shared list to append the result of each table
+        :param worker_no: Worker number used in the log
+        :param retries: Number of retries per table for transient errors
+        :param backoff: Seconds to wait before the first retry. Doubled on every retry
+        :param profileDatasetName: Dataset to save metadata. Defaults to the source profile dataset
         :return: None
-        """        
-        # self.pnd_logger.info("executed query = {}".format(table['execute_query']))
-        result_tables = []
-        total = len(tables)
+        """
         successed = 0
         failed = 0
-        failed_tables = []
-        for table in tables :
-            url = self._jdbc_url
-            # if self._source_conf['name'] == 'legacy' :
-            #     url = url + "/{}?hive.resultset.use.unique.column.names=false".format(table["DATABASE"])
-
-            queryConfig = \
-                {
-                    "queryConfig": {
-                        "jdbcUrl":  url,
-                        "dbUsername": self._jdbc_user,
-                        "dbPassword": self._jdbc_password,
-                        "fetchSize": 1
-                    },
-                    "queryTargetList": [
-                        {
-                            "query": table['EXECUTE_QUERY'],
-                            "datasetName": self._profileDatasetName if profileDatasetName is None else profileDatasetName, 
-                            "primaryKey": []
-                        }
-                    ]
-                }        
-            
-            headers = {'Content-Type': 'application/json', 'Accept': 'application/json', 'Authorization': self._basicCreds}
-            response = requests.post(self.url, headers=headers, data=json.dumps(queryConfig))
+        while True :
+            table = tasks.get()
+            if table is None :
+                break
+            started = time.time()
+            for attempt in range(0, retries + 1) :
+                if attempt > 0 :
+                    time.sleep(backoff * 2 ** (attempt - 1))
+                error = self.profile_table(table, profileDatasetName)
+                if error is None :
+                    break
+                kind = classify_error(*error)
+                self.pnd_logger.debug("Request to profile {} has failed. (attempt={}, {})".format(table["TABLE_NAME"], attempt + 1, kind))
+                self.pnd_logger.debug(error[1])
+                if kind == PERMANENT :
+                    break
 
-            if response.status_code != 200:                
-                failed = failed + 1
-                failed_tables.append(table["TABLE_NAME"])
-                self.pnd_logger.debug("Request to profile {} has failed".format(table))
-                self.pnd_logger.debug(response.text)
-                # if "[Oracle]ORA-" in response.text :
-                #     return "REMOVE"
-                # return False
-            else:
-                table["pid"] = os.getpid()
+            table["PID"] = os.getpid()
+            table["THREAD_NO"] = worker_no
+            table["ATTEMPTS"] = attempt + 1
+            table["ELAPSED"] = round(time.time() - started, 1)
+            table["ERROR"] = None if error is None else error[1]
+            table["ERROR_KIND"] = None if error is None else kind
+            if error is None :
                 successed = successed + 1
-                self.pnd_logger.info("NO:[{:>2}]   Total:({:>5}/{:<5})   Failed:({:>3})   TABLE: {}".format(table["THREAD_NO"], successed, total, failed, table["TABLE_NAME"]))
-                # self.pnd_logger.info("Complated process = [NO: {}, PID: {}, TABLE: {}]".format(table["thread_no"], table["pid"], table["table_name"]))
-            result_tables.append(table)
-        results[idx] = result_tables
-        self.pnd_logger.info("NO:[{:>2}] ({}/{}/{}) FAILED TABLES={}".format(result_tables[0]["THREAD_NO"], successed, total, failed, failed_tables))
+            else :
+                failed = failed + 1
+            results.append(table)
+            self.pnd_logger.info("NO:[{:>2}]   Done:({:>5})   Failed:({:>3})   ROW_CNT:{:>12}   TABLE: {}".format(worker_no, successed, failed, table["ROW_CNT"], table["TABLE_NAME"]))
+        self.pnd_logger.info("NO:[{:>2}] ({}/{}) finished.".format(worker_no, successed, successed + failed))
         return
 
-    def get_sampled_data(self, path_of_data, does_reload=False):         
+    @staticmethod
+    def table_key(table):
+        return "{}.{}".format(table["DATABASE"], table["TABLE_NAME"])
+
+    # 실패한 테이블 목록을 logs/report 아래 csv로 저장
+    def write_failed_report(self, failed_tables):
+        path_of_report = os.path.abspath(path_of_src + "/../logs/report")
+        if not os.path.exists(path_of_report):
+            os.makedirs(path_of_report)
+        file_name = path_of_report + "/{}_failed_{}.csv".format(self._profileDatasetName, datetime.datetime.now().strftime('%Y-%m-%d_%H%M%S'))
+        with open(file_name, 'w', newline='', encoding='utf-8') as f :
+            writer = csv.writer(f)
+            writer.writerow(["DATABASE", "TABLE_NAME", "ROW_CNT", "ATTEMPTS", "ELAPSED", "ERROR_KIND", "ERROR"])
+            for table in failed_tables :
+                writer.writerow([table["DATABASE"], table["TABLE_NAME"], table["ROW_CNT"], table["ATTEMPTS"], table["ELAPSED"], table["ERROR_KIND"], table["ERROR"]])
+        return file_name
+
+    def get_sampled_data(self, path_of_data, does_reload=False, resume=False, incremental=False):         
         cm_unify = ConfigManager("unify")
         unify = CustomUnify(cm_unify)        
         pm = ProfileManager(self._source_conf['name'], "sampling")
@@ -127,18 +180,14 @@ class DfConnectMultiSampler(DataSampler):
         #     self.pnd_logger.info("Sampling all reload tables.")
             # unify.dataset.truncate_dataset(self._source_conf['profileDatasetName'])
         
-        all_tables = pm.getSampleTables()
+        # 성공한 테이블의 signature는 항상 기록하고, incremental이면 변경된 테이블만 sampling
+        sample_state = SampleState(self._profileDatasetName, "sampling")
+        all_tables = pm.getSampleTables(sample_state if incremental and not does_reload else None)
         
-        if len(all_tables) > 16 :
-            thread_cnt = 16
-        else :
-            thread_cnt = len(all_tables)
-
         sample_tables = []
-        thread_no = 0
-        reverse = False
+        source_tables = dict()
         for t in all_tables :            
-            table = {"THREAD_NO": thread_no, "PID": 0, "DATABASE": t["DB_NAME"].upper(),"TABLE_NAME": t["TABLE_NAME"].upper(), "EXECUTE_QUERY": ""}
+            table = {"THREAD_NO": 0, "PID": 0, "DATABASE": t["DB_NAME"].upper(),"TABLE_NAME": t["TABLE_NAME"].upper(), "ROW_CNT": int(t.get("ROW_CNT") or 0), "EXECUTE_QUERY": ""}
             # if self._source_conf['name'] == 'legacy' : 
             #     sample_query = self._source_conf['getDataQuery'].format(t["TABLE_NAME"].upper())
             #     if t["ROW_CNT"] > 100000 :                                        
@@ -151,41 +200,87 @@ class DfConnectMultiSampler(DataSampler):
             #         table["EXECUTE_QUERY"] = sample_query
 
             if self._source_conf['name'] == 'legacy' :
-                 table["EXECUTE_QUERY"] = self._source_conf['getDataQuery'].format(t["TABLE_NAME"])
+                 table["EXECUTE_QUERY"] = self._sampling.query(self._source_conf['getDataQuery'], t["TABLE_NAME"], table["ROW_CNT"])
             
-            if reverse == False :
-                thread_no = thread_no + 1
-                if thread_no == thread_cnt :
-                    reverse = True                    
-
-            if reverse == True :
-                thread_no = thread_no - 1
-                if thread_no == -1 :
-                    reverse = False
-                    thread_no = 0
-
             sample_tables.append(table)
+            source_tables[self.table_key(table)] = t
             self.pnd_logger.debug("{}".format(table))
 
+        # resume이면 지난 실행에서 실패한 테이블만 다시 수행
+        retry_queue = RetryQueue(self._profileDatasetName, "sampling")
+        if resume :
+            sample_tables = [table for table in sample_tables if self.table_key(table) in retry_queue]
+            self.pnd_logger.info("Resume {} failed tables. (retry queue={})".format(len(sample_tables), len(retry_queue)))
+            for key in set(retry_queue.entries) - set(self.table_key(table) for table in sample_tables) :
+                self.pnd_logger.info("Drop {} from retry queue. (not a sample table anymore)".format(key))
+                retry_queue.remove(key)
+
+        # 큰 테이블부터 공유 queue에 넣고, 각 process는 끝나는 대로 다음 테이블을 가져감
+        sample_tables.sort(key=itemgetter("ROW_CNT"), reverse=True)
+        thread_cnt = min(cm_unify.profile_concurrency, len(sample_tables))
+        if thread_cnt < 1 :
+            self.pnd_logger.info("No tables to sample.")
+            retry_queue.save()
+            return True
+        self.pnd_logger.info("Sampling {} tables. [concurrency = {} | retries = {} | backoff = {}]".format(len(sample_tables), thread_cnt, cm_unify.profile_retries, cm_unify.profile_backoff))
+
+        # 변경된 테이블의 기존 profile record ID. 새 profile이 성공한 테이블만 마지막에 삭제 (실패한 테이블은 기존 결과 유지)
+        old_record_ids = {}
+        if incremental and not does_reload :
+            old_record_ids = unify.dataset.get_table_record_ids(self._profileDatasetName, [table["TABLE_NAME"] for table in sample_tables])
+            if old_record_ids == None :
+                self.pnd_logger.error("Failed to read profiled records of changed tables.")
+                return False
+
         with Manager() as manager:            
-            threads = []
-            for idx in range(0, thread_cnt) :
-                procs = []
-                for proc in sample_tables :
-                    if idx == proc["THREAD_NO"] :
-                        procs.append(proc)
-                threads.append(procs)
+            tasks = manager.Queue()
+            for table in sample_tables :
+                tasks.put(table)
+            for i in range(0, thread_cnt) :
+                tasks.put(None)
 
             p_list = []
-            m_list = manager.list([0 for x in range(len(threads))])            
-            for i in range(0, len(threads)) :
-                proc = Process(target=self.profile, args=(threads[i],m_list,i))
+            m_list = manager.list()
+            for i in range(0, thread_cnt) :
+                proc = Process(target=self.profile, args=(tasks, m_list, i, cm_unify.profile_retries, cm_unify.profile_backoff))
                 p_list.append(proc)
-                time.sleep(1)
                 proc.start()
             
             for p in p_list:
                 p.join()                
-                
-            self.pnd_logger.info("Finish sampling.")
+
+            results = list(m_list)
+
+        done_tables = set(self.table_key(table) for table in results)
+        failed_tables = [table for table in results if table["ERROR"] is not None]
+        # 비정상 종료된 process가 가져간 테이블도 실패로 보고
+        for table in sample_tables :
+            if self.table_key(table) not in done_tables :
+                table.update({"ATTEMPTS": 0, "ELAPSED": 0, "ERROR_KIND": TRANSIENT, "ERROR": "Not processed"})
+                failed_tables.append(table)
+
+        replaced_record_ids = []
+        for table in results :
+            if table["ERROR"] is None :
+                replaced_record_ids.extend(old_record_ids.get(table["TABLE_NAME"], []))
+        if unify.dataset.delete_record_ids(self._profileDatasetName, replaced_record_ids) == None :
+            # 삭제하지 못한 테이블은 중복 record가 남으므로 성공으로 기록하지 않고 다음 실행에서 다시 수행
+            self.pnd_logger.error("Failed to delete the previous profiled records of re-profiled tables.")
+            for table in results :
+                if table["ERROR"] is None and len(old_record_ids.get(table["TABLE_NAME"], [])) > 0 :
+                    table.update({"ERROR_KIND": TRANSIENT, "ERROR": "Failed to delete previous profiled records"})
+                    failed_tables.append(table)
+
+        for table in results :
+            if table["ERROR"] is None :
+                retry_queue.remove(self.table_key(table))
+                sample_state.mark(source_tables[self.table_key(table)])
+        for table in failed_tables :
+            retry_queue.add(self.table_key(table), {"DATABASE": table["DATABASE"], "TABLE_NAME": table["TABLE_NAME"], "ROW_CNT": table["ROW_CNT"]}, table["ERROR_KIND"], table["ERROR"], table["ATTEMPTS"])
+        retry_queue.save()
+        sample_state.save()
+
+        self.pnd_logger.info("Finish sampling. (success={}, failed={})".format(len(sample_tables) - len(failed_tables), len(failed_tables)))
+        if len(failed_tables) > 0 :
+            self.pnd_logger.error("FAILED TABLES={} - {}".format([table["TABLE_NAME"] for table in failed_tables], self.write_failed_report(failed_tables)))
         return True
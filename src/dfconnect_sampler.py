@@ -5,6 +5,7 @@ import base64
 import requests
 import json
 from custom_logger import CustomLogger
+from http_session import get_session, profile_timeout
 from data_sampler import DataSampler
 from tamr_unify_client.auth import UsernamePasswordAuth
 
@@ -52,7 +53,7 @@ class DfConnectSampler(DataSampler):
         """
         Call df-connect to profile table and save metadata into a Unify dataset
         :param table: Table name to profile
-        :return: None
+        :return: True if successful. Otherwise False
         """
         #url = '{}://{}:{}/api/jdbcIngest/profile'.format(
         #    self._unify_protocol, self._unify_hostname, self._connectPort
@@ -76,10 +77,18 @@ class DfConnectSampler(DataSampler):
             }        
         
         headers = {'Content-Type': 'application/json', 'Accept': 'application/json', 'Authorization': self._basicCreds}
-        response = requests.post(self.url, headers=headers, data=json.dumps(queryConfig))
+        try:
+            response = get_session().post(self.url, headers=headers, data=json.dumps(queryConfig),
+                                       timeout=profile_timeout(self._source_conf.get('profileTimeout')))
+        except Exception as e:
+            self.logger.error("Request to profile {} has failed".format(table))
+            self.logger.error(e)
+            return False
         if response.status_code != 200:
             self.logger.error("Request to profile {} has failed".format(table))
             self.logger.error(response.text)
+            return False
+        return True
 
     def get_sampled_data(self, path_of_data, does_reload=False):
         """
@@ -99,11 +108,18 @@ class DfConnectSampler(DataSampler):
             all_tables.extend(compare.updated_tables)
             all_tables = list(set(all_tables))
 
+        failed_tables = []
         if len(all_tables) > 0:
             profiled_list = []
             idx = 0
             for table in all_tables:
                 self.logger.info("Profiling table {} ({} / {} Completed)".format(table, idx, len(all_tables)))
-                self.profile(table)
+                if not self.profile(table):
+                    failed_tables.append(table)
                 idx += 1
+        if len(failed_tables) > 0:
+            self.logger.error("Failed to profile {} tables: {}".format(len(failed_tables), failed_tables))
+        # the next run compares only the tables whose schema fingerprint differs from this snapshot. Failed tables
+        # keep their previous entry so that they are found as new or updated again
+        compare.save_snapshot(failed_tables)
         return True
\ No newline at end of file
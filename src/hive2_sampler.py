@@ -1,11 +1,13 @@
 #!/bin/python
 import random
 import time
-import glob
 import os
+import queue
+import threading
 from pyhive import hive
 from custom_logger import CustomLogger
 from data_sampler import DataSampler
+from sampling_strategy import get_sampling_strategy
 
 
 class Hive2Sampler(DataSampler):
@@ -40,6 +42,21 @@ class Hive2Sampler(DataSampler):
             self._maxNumPart = 100
         else:
             self._maxNumPart = config['maxNumPartition']
+        # Max number of partition queries of one table running at the same time, each on its own connection
+        self._maxConcurrentPart = config.get('maxConcurrentPartitions', 4)
+        if self._maxConcurrentPart < 1:
+            self.logger.error("Value for parameter maxConcurrentPartitions is illegal: {}".format(self._maxConcurrentPart))
+            self.logger.error("Will use the default value 4 for maxConcurrentPartitions instead")
+            self._maxConcurrentPart = 4
+        self._set_stream_options(config)
+        self._set_parallel_options(config)
+        # Server-side sampling of non-partitioned tables
+        self._sampling = get_sampling_strategy(config, 'hive', default='rand_sort')
+        # Idle connections as (database, connection), oldest first, for the parallel table sampling and the batched
+        # distinct value scans. At most _max_idle are kept open, over all databases
+        self._idle_connections = []
+        self._max_idle = self.pool_size
+        self._pool_lock = threading.Lock()
 
 
     @staticmethod
@@ -75,9 +92,10 @@ class Hive2Sampler(DataSampler):
             self.logger.error("Failed to get connection to database '{}'".format(database))
         return conn
 
-    def _get_databases(self, database):
+    def _get_databases(self, database='default'):
         """
         Get all database names
+        :param database: Database to connect to
         :return: List of database names if successful, otherwise empty list
         """
         try:
@@ -149,39 +167,113 @@ class Hive2Sampler(DataSampler):
             clauses.append(column + '=' + '"' + value + '"')
         return ' AND '.join(clauses)
 
-    def _get_data(self, database, table):
+    def _stream_query(self, conn, database, query, emit, stop=None, cursors=None):
         """
-        Get all data for database.table
+        Run a query and pass its rows to emit in batches of fetch_size. Retries up to 3 times on a renewed
+        connection as long as no rows have been passed yet.
+        :param conn: Connection to use first
+        :param database: Database name
+        :param query: Query
+        :param emit: Function called with (schema, rows) for every batch
+        :param stop: Event set when the table is abandoned, so that no retry is made
+        :param cursors: Set to register the running cursor in, so that it can be cancelled
+        :return: Tuple of (connection to keep using, True if successful)
+        """
+        n_runs = 0
+        while n_runs < 3:
+            emitted = False
+            cur = None
+            try:
+                if conn is None:
+                    conn = self._get_connection(database)
+                    if conn is None:
+                        return None, False
+                cur = conn.cursor()
+                cur.arraysize = self.fetch_size
+                if cursors is not None:
+                    cursors.add(cur)
+                cur.execute(query)
+                schema = tuple([item[0] for item in cur.description])
+                for rows in self._fetch_batches(cur):
+                    emit(schema, rows)
+                    emitted = True
+                if not emitted:
+                    emit(schema, [])
+                return conn, True
+            except Exception as e:
+                self.logger.error(e)
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+                conn = None
+                # rows already written would be duplicated by a retry
+                if emitted or (stop is not None and stop.is_set()):
+                    return None, False
+            finally:
+                if cursors is not None:
+                    cursors.discard(cur)
+            time.sleep(5)
+            n_runs += 1
+        return conn, False
+
+    def _query_partitions(self, database, queries, results, stop, cursors):
+        """
+        Run queries taken from a shared queue on one pooled connection until the end marker
+        :param database: Database name
+        :param queries: Queue of (clause, query), followed by None
+        :param results: Queue to put ("rows", schema, rows) for every batch, ("done", clause, successful) for every
+        query, and None when finished
+        :param stop: Event set when the table is abandoned. Remaining queries are reported as failed without running
+        :param cursors: Set of running cursors of the table
+        :return: None
+        """
+        conn = self._acquire_connection(database)
+        try:
+            while True:
+                item = queries.get()
+                if item is None:
+                    break
+                clause, query = item
+                if stop.is_set():
+                    results.put(("done", clause, False))
+                    continue
+                conn, successful = self._stream_query(conn, database, query,
+                                                      lambda schema, rows: results.put(("rows", schema, rows)),
+                                                      stop, cursors)
+                results.put(("done", clause, successful))
+        finally:
+            if conn is not None:
+                self._release_connection(database, conn)
+            results.put(None)
+
+    def _get_data(self, database, table, deadline=None):
+        """
+        Get sampled data for database.table. Partitions are queried in parallel, up to maxConcurrentPartitions at a
+        time, and each batch of rows is yielded as soon as it arrives.
         :param database: database name
         :param table: table name
-        :return: A list of tuples, the first being the schema and others column values. None if Error
+        :param deadline: time.time() value at which the running queries are cancelled, or None for no limit
+        :return: Generator of (schema, rows). Yields None if the table can not be read
         """
         self.logger.info("Getting data for '{}.{}'".format(database, table))
-        data = []
-        conn = self._get_connection(database)
+        conn = self._acquire_connection(database)
         if conn is None:
-            return None
+            yield None
+            return
         cur = conn.cursor()
         partitions = self._get_partitions(cur, table)
+        self._release_connection(database, conn)
         self.logger.info("Found partitions: {} ...".format(partitions[:10]))
 
+        queries = queue.Queue()
         n_partitions = len(partitions)
         if n_partitions > 0:
             random.shuffle(partitions)
             if n_partitions > self._maxNumPart:
                 partitions = partitions[:self._maxNumPart]
             query_size = int(10000. / len(partitions) + 1)
-            schema = None
-            i_part = 0
-            for partition in partitions:
-                self.logger.info('Processing partition {} of {}'.format(i_part+1, n_partitions))
-                if i_part > 0 and i_part % 100 == 0:  # reset connection
-                    conn.close()
-                    conn = self._get_connection(database)
-                    if conn is None:
-                        self.logger.error("Failed to renew the connection to database '{}'".format(database))
-                        return None
-                    cur = conn.cursor()
+            for i_part, partition in enumerate(partitions):
                 clause = self._parse_partition(partition)
                 if i_part == 0:
                     self.logger.info("partition: {}".format(partition))
@@ -192,55 +284,99 @@ class Hive2Sampler(DataSampler):
                     query = query + ' where ' + clause
                 query = query + ' limit {}'.format(query_size)
                 # query = query + ' distribute by rand() sort by rand() limit 100'
-                n_runs = 0
-                while n_runs < 3:
-                    try:
-                        cur.execute(query)
-                        if schema is None:
-                            # result = cur.getSchema()
-                            # schema = result
-                            result = cur.description
-                            result = [item[0] for item in result]
-                            schema = tuple(result)
-                            data.append(schema)
-                        result = cur.fetchall()
-                        if len(result) > 0:
-                            data += result
-                        break
-                    except Exception as e:
-                        self.logger.error(e)
-                        time.sleep(5)
-                        n_runs += 1
-                if n_runs == 3:
-                    self.logger.error("Failed to get data for partition '{}'".format(clause))
-                i_part += 1
+                queries.put((clause, query))
         else:  # non-partitioned table
-            schema = None
             # query = 'select * from ' + table
             self.logger.info("{} is not partitioned.".format(table))
-            query = self._getDataQuery.format(table)
             # query = query + ' limit 50000'
-            query = query + ' distribute by rand() sort by rand() limit 10000'
-            n_runs = 0
-            while n_runs < 3:
+            query = self._sampling.query(self._getDataQuery, table)
+            queries.put(('', query))
+
+        n_queries = queries.qsize()
+        n_workers = min(self._maxConcurrentPart, n_queries)
+        for i in range(0, n_workers):
+            queries.put(None)
+        # bounded so that at most a few batches per worker are held in memory
+        results = queue.Queue(maxsize=n_workers * 2)
+        stop = threading.Event()
+        cursors = set()
+
+        def cancel():
+            self.logger.error("Sampling '{}.{}' timed out".format(database, table))
+            stop.set()
+            for running in list(cursors):
                 try:
-                    cur.execute(query)
-                    if schema is None:
-                        result = cur.description
-                        result = [item[0] for item in result]
-                        schema = tuple(result)
-                        data.append(schema)
-                    result = cur.fetchall()
-                    if len(result) > 0:
-                        data += result
+                    running.cancel()
+                except Exception as e:
+                    self.logger.error(e)
+
+        workers = [threading.Thread(target=self._query_partitions, args=(database, queries, results, stop, cursors),
+                                    daemon=True)
+                   for i in range(0, n_workers)]
+        for worker in workers:
+            worker.start()
+        timer = self._watchdog(deadline, cancel)
+
+        finished = 0
+        i_query = 0
+        try:
+            while finished < n_workers:
+                result = results.get()
+                if result is None:
+                    finished += 1
+                    continue
+                # after a timeout, drain the results so that the workers can finish and release their connections
+                if stop.is_set():
+                    continue
+                if result[0] == "rows":
+                    yield result[1], result[2]
+                    continue
+                kind, clause, successful = result
+                i_query += 1
+                if n_partitions > 0:
+                    self.logger.info('Processed partition {} of {}'.format(i_query, n_queries))
+                if not successful:
+                    if n_partitions == 0:
+                        yield None
+                        return
+                    self.logger.error("Failed to get data for partition '{}'".format(clause))
+        finally:
+            if timer is not None:
+                timer.cancel()
+        if stop.is_set():
+            yield None
+
+    def _sample_table(self, database, table, output_dir, deadline=None):
+        """
+        Sample database.table and write the rows into its csv file as they arrive. The file is written under a
+        temporary name and renamed when complete.
+        :param database: Database name
+        :param table: Table name
+        :param output_dir: Absolute path to output directory
+        :param deadline: time.time() value at which the table is abandoned, or None for no limit
+        :return: True if successful. Otherwise False
+        """
+        file_path = output_dir + '/' + database + '.' + table + '.csv'
+        has_schema = False
+        n_records = 0
+        output_file, writer = self._open_csv(file_path + '.tmp')
+        with output_file:
+            for result in self._get_data(database, table, deadline):
+                if result is None:
+                    has_schema = False
                     break
-                except Exception:
-                    time.sleep(5)
-                    n_runs += 1
-            if n_runs == 3:
-                return None
-        self.logger.info("Retrieved {} records from '{}.{}'".format(len(data), database, table))
-        return data
+                schema, rows = result
+                if not has_schema:
+                    writer.writerow(self._column_names(schema))
+                    has_schema = True
+                writer.writerows(rows)
+                n_records += len(rows)
+        if not has_schema:
+            os.remove(file_path + '.tmp')
+            return False
+        os.replace(file_path + '.tmp', file_path)
+        self.logger.info("Retrieved {} records from '{}.{}'".format(n_records, database, table))
+        return True
 
     def _write_to_file(self, database, table, data, output_dir):
         """
@@ -252,47 +388,18 @@ class Hive2Sampler(DataSampler):
         :return: None
         """
         self.logger.info("Saving data to file for '{}.{}'".format(database, table))
-        output_file = open(output_dir + '/' + database + '.' + table + '.csv', 'w')
-        if len(data) > 0:
-            schema = data[0]
-            column_names = []
-            for columnName in schema:
-                if '.' in columnName:
-                    column_names.append(columnName.split('.')[1])
-                else:
-                    column_names.append(columnName)
-            output_file.write('' + ','.join(column_names) + '\n')
-            for row in data[1:]:
-                output_file.write(
-                    '"' +
-                    '","'.join(
-                        [str(item).replace('"', '\\"').replace('\\\\"', '\\"') if item is not None
-                         else '' for item in row]
-                    ) +
-                    '"\n'
-                )
-        output_file.close()
-
-    @staticmethod
-    def _get_file_size(database, table, output_dir):
-        """
-        Get existing local output file size
-        :param database: Database
-        :param table: Table name
-        :param output_dir: Absolute path to output directory
-        :return: File size
-        """
-        filesize = 0
-        filepath = output_dir + '/' + database + '.' + table + '.csv'
-        files = glob.glob(filepath)
-        if len(files) == 1:
-            filesize = int(os.path.getsize(filepath))
-        return filesize
+        output_file, writer = self._open_csv(output_dir + '/' + database + '.' + table + '.csv')
+        with output_file:
+            if len(data) > 0:
+                writer.writerow(self._column_names(data[0]))
+                writer.writerows(data[1:])
 
     def get_sampled_data(self, output_dir, does_reload=False):
         """
-        Sample data from all databases/tables in hive server and save into files
+        Sample data from all databases/tables in hive server and save into files, up to maxConcurrentTables tables
+        at a time
         :param output_dir: Absolute path to output directory
+        :param does_reload: Sample again the tables recorded as completed in the manifest
         :return: True if successful. Otherwise False
         """
         self.logger.info("Retrieving random sample data from all databases/tables")
@@ -302,111 +409,83 @@ class Hive2Sampler(DataSampler):
             self.logger.error("No databases found")
             return False
         self.logger.info("Found databases {}".format(databases))
+        tables = []
         for database in databases:
-            conn = self._get_connection('test')
-            if conn is not None:
-                self.logger.info("Processing database '{}'".format(database))
-                cur = conn.cursor()
-                tables = self.get_tables(database)
+            self.logger.info("Processing database '{}'".format(database))
+            database_tables = self.get_tables(database)
+            self.logger.info("Found tables {} in database '{}'".format(database_tables, database))
+            tables += [(database, table) for table in database_tables]
+        return self._sample_tables(tables, output_dir, does_reload)
+
+    def _sample_table_on_pool(self, database, table, output_dir, deadline=None):
+        # the partition queries of the table take their own connections from the pool
+        return self._sample_table(database, table, output_dir, deadline)
+
+    @staticmethod
+    def _distinct_query(table, columns):
+        # Hive needs the grouping columns before GROUPING SETS
+        return 'SELECT {}, {}, COUNT(*) FROM {} GROUP BY {} GROUPING SETS ({})'.format(
+            ', '.join(columns),
+            ', '.join(['GROUPING({})'.format(column) for column in columns]),
+            table,
+            ', '.join(columns),
+            ', '.join(['({})'.format(column) for column in columns])
+        )
+
+    def _open_connections(self, pool_size):
+        """
+        Keep at most pool_size idle connections, over all databases
+        :param pool_size: Max number of idle connections
+        """
+        with self._pool_lock:
+            self._max_idle = pool_size
+            excess = self._trim_idle_connections()
+        self._close_all(excess)
+
+    def _trim_idle_connections(self):
+        # the oldest idle connections over _max_idle, to be closed outside the lock
+        n_excess = max(0, len(self._idle_connections) - self._max_idle)
+        excess = [conn for database, conn in self._idle_connections[:n_excess]]
+        del self._idle_connections[:n_excess]
+        return excess
+
+    @staticmethod
+    def _close_all(conns):
+        for conn in conns:
+            try:
                 conn.close()
-                self.logger.info("Found tables {} in database '{}'".format(tables, database))
-                if len(tables) == 0:
-                    continue
-                for table in tables:
-                    if not does_reload and self._get_file_size(database, table, output_dir) > 50000:
-                        self.logger.info("Output file for '{}.{}' already exists. Skip.".format(database, table))
-                        continue
-                    data = self._get_data(database, table)
-                    if data is None:
-                        self.logger.error("Failed to get data for '{}.{}'".format(database, table))
-                        continue
-                    self._write_to_file(database, table, data, output_dir)
-        return True
+            except Exception:
+                pass
 
-    def get_distinct_values(self, columns_file, output_dir):
+    def _acquire_connection(self, database):
         """
-        Get distinct values in each column and save into file
-        :param columns_file: File containing the full column path database.table.column
-        :param output_dir: Absolute path to output directory
-        :return: None
+        Take the most recent idle connection to database, or open a new one
+        :param database: Database name
+        :return: Connection if successful, otherwise None
         """
-        self.logger.info("Processing columns in {}".format(columns_file))
-        with open(columns_file, 'r') as columns:
-            for line in columns.readlines():
-                if '.' not in line:
-                    continue
-                distinct_values = set()
-                data = []
-                schema = None
-                line = line[:-1]
-                database, table, column = line.split('.')
-                if self._get_file_size(database, table + '.' + column, output_dir) > 50000:
-                    continue
-                self.logger.info("Getting distinct values for '{}.{}.{}'".format(database, table, column))
-                conn = self._get_connection(database)
-                if conn is not None:
-                    cur = conn.cursor()
-                    partitions = self._get_partitions(cur, table)
-                    n_partitions = len(partitions)
-                    if n_partitions > 0:
-                        i_part = 0
-                        for partition in partitions:
-                            if i_part > 0 and i_part % 100 == 0:
-                                conn.close()
-                                conn = self._get_connection(database)
-                                cur = conn.cursor()
-                            self.logger.info('Processing partition {} of {}'.format(i_part+1, n_partitions))
-                            clause = self._parse_partition(partition)
-                            if i_part == 0:
-                                self.logger.info('partition: {}'.format(partition))
-                                self.logger.info('clause:    {}'.format(clause))
-                            query = 'select distinct(' + column + ') from ' + table
-                            if clause != '':
-                                query = query + ' where ' + clause
-                            n_runs = 0
-                            while n_runs < 3:
-                                try:
-                                    cur.execute(query)
-                                    if schema is None:
-                                        schema = ('primaryKey', column)
-                                        data.append(schema)
-                                        # self.logger.info(schema)
-                                    result = cur.fetchall()
-                                    if len(result) > 0:
-                                        distinct_values = distinct_values.union([y for x in result for y in x])
-                                    break
-                                except Exception as e:
-                                    self.logger.error(e)
-                                    time.sleep(5)
-                                    n_runs += 1
-                            i_part += 1
-                    else:
-                        query = 'select distinct(' + column + ') from ' + table
-                        n_runs = 0
-                        while n_runs < 3:
-                            try:
-                                cur.execute(query)
-                                if schema is None:
-                                    schema = ('primaryKey', column)
-                                    data.append(schema)
-                                result = cur.fetchall()
-                                if len(result) > 0:
-                                    distinct_values = distinct_values.union([y for x in result for y in x])
-                                break
-                            except Exception as e:
-                                self.logger.error(e)
-                                time.sleep(5)
-                                n_runs += 1
-                    conn.close() 
-                if len(distinct_values) > 0:
-                    list_distinct_values = []
-                    for value in distinct_values:
-                        if value is None or value == '' or value.strip() == '':
-                            continue
-                        elif self._is_ascii(value):
-                            list_distinct_values.append(value)
-                    for i in range(0, len(list_distinct_values)):
-                        data.append([str(i), list_distinct_values[i]])
-                    # data += [[item] for item in list_distinct_values]
-                    self._write_to_file(database, table + '.' + column, data, output_dir)
+        with self._pool_lock:
+            for i in range(len(self._idle_connections) - 1, -1, -1):
+                if self._idle_connections[i][0] == database:
+                    return self._idle_connections.pop(i)[1]
+        return self._get_connection(database)
+
+    def _release_connection(self, database, conn, discard=False):
+        """
+        Keep a connection for reuse, closing the oldest idle connection of any database over _max_idle
+        :param database: Database name
+        :param conn: Connection
+        :param discard: Close the connection instead of keeping it for reuse
+        """
+        if discard:
+            self._close_all([conn])
+            return
+        with self._pool_lock:
+            self._idle_connections.append((database, conn))
+            excess = self._trim_idle_connections()
+        self._close_all(excess)
 
+    def _close_connections(self):
+        with self._pool_lock:
+            idle = [conn for database, conn in self._idle_connections]
+            self._idle_connections = []
+        self._close_all(idle)
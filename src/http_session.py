@@ -0,0 +1,103 @@
+#!/bin/python
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Transport settings shared by every Unify / df-connect call
+POOL_SIZE = 16
+RETRIES = 3
+BACKOFF_FACTOR = 0.5
+RETRY_STATUS = (500, 502, 503, 504)
+TIMEOUT = (10, 600)
+# Read timeout of the df-connect profile calls, which run as long as the table takes. None waits without limit.
+PROFILE_READ_TIMEOUT = None
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that applies a default (connect, read) timeout to requests sent without one
+    """
+    def __init__(self, timeout=None, *args, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def configure(pool_size=None, retries=None, backoff_factor=None, retry_status=None, timeout=None,
+              profile_read_timeout=None):
+    """
+    Change the transport settings. Sessions created before the call are dropped and rebuilt on next use.
+    :param pool_size: Number of keep-alive connections kept per host
+    :param retries: Number of retries for connection errors and retry_status responses
+    :param backoff_factor: Exponential backoff factor between retries (backoff_factor * 2 ^ (retry - 1) seconds)
+    :param retry_status: HTTP status codes to retry
+    :param timeout: Default (connect, read) timeout in seconds
+    :param profile_read_timeout: Read timeout in seconds of the df-connect profile calls
+    """
+    global POOL_SIZE, RETRIES, BACKOFF_FACTOR, RETRY_STATUS, TIMEOUT, PROFILE_READ_TIMEOUT
+    if pool_size is not None: POOL_SIZE = pool_size
+    if retries is not None: RETRIES = retries
+    if backoff_factor is not None: BACKOFF_FACTOR = backoff_factor
+    if retry_status is not None: RETRY_STATUS = tuple(retry_status)
+    if timeout is not None: TIMEOUT = timeout
+    if profile_read_timeout is not None: PROFILE_READ_TIMEOUT = profile_read_timeout
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def profile_timeout(read_timeout=None):
+    """
+    Timeout of a df-connect profile call. The call is not retried on read timeouts, so a long running profile is
+    never sent twice.
+    :param read_timeout: Read timeout in seconds, defaults to PROFILE_READ_TIMEOUT
+    :return: (connect, read) timeout
+    """
+    return (TIMEOUT[0], read_timeout if read_timeout is not None else PROFILE_READ_TIMEOUT)
+
+
+def _new_session():
+    # Read errors and retry_status responses are retried only for idempotent methods (urllib3 default whitelist).
+    # POSTs such as profile, updateRecords or dataset creation change state or run long and are not sent again.
+    retry = Retry(
+        total=RETRIES,
+        connect=RETRIES,
+        read=RETRIES,
+        status=RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUS,
+        raise_on_status=False
+    )
+    adapter = TimeoutHTTPAdapter(timeout=TIMEOUT, pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Accept-Encoding": "gzip, deflate"})
+    return session
+
+
+def get_session():
+    """
+    Get the keep-alive session of the current process. Forked processes build their own session instead of
+    sharing the parent's sockets.
+    :return: requests.Session
+    """
+    pid = os.getpid()
+    session = _sessions.get(pid)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(pid)
+            if session is None:
+                session = _new_session()
+                _sessions[pid] = session
+    return session
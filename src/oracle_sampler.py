@@ -1,10 +1,11 @@
 #!/bin/python
 import time
-import glob
+import threading
 import os
 import cx_Oracle
 from custom_logger import CustomLogger
 from data_sampler import DataSampler
+from sampling_strategy import get_sampling_strategy
 
 
 class OracleSampler(DataSampler):
@@ -29,6 +30,12 @@ class OracleSampler(DataSampler):
         self._sid = config['sid']
         self._getTableQuery = config['getTableQuery']
         self._getDataQuery = config['getDataQuery']
+        self._set_stream_options(config)
+        self._set_parallel_options(config)
+        # Session pool for the parallel table sampling and the batched distinct value scans
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._sampling = get_sampling_strategy(config, 'oracle')
 
     @staticmethod
     def _is_ascii(s):
@@ -79,44 +86,74 @@ class OracleSampler(DataSampler):
         conn.close()
         return tables
 
-    def _get_data(self, table, conn):
+    def _get_row_count(self, conn, table):
         """
-        Get all data for database.table
+        Get the row count of table from the optimizer statistics
+        :param conn: Active connection
         :param table: table name
-        :return: A list of tuples, the first being the schema and others column values. None if Error
+        :return: Row count if analyzed, otherwise None
+        """
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT MAX(NUM_ROWS) FROM ALL_TABLES WHERE TABLE_NAME = :1", [table.upper()])
+            result = cur.fetchone()
+            return result[0] if result is not None else None
+        except Exception as e:
+            self.logger.error(e)
+            return None
+
+    def _sample_table(self, table, conn, output_dir, deadline=None):
+        """
+        Sample sid.table and write the rows into its csv file in batches of fetch_size as they are fetched.
+        The file is written under a temporary name and renamed when complete.
+        :param table: table name
+        :param conn: Active connection
+        :param output_dir: Absolute path to output directory
+        :param deadline: time.time() value after which no retry is made, or None for no limit
+        :return: True if successful. Otherwise False
         """
         self.logger.info("Getting data for '{}.{}'".format(self._sid, table))
-        data = []
-        # conn = self._get_connection()
-        # if conn is None:
-        #     return None
+        file_path = output_dir + '/' + self._sid + '.' + table + '.csv'
         cur = conn.cursor()
+        cur.arraysize = self.fetch_size
 
-        schema = None
         # query = 'select * from (select * from ' + table + ' order by dbms_random.value) where rownum < 10000'
-        query = self._getDataQuery.format(table)
+        row_cnt = self._get_row_count(conn, table) if self._sampling.uses_row_cnt else None
+        query = self._sampling.query(self._getDataQuery, table, row_cnt)
         n_runs = 0
         while n_runs < 3:
+            n_records = 0
+            emitted = False
             try:
                 cur.execute(query)
-                if schema is None:
-                    result = cur.description
-                    result = [item[0] for item in result]
-                    schema = tuple(result)
-                    data.append(schema)
-                result = cur.fetchall()
-                if len(result) > 0:
-                    data += result
+                output_file, writer = self._open_csv(file_path + '.tmp')
+                with output_file:
+                    writer.writerow(self._column_names([item[0] for item in cur.description]))
+                    for rows in self._fetch_batches(cur):
+                        writer.writerows(rows)
+                        n_records += len(rows)
+                        emitted = True
+                os.replace(file_path + '.tmp', file_path)
                 break
-            except Exception:
+            except Exception as e:
+                self.logger.error(e)
+                if os.path.exists(file_path + '.tmp'):
+                    os.remove(file_path + '.tmp')
+                # a partially fetched cursor can not be resumed
+                if emitted:
+                    n_runs = 3
+                    break
+                if deadline is not None and time.time() + 5 >= deadline:
+                    self.logger.error("Sampling '{}.{}' timed out".format(self._sid, table))
+                    n_runs = 3
+                    break
                 time.sleep(5)
                 n_runs += 1
         if n_runs == 3:
-            conn.close()
-            return None
-        self.logger.info("Retrieved {} records from '{}.{}'".format(len(data), self._sid, table))
+            return False
+        self.logger.info("Retrieved {} records from '{}.{}'".format(n_records, self._sid, table))
         # conn.close()
-        return data
+        return True
 
     def _write_to_file(self, database, table, data, output_dir):
         """
@@ -128,123 +165,104 @@ class OracleSampler(DataSampler):
         :return: None
         """
         self.logger.info("Saving data to file for '{}.{}'".format(database, table))
-        output_file = open(output_dir + '/' + database + '.' + table + '.csv', 'w', encoding='utf-8')
-        if len(data) > 0:
-            schema = data[0]
-            column_names = []
-            for columnName in schema:
-                if '.' in columnName:
-                    column_names.append(columnName.split('.')[1])
-                else:
-                    column_names.append(columnName)
-            output_file.write('' + ','.join(column_names) + '\n')
-            for row in data[1:]:
-                output_file.write(
-                    '"' +
-                    '","'.join(
-                        [str(item).replace('"', '\\"').replace('\\\\"', '\\"') if item is not None else '' for item in row]
-                    ) +
-                    '"\n'
-                )
-        output_file.close()
-
-    @staticmethod
-    def _get_file_size(database, table, output_dir):
-        """
-        Get existing local output file size
-        :param database: Database
-        :param table: Table name
-        :param output_dir: Absolute path to output directory
-        :return: File size
-        """
-        filesize = 0
-        filepath = output_dir + '/' + database + '.' + table + '.csv'
-        files = glob.glob(filepath)
-        if len(files) == 1:
-            filesize = int(os.path.getsize(filepath))
-        return filesize
+        output_file, writer = self._open_csv(output_dir + '/' + database + '.' + table + '.csv')
+        with output_file:
+            if len(data) > 0:
+                writer.writerow(self._column_names(data[0]))
+                writer.writerows(data[1:])
 
     def get_sampled_data(self, output_dir, does_reload=False):
         """
-        Sample data from all databases/tables in hive server and save into files
+        Sample data from all tables in the sid and save into files, up to maxConcurrentTables tables at a time
         :param output_dir: Absolute path to output directory
+        :param does_reload: Sample again the tables recorded as completed in the manifest
         :return: True if successful. Otherwise False
         """
         self.logger.info("Retrieving random sample data from all databases/tables")
         self.logger.info("Data will be saved under {}".format(output_dir))
         conn = self._get_connection()
-        if conn is not None:
-            conn.close()
-            self.logger.info("Processing sid '{}'".format(self._sid))
-            tables = self.get_tables()
-            self.logger.info("Found tables {} in sid '{}'".format(tables, self._sid))
-            if len(tables) == 0:
-                self.logger.error("No tables found")
-                return False
-            for table in tables:
-                if not does_reload and self._get_file_size(self._sid, table, output_dir) > 50000:
-                    self.logger.info("Output file for '{}.{}' already exists. Skip.".format(self._sid, table))
-                    continue
-                conn = self._get_connection()
-                if conn is None:
-                    return None
-                data = self._get_data(table, conn)
-                if data is None:
-                    self.logger.error("Failed to get data for '{}.{}'".format(self._sid, table))
-                    continue
-                self._write_to_file(self._sid, table, data, output_dir)
-                conn.close()
-        return True
+        if conn is None:
+            return False
+        conn.close()
+        self.logger.info("Processing sid '{}'".format(self._sid))
+        tables = self.get_tables()
+        self.logger.info("Found tables {} in sid '{}'".format(tables, self._sid))
+        if len(tables) == 0:
+            self.logger.error("No tables found")
+            return False
+        return self._sample_tables([(self._sid, table) for table in tables], output_dir, does_reload)
+
+    def _sample_table_on_pool(self, database, table, output_dir, deadline=None):
+        conn = self._acquire_connection(database)
+        if conn is None:
+            return False
+        # interrupts the running execute or fetch at the deadline
+        timer = self._watchdog(deadline, conn.cancel)
+        successful = False
+        try:
+            successful = self._sample_table(table, conn, output_dir, deadline)
+        finally:
+            if timer is not None:
+                timer.cancel()
+            self._release_connection(database, conn, discard=not successful)
+        return successful
+
+    def _create_pool(self, database, pool_size):
+        return cx_Oracle.SessionPool(
+            self._user,
+            self._password,
+            "{}:{}/{}".format(self._host, self._port, database),
+            min=1,
+            max=pool_size,
+            increment=1,
+            threaded=True,
+            getmode=cx_Oracle.SPOOL_ATTRVAL_WAIT
+        )
 
-    def get_distinct_values(self, columns_file, output_dir):
+    def _open_connections(self, pool_size):
         """
-        Get distinct values in each column and save into file
-        :param columns_file: File containing the full column path sid.table.column
-        :param output_dir: Absolute path to output directory
-        :return: None
+        Create the session pool with pool_size sessions at most, replacing a smaller pool
+        :param pool_size: Max number of pooled connections
         """
-        self.logger.info("Processing columns in {}".format(columns_file))
-        with open(columns_file, 'r') as columns:
-            for line in columns.readlines():
-                if '.' not in line:
-                    continue
-                distinct_values = set()
-                data = []
-                schema = None
-                line = line[:-1]
-                sid, table, column = line.split('.')
-                if self._get_file_size(sid, table + '.' + column, output_dir) > 50000:
-                    continue
-                self.logger.info("Getting distinct values for '{}.{}.{}'".format(sid, table, column))
-                conn = self._get_connection()
-                if conn is not None:
-                    cur = conn.cursor()
-                    query = 'select distinct(' + column + ') from ' + table
-                    n_runs = 0
-                    while n_runs < 3:
-                        try:
-                            cur.execute(query)
-                            if schema is None:
-                                schema = ('primaryKey', column)
-                                data.append(schema)
-                            result = cur.fetchall()
-                            if len(result) > 0:
-                                distinct_values = distinct_values.union([y for x in result for y in x])
-                            break
-                        except Exception as e:
-                            self.logger.error(e)
-                            time.sleep(5)
-                            n_runs += 1
-                    conn.close() 
-                if len(distinct_values) > 0:
-                    list_distinct_values = []
-                    for value in distinct_values:
-                        if value is None or value == '' or value.strip() == '':
-                            continue
-                        elif self._is_ascii(value):
-                            list_distinct_values.append(value)
-                    for i in range(0, len(list_distinct_values)):
-                        data.append([str(i), list_distinct_values[i]])
-                    # data += [[item] for item in list_distinct_values]
-                    self._write_to_file(sid, table + '.' + column, data, output_dir)
+        try:
+            with self._pool_lock:
+                if self._pool is not None:
+                    if self._pool.max >= pool_size:
+                        return
+                    self._pool.close(force=True)
+                    self._pool = None
+                self._pool = self._create_pool(self._sid, pool_size)
+        except Exception as e:
+            self.logger.error(e)
+            self.logger.error("Failed to create session pool for sid '{}'".format(self._sid))
+
+    def _acquire_connection(self, database):
+        """
+        Take a connection from the session pool, created with pool_size sessions if _open_connections did not run
+        :param database: sid
+        :return: Connection if successful, otherwise None
+        """
+        try:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = self._create_pool(database, self.pool_size)
+            return self._pool.acquire()
+        except Exception as e:
+            self.logger.error(e)
+            self.logger.error("Failed to get connection to sid '{}'".format(database))
+            return None
+
+    def _release_connection(self, database, conn, discard=False):
+        try:
+            if discard:
+                self._pool.drop(conn)
+            else:
+                self._pool.release(conn)
+        except Exception as e:
+            self.logger.error(e)
 
+    def _close_connections(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.close(force=True)
+                self._pool = None
@@ -10,7 +10,7 @@ from oracle_sampler import OracleSampler
 #from dfconnect_sampler import DfConnectSampler
 from data_preprocessor import DataPreprocessor
 from dfconnect_multi_sampler import DfConnectMultiSampler
-# from data_multi_preprocessor import DataMultiPreprocessor
+from data_multi_preprocessor import DataMultiPreprocessor
 from unify import Unify
 from project_config import ProjectConfig
 
@@ -67,7 +67,7 @@ def read_csv(logger, path_to_file):
         yield None
 
 
-def update_input_datasets_for_project(logger, unify_client, project_config, project_id, path_of_output):
+def update_input_datasets_for_project(logger, unify_client, project_config, project_id, path_of_output, delta=False):
     """
     Update input datasets for project
     :param logger: logging.logger
@@ -75,6 +75,7 @@ def update_input_datasets_for_project(logger, unify_client, project_config, proj
     :param project_config: Project config
     :param project_id: Project ID
     :param path_of_output: Path of output/ folder where the metadata input file lives
+    :param delta: Upload only records changed since the last successful upload
     :return: None
     """
     input_datasets = project_config["inputs"]
@@ -89,7 +90,9 @@ def update_input_datasets_for_project(logger, unify_client, project_config, proj
             logger.error("Problem retrieving list of column names for {}".format(dataset_name))
             continue
         data = read_csv(logger, path_of_output + '/' + dataset_name)
-        dataset_id, new_timestamp = unify_client.update_dataset(dataset_name, primary_key_column, column_names, data)
+        fingerprint_path = path_of_output + '/fingerprints/' + dataset_name + '.json' if delta else None
+        dataset_id, new_timestamp = unify_client.update_dataset(dataset_name, primary_key_column, column_names, data,
+                                                                fingerprint_path)
         if dataset_id is not None:
             dataset_ids.append(dataset_id)
             dataset_names.append(dataset_name)
@@ -115,7 +118,8 @@ def bootstrap_new_project(logger, unify_client, project_config, path_of_output):
     return True
 
 
-def process_existing_project(logger, unify_client, project_config, project_id, path_of_output, does_reload=False):
+def process_existing_project(logger, unify_client, project_config, project_id, path_of_output, does_reload=False,
+                             delta=False):
     """
     Process existing project
     :param logger: logging.logger
@@ -123,11 +127,12 @@ def process_existing_project(logger, unify_client, project_config, project_id, p
     :param project_config: Project config
     :param project_id: Project ID
     :param path_of_output: Absolute path to output/ folder
+    :param delta: Upload only records changed since the last successful upload
     :return: True if successful. Otherwise False.
     """
     # Update input datasets
     if does_reload:
-        update_input_datasets_for_project(logger, unify_client, project_config, project_id, path_of_output)
+        update_input_datasets_for_project(logger, unify_client, project_config, project_id, path_of_output, delta)
     # run mastering
     if not myUnify.run_mastering(project_id, project_config["name"]):
         return False
@@ -149,6 +154,11 @@ if __name__ == "__main__":
     parser_sampling.add_argument("-n", "--name", dest="name", type=str, default=None, required=True,
                                  help="name of data source")
     parser_sampling.add_argument("-r", "--reload", dest="does_reload", help="reload all tables", action="store_true")
+    parser_sampling.add_argument("--resume", dest="resume", action="store_true",
+                                 help="with mode connect, sample only the tables failed in the last run")
+    parser_sampling.add_argument("-i", "--incremental", dest="incremental", action="store_true",
+                                 help="with mode connect, sample only the tables whose columns, row count or last "
+                                      "modified time changed since their last successful profile")
     parser_metadata = subparsers.add_parser("metadata", help="metadata help")
     parser_metadata.add_argument("-m", "--mode", dest="mode", type=str, choices=['local', 'connect'],
                                  required=True, default=None, help="generate metadata for local raw data or dataset "
@@ -159,8 +169,18 @@ if __name__ == "__main__":
     parser_metadata.add_argument("-n", "--name", dest="name", help="name of data source", type=str, default=None)
     parser_metadata.add_argument("-d", "--dictionary", dest="dict", type=str, default=None,
                                  help="absolute path to token dictionary")
+    parser_metadata.add_argument("--cache", dest="cache", action="store_true",
+                                 help="keep the streamed profile dataset in tmp/ for replay")
+    parser_metadata.add_argument("--replay", dest="replay", action="store_true",
+                                 help="read the profile dataset from the tmp/ cache instead of Unify")
+    parser_metadata.add_argument("--unordered", dest="unordered", action="store_true",
+                                 help="write metadata rows as workers complete instead of in the profile dataset order")
+    parser_metadata.add_argument("--processes", dest="processes", type=int, default=None,
+                                 help="number of local files profiled at the same time (default: number of CPUs)")
     parser_unify = subparsers.add_parser("unify", help="unify help")
     parser_unify.add_argument("-r", "--reload", dest="does_reload", action="store_true", help="reload input datasets")
+    parser_unify.add_argument("--delta", dest="delta", action="store_true",
+                              help="when reloading, upload only records changed since the last upload")
     args = parser.parse_args()
 
     # get locations
@@ -228,7 +248,12 @@ if __name__ == "__main__":
                 jdbc_url = "jdbc:hive2://{}:{}".format(source_config['host'], source_config['port'])
                 mySampler = DfConnectMultiSampler(source_sampler, myCreds.creds['unify'], source_config, jdbc_url, source_config['user'], source_config['pwd'])
 
-        if not mySampler.get_sampled_data(path_of_data, args.does_reload):
+        if args.mode == 'connect':
+            sampled = mySampler.get_sampled_data(path_of_data, args.does_reload, resume=args.resume,
+                                                incremental=args.incremental)
+        else:
+            sampled = mySampler.get_sampled_data(path_of_data, args.does_reload)
+        if not sampled:
             logger.info("Data sampling FAILED")
             exit(1)
         else:
@@ -245,7 +270,8 @@ if __name__ == "__main__":
                 path_of_output,
                 myCreds.creds['unify'],
                 None,
-                args.dict
+                args.dict,
+                processes=args.processes
             )
             if not myPreprocessor.process_local_files():
                 logger.error("FAILED to generate metadata")
@@ -270,7 +296,8 @@ if __name__ == "__main__":
                 source_config,
                 args.dict
             )
-            if not myPreprocessor.process_unify_dataset(args.source):
+            if not myPreprocessor.process_unify_dataset(args.source, cache=args.cache, replay=args.replay,
+                                                   ordered=not args.unordered):
                 logger.error("Failed to generate metadata")
                 exit(1)
             else:
@@ -313,7 +340,8 @@ if __name__ == "__main__":
                 project_ids = \
                     [project.relative_id.split("/")[1] for project in existing_projects
                      if project.name == project_config["name"]]
-                if not process_existing_project(logger, myUnify, project_config, project_ids[0], path_of_output, args.does_reload):
+                if not process_existing_project(logger, myUnify, project_config, project_ids[0], path_of_output, args.does_reload,
+                                                args.delta):
                     logger.error("ERROR: Failed to update existing project '{}'".format(project_config["name"]))
                 else:
                     logger.info("Project '{}' has been updated".format(project_config["name"]))
@@ -0,0 +1,139 @@
+#!/bin/python
+from abc import ABC, abstractmethod
+
+
+class SamplingStrategy(ABC):
+    """
+    Builds the query that samples one table on the database side, from the source getDataQuery ("SELECT * FROM {}")
+    """
+    # True if query() uses row_cnt, so callers without it should look it up
+    uses_row_cnt = False
+
+    def __init__(self, dialect, sample_size=10000):
+        """
+        :param dialect: 'hive' or 'oracle'
+        :param sample_size: Max number of rows to return
+        """
+        self.dialect = dialect
+        self.sample_size = sample_size
+
+    @abstractmethod
+    def query(self, data_query, table, row_cnt=None):
+        """
+        Build the sampling query for a table
+        :param data_query: Source getDataQuery with one {} for the table name
+        :param table: Table name
+        :param row_cnt: Row count of the table (from get_sample_tables or statistics), None if unknown
+        :return: Query
+        """
+        pass
+
+    def _limit(self, query):
+        if self.dialect == 'oracle':
+            return 'SELECT * FROM ({}) WHERE ROWNUM <= {}'.format(query, self.sample_size)
+        return '{} limit {}'.format(query, self.sample_size)
+
+    @staticmethod
+    def _percent(value):
+        # Oracle SAMPLE accepts [0.000001, 100)
+        return '{:.6f}'.format(max(value, 0.000001)).rstrip('0').rstrip('.')
+
+
+class FullTableSampling(SamplingStrategy):
+    """
+    getDataQuery as is, without sampling or limit
+    """
+    def query(self, data_query, table, row_cnt=None):
+        return data_query.format(table)
+
+
+class RandomSortSampling(SamplingStrategy):
+    """
+    Random sort of the whole table (Hive distribute/sort by rand(), Oracle dbms_random). Reads and sorts every row
+    """
+    def query(self, data_query, table, row_cnt=None):
+        if self.dialect == 'oracle':
+            return self._limit('{} ORDER BY dbms_random.value'.format(data_query.format(table)))
+        return '{} distribute by rand() sort by rand() limit {}'.format(data_query.format(table), self.sample_size)
+
+
+class BucketSampling(SamplingStrategy):
+    """
+    Hive TABLESAMPLE(BUCKET 1 OUT OF n ON rand()). n is derived from row_cnt when known
+    """
+    uses_row_cnt = True
+
+    def __init__(self, dialect, sample_size=10000, buckets=100):
+        super().__init__(dialect, sample_size)
+        self.buckets = buckets
+
+    def query(self, data_query, table, row_cnt=None):
+        buckets = self.buckets if not row_cnt else max(1, int(row_cnt / self.sample_size))
+        if buckets <= 1:
+            return self._limit(data_query.format(table))
+        return self._limit(data_query.format('{} TABLESAMPLE(BUCKET 1 OUT OF {} ON rand())'.format(table, buckets)))
+
+
+class PercentSampling(SamplingStrategy):
+    """
+    Fixed percent of rows (Oracle SAMPLE(p)) or blocks (Oracle SAMPLE BLOCK(p), Hive TABLESAMPLE(p PERCENT))
+    """
+    def __init__(self, dialect, sample_size=10000, percent=1, block=False):
+        super().__init__(dialect, sample_size)
+        self.percent = percent
+        self.block = block
+
+    def _sample_clause(self, table, percent):
+        if percent >= 100:
+            return table
+        if self.dialect == 'oracle':
+            return '{} SAMPLE{}({})'.format(table, ' BLOCK' if self.block else '', self._percent(percent))
+        return '{} TABLESAMPLE({} PERCENT)'.format(table, self._percent(percent))
+
+    def query(self, data_query, table, row_cnt=None):
+        return self._limit(data_query.format(self._sample_clause(table, self.percent)))
+
+
+class RowCountSampling(PercentSampling):
+    """
+    Percent computed per table from row_cnt so that about sample_size rows are read, with oversample as margin.
+    Tables without row_cnt or smaller than sample_size are read with a plain limit
+    """
+    uses_row_cnt = True
+
+    def __init__(self, dialect, sample_size=10000, block=False, oversample=1.5):
+        super().__init__(dialect, sample_size, 100, block)
+        self.oversample = oversample
+
+    def query(self, data_query, table, row_cnt=None):
+        if not row_cnt or row_cnt <= self.sample_size:
+            return self._limit(data_query.format(table))
+        percent = min(100., self.sample_size * self.oversample * 100. / row_cnt)
+        return self._limit(data_query.format(self._sample_clause(table, percent)))
+
+
+def get_sampling_strategy(config, dialect, default='full'):
+    """
+    Create the sampling strategy configured for a source
+    :param config: Source config (samplingStrategy, sampleSize, samplePercent, sampleBuckets)
+    :param dialect: 'hive' or 'oracle'
+    :param default: Strategy used when samplingStrategy is not set
+    :return: SamplingStrategy
+    """
+    name = config.get('samplingStrategy', default)
+    sample_size = config.get('sampleSize', 10000)
+    if name == 'full':
+        return FullTableSampling(dialect, sample_size)
+    if name == 'rand_sort':
+        return RandomSortSampling(dialect, sample_size)
+    if name == 'bucket' and dialect == 'hive':
+        return BucketSampling(dialect, sample_size, config.get('sampleBuckets', 100))
+    if name == 'percent':
+        return PercentSampling(dialect, sample_size, config.get('samplePercent', 1))
+    if name == 'block':
+        return PercentSampling(dialect, sample_size, config.get('samplePercent', 1), block=True)
+    if name == 'row_count':
+        return RowCountSampling(dialect, sample_size)
+    if name == 'row_count_block':
+        return RowCountSampling(dialect, sample_size, block=True)
+    raise ValueError("Unknown samplingStrategy '{}'".format(name))
@@ -0,0 +1,59 @@
+#!/bin/python
+import re
+import bisect
+from functools import lru_cache
+
+
+class TokenNormalizer:
+    r"""
+    Normalize tokens in column names using a token dictionary, built once per dictionary.
+    Gives the same result as applying re.sub(r'\b{token}\b', full_words, name, flags=re.IGNORECASE) for every
+    dictionary entry in order, including replacements that are rewritten again by later entries.
+    """
+    _word = re.compile(r'\w+')
+
+    def __init__(self, token_dictionary, cache_size=100000):
+        """
+        :param token_dictionary: Dictionary of token to full words, in the order the entries are applied
+        :param cache_size: Number of normalized column names kept in the LRU memo
+        """
+        self._entries = list(token_dictionary.items()) if token_dictionary is not None else []
+        # plain word tokens are looked up per word. other tokens keep the ordered regex substitution
+        self._is_plain = all(self._word.fullmatch(token) is not None for token, full_words in self._entries)
+        if self._is_plain:
+            self._positions = {}
+            for i, (token, full_words) in enumerate(self._entries):
+                self._positions.setdefault(token.lower(), []).append(i)
+        else:
+            self._patterns = [
+                (re.compile(r'\b{}\b'.format(token), re.IGNORECASE), full_words) for token, full_words in self._entries
+            ]
+        self.normalize = lru_cache(maxsize=cache_size)(self._normalize)
+
+    def _normalize_word(self, word, start):
+        r"""
+        Apply the entries from index start onward to a single word
+        :param word: Word (a run of \w characters)
+        :param start: Index of the first dictionary entry to apply
+        :return: Normalized text
+        """
+        positions = self._positions.get(word.lower())
+        if positions is None:
+            return word
+        i = bisect.bisect_left(positions, start)
+        if i == len(positions):
+            return word
+        index = positions[i]
+        return self._word.sub(lambda m: self._normalize_word(m.group(0), index + 1), self._entries[index][1])
+
+    def _normalize(self, column_name):
+        """
+        :param column_name: Already tokenized column name
+        :return: Column name with token normalized using dictionary
+        """
+        result = column_name.lower()
+        if self._is_plain:
+            return self._word.sub(lambda m: self._normalize_word(m.group(0), 0), result)
+        for pattern, full_words in self._patterns:
+            result = pattern.sub(full_words, result)
+        return result
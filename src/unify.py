@@ -1,20 +1,25 @@
 #!/bin/python
+import os
 import requests
 import json
+import hashlib
 import base64
 import datetime
 import time
+import queue
+import threading
 from dateutil.tz import tzlocal
 import tamr_unify_client as api
 from tamr_unify_client.auth import UsernamePasswordAuth
 from custom_logger import CustomLogger
+from http_session import get_session
 
 
 class Unify:
     """
     This is a class for handling all operations to Tamr Unify
     """
-    def __init__(self, protocol, hostname, port, gr_port, user, pwd):
+    def __init__(self, protocol, hostname, port, gr_port, user, pwd, catalog_ttl=300, catalog_path=None):
         self._protocol = protocol
         self._hostname = hostname
         self._port = port
@@ -24,6 +29,11 @@ class Unify:
         auth = UsernamePasswordAuth(user, pwd)
         self.unify = api.Client(auth, host=self._hostname, protocol=self._protocol, port=self._port)
         self.logger = CustomLogger("unify")
+        # dataset name -> id/lastModified catalog cache
+        self._catalog_ttl = catalog_ttl
+        self._catalog_path = catalog_path
+        self._catalog = None
+        self._catalog_loaded_at = 0
 
     @staticmethod
     def _basic_auth_str(username, password):
@@ -41,7 +51,7 @@ class Unify:
         url = self._baseUrl + "/api/job/jobs/{}".format(job_id)
         headers = {"Accept": "application/json", 'Authorization': self._basicCreds}
         try:
-            response = requests.get(url, headers=headers)
+            response = get_session().get(url, headers=headers)
             if response.status_code not in [200, 201, 202]:
                 self.logger.error(response.text)
                 return 'FAILED'
@@ -86,7 +96,7 @@ class Unify:
         url = self._baseUrl + "/api/versioned/v1/datasets"
         headers = {"Accept": "application/json", "Authorization": self._basicCreds}
         try:
-            response = requests.get(url, headers=headers)            
+            response = get_session().get(url, headers=headers)            
             if response.status_code == 200:                
                 return json.loads(response.text)
             else:
@@ -97,20 +107,96 @@ class Unify:
             self.logger.error("Problem getting datasets")
             return None
 
+    def get_catalog(self, refresh=False):
+        """
+        Get the dataset catalog (name -> id and lastModified time). The catalog is kept in memory for catalog_ttl
+        seconds and, if catalog_path is set, shared between processes through that file.
+        :param refresh: Reload the catalog from Unify even if the cached one is still valid
+        :return: Dictionary of dataset name to {"id", "lastModified"} if successful. Otherwise None.
+        """
+        now = time.time()
+        if not refresh and self._catalog is not None and now - self._catalog_loaded_at < self._catalog_ttl:
+            return self._catalog
+        if not refresh and self._catalog_path is not None and os.path.exists(self._catalog_path):
+            try:
+                if now - os.path.getmtime(self._catalog_path) < self._catalog_ttl:
+                    with open(self._catalog_path, "r", encoding="utf-8") as f:
+                        self._catalog = json.load(f)
+                    self._catalog_loaded_at = os.path.getmtime(self._catalog_path)
+                    return self._catalog
+            except Exception as e:
+                self.logger.error("Problem reading dataset catalog {}: {}".format(self._catalog_path, e))
+        all_datasets = self.get_datasets()
+        if all_datasets is None:
+            return None
+        self._catalog = {
+            dataset["name"]: {
+                "id": dataset["id"].split("/")[-1],
+                "lastModified": dataset["lastModified"]["time"] if "lastModified" in dataset else None
+            } for dataset in all_datasets
+        }
+        self._catalog_loaded_at = now
+        if self._catalog_path is not None:
+            try:
+                if not os.path.exists(os.path.dirname(self._catalog_path)):
+                    os.makedirs(os.path.dirname(self._catalog_path))
+                tmp_path = "{}.{}".format(self._catalog_path, os.getpid())
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(self._catalog, f)
+                os.replace(tmp_path, self._catalog_path)
+            except Exception as e:
+                self.logger.error("Problem writing dataset catalog {}: {}".format(self._catalog_path, e))
+        return self._catalog
+
+    def invalidate_catalog(self):
+        """
+        Drop the cached dataset catalog so the next lookup reloads it from Unify
+        """
+        self._catalog = None
+        self._catalog_loaded_at = 0
+        if self._catalog_path is not None and os.path.exists(self._catalog_path):
+            try:
+                os.remove(self._catalog_path)
+            except OSError:
+                pass
+
+    def get_catalog_entry(self, dataset_name):
+        """
+        Look up a dataset in the catalog. A missing name reloads the catalog once, for datasets created since
+        it was cached.
+        :param dataset_name: Dataset name
+        :return: {"id", "lastModified"} if the dataset exists. Otherwise None.
+        """
+        catalog = self.get_catalog()
+        if catalog is not None and dataset_name in catalog:
+            return catalog[dataset_name]
+        catalog = self.get_catalog(refresh=True)
+        if catalog is not None and dataset_name in catalog:
+            return catalog[dataset_name]
+        return None
+
+    def get_dataset_id(self, dataset_name):
+        """
+        Resolve a dataset name to its ID through the catalog
+        :param dataset_name: Dataset name
+        :return: Dataset ID if the dataset exists. Otherwise None.
+        """
+        entry = self.get_catalog_entry(dataset_name)
+        return entry["id"] if entry is not None else None
+
     def get_dataset_last_modified_time(self, dataset_name):
         """
         Get the last modified time for dataset
         :param dataset_name: Dataset name
         :return: Datetime if successful. Otherwise None
         """
-        all_datasets = self.get_datasets()
-        queried_dataset = [dataset for dataset in all_datasets if dataset["name"] == dataset_name]
-        if len(queried_dataset) == 0:
+        queried_dataset = self.get_catalog_entry(dataset_name)
+        if queried_dataset is None or queried_dataset["lastModified"] is None:
             self.logger.error("Dataset '{}' can not be found".format(dataset_name))
             return None
         else:
             return datetime.datetime.strptime(
-                queried_dataset[0]["lastModified"]["time"],
+                queried_dataset["lastModified"],
                 "%Y-%m-%dT%H:%M:%S.%fZ"
             ).replace(tzinfo=tzlocal())
 
@@ -123,7 +209,7 @@ class Unify:
         url = self._baseUrl + "/api/dataset/datasets/{}".format(dataset_id)
         headers = {"Accept": "application/json", "Authorization": self._basicCreds}
         try:
-            response = requests.get(url, headers=headers)
+            response = get_session().get(url, headers=headers)
             if response.status_code == 200:
                 return json.loads(response.text)
             else:
@@ -142,7 +228,7 @@ class Unify:
         url = self._baseUrl + "/api/recipe/recipes/all"
         headers = {"Accept": "application/json", "Authorization": self._basicCreds}
         try:
-            response = requests.get(url, headers=headers)
+            response = get_session().get(url, headers=headers)
             if response.status_code == 200:
                 return json.loads(response.text)
             else:
@@ -162,7 +248,7 @@ class Unify:
         url = self._baseUrl + "/api/recipe/projects/{}".format(project_id)
         headers = {"Accept": "application/json", "Authorization": self._basicCreds}
         try:
-            response = requests.get(url, headers=headers)
+            response = get_session().get(url, headers=headers)
             if response.status_code == 200:
                 return json.loads(response.text)
             else:
@@ -187,7 +273,7 @@ class Unify:
             url = self._baseUrl + "/api/recipe/projects/{}?version={}".format(project_id, version_num)
             headers = {"Content-Type": "application/json", "Accept": "application/json", "Authorization": self._basicCreds}
             try:
-                response = requests.put(url, headers=headers, data=json.dumps(project_data))
+                response = get_session().put(url, headers=headers, data=json.dumps(project_data))
                 if response.status_code == 200:
                     return True
                 else:
@@ -216,7 +302,7 @@ class Unify:
                 "tokenizer": tokenizer
                 }
         try:
-            response = requests.post(url, headers=headers, data=json.dumps(data))
+            response = get_session().post(url, headers=headers, data=json.dumps(data))
             if response.status_code == 201:
                 return True
             else:
@@ -248,7 +334,7 @@ class Unify:
         }]
         relative_project_id = None
         try:
-            response = requests.post(url, headers=headers, data=json.dumps(project_config))
+            response = get_session().post(url, headers=headers, data=json.dumps(project_config))
             if response.status_code not in [200, 201, 202]:
                 self.logger.error("Problem creating new project {}: {}".format(project_name, response.text))
             else:
@@ -283,7 +369,7 @@ class Unify:
         url = self._baseUrl + "/api/dataset/datasets/named/{}".format(dataset_name)
         headers = {"Accept": "application/json", "Authorization": self._basicCreds}
         try:
-            response = requests.get(url, headers=headers)
+            response = get_session().get(url, headers=headers)
             if response.status_code == 200:
                 response_obj = json.loads(response.text)
                 return response_obj["documentId"]["id"]
@@ -305,10 +391,11 @@ class Unify:
         headers = {"Content-Type": "application/json", "Accept": "application/json", "Authorization": self._basicCreds}
         dataset_config = {"name": dataset_name, "keyAttributeNames": [primary_key_field], "description": "column metadata"}
         try:
-            response = requests.post(url, headers=headers, data=json.dumps(dataset_config))
+            response = get_session().post(url, headers=headers, data=json.dumps(dataset_config))
             if response.status_code in [200, 201, 202]:
                 response_obj = json.loads(response.text)
                 dataset_relative_id = response_obj["relativeId"]
+                self.invalidate_catalog()
                 self.logger.info("Dataset '{}' created with ID {}".format(dataset_name, dataset_relative_id))
             else:
                 self.logger.info("Problem creating dataset {}: {}".format(dataset_name, response.text))
@@ -325,7 +412,7 @@ class Unify:
                 continue
             attr_config = {"name": column_name, "description": "", "type": {"baseType": "STRING"}}
             try:
-                response = requests.post(url, headers=headers, data=json.dumps(attr_config))
+                response = get_session().post(url, headers=headers, data=json.dumps(attr_config))
                 if response.status_code not in [200, 201, 202]:
                     self.logger.error("Problem creating attribute {} for dataset {}".format(column_name, dataset_name))
                     return None
@@ -357,7 +444,7 @@ class Unify:
                 url = self._baseUrl + "/api/versioned/v1/datasets/{}/attributes".format(dataset_id)
                 headers = {"Content-Type": "application/json", "Accept": "application/json", "Authorization": self._basicCreds}
                 data = {"name": new_column_name, "description": "", "type": {"baseType": "STRING"}}
-                response = requests.post(url, headers=headers, data=json.dumps(data))
+                response = get_session().post(url, headers=headers, data=json.dumps(data))
                 if response.status_code != 201:
                     self.logger.error("Problem adding new attribute '{}' for dataset '{}'".format(
                         new_column_name, dataset_name
@@ -371,13 +458,17 @@ class Unify:
             return True
         return True
 
-    def update_dataset(self, dataset_name, primary_key_column, column_names, data):
+    def update_dataset(self, dataset_name, primary_key_column, column_names, data, fingerprint_path=None,
+                       **upload_options):
         """
         Update dataset with data from Snowflake. If dataset does not exist yet, create it.
         :param dataset_name: Name of dataset
         :param primary_key_column: Column to be used as the unique ID
         :param column_names: Names of fields
         :param data: Data to be updated or created. List of dictionary objects each as one row of data.
+        :param fingerprint_path: If set, upload only the delta against the record hashes saved in this file by
+        the last successful upload: new or changed records are upserted and removed keys are deleted.
+        :param upload_options: Options passed to upload_records (workers, batch_records, batch_bytes, ...)
         :return: Dataset ID if successful. Otherwise None
         """
         # check if dataset already exists
@@ -390,7 +481,8 @@ class Unify:
             self.logger.info("Dataset '{}' does not exist yet. Creating new dataset ...".format(dataset_name))
             dataset_relative_id = self.create_dataset(dataset_name, primary_key_column, column_names)
             if dataset_relative_id:
-                return self.update_dataset(dataset_name, primary_key_column, column_names, data)
+                return self.update_dataset(dataset_name, primary_key_column, column_names, data, fingerprint_path,
+                                           **upload_options)
             else:
                 self.logger.error("Failed to create dataset {}".format(dataset_name))
                 return None, None
@@ -399,49 +491,239 @@ class Unify:
             if not self.update_dataset_schema(dataset_name, column_names):
                 self.logger.error("Failed to update schema of {}".format(dataset_name))
                 return None, None
-            url = self._baseUrl + "/api/versioned/v1/datasets/{}:updateRecords?header=false".format(dataset_id)
-            headers = {"Content-Type": "application/json", "Accept": "application/json", "Authorization": self._basicCreds}
-            payload = []
-            for record in data:
-                if record is None:
-                    continue
-                payload.append({"action": "CREATE", "record": record, "recordId": record[primary_key_column]})
-                if len(payload) == 10000:
-                    try:
-                        response = requests.post(
-                            url,
-                            headers=headers,
-                            data="\n".join([json.dumps(command) for command in payload])
-                        )
-                        if response.status_code not in [200, 201, 202]:
-                            self.logger.error("Problem updating dataset {}: {}".format(dataset_name, response.text))
-                            return None, None
-                        self.logger.info("{} records updated".format(len(payload)))
-                    except Exception as e:
-                        self.logger.error(e)
-                        self.logger.error("Problem updating dataset {}".format(dataset_name))
-                        return None, None
-                    payload.clear()
-            if len(payload) > 0:
-                try:
-                    response = requests.post(
-                        url,
-                        headers=headers,
-                        data="\n".join([json.dumps(command) for command in payload])
-                    )
-                    if response.status_code not in [200, 201, 202]:
-                        self.logger.error("Problem updating dataset {}: {}".format(dataset_name, response.text))
-                        return None, None
-                    self.logger.info("{} records updated".format(len(payload)))
-                except Exception as e:
-                    self.logger.error(e)
-                    self.logger.error("Problem updating dataset {}".format(dataset_name))
+            if fingerprint_path is None:
+                commands = (
+                    {"action": "CREATE", "record": record, "recordId": record[primary_key_column]}
+                    for record in data if record is not None
+                )
+                if not self.upload_records(dataset_id, dataset_name, commands, **upload_options):
                     return None, None
+            else:
+                previous = self._load_fingerprints(fingerprint_path, dataset_id)
+                current = {}
+                state = {"complete": True, "changed": 0, "deleted": 0}
+                commands = self._delta_commands(data, primary_key_column, previous, current, state)
+                if not self.upload_records(dataset_id, dataset_name, commands, **upload_options):
+                    return None, None
+                self.logger.info("Delta upload of '{}': {} records, {} upserted, {} deleted".format(
+                    dataset_name, len(current), state["changed"], state["deleted"]
+                ))
+                # a partially read file would turn the unread keys into deletes on the next run
+                if state["complete"]:
+                    self._save_fingerprints(fingerprint_path, dataset_id, current)
+                else:
+                    self.logger.error("'{}' was not read completely. Fingerprints are not saved".format(dataset_name))
+            # lastModified of the dataset has changed
+            self.invalidate_catalog()
             self.logger.info("Dataset '{}' with ID {} updated".format(dataset_name, dataset_id))
             return dataset_id, None
         else:
             return None, None
 
+    def _get_key_attribute(self, dataset_name):
+        """
+        Get the key attribute of a dataset
+        :param dataset_name: Name of dataset
+        :return: Tuple of (dataset ID, key attribute name) if successful. Otherwise (dataset ID, None)
+        """
+        dataset_id = self.get_dataset_id(dataset_name)
+        dataset = self.get_dataset_by_id(dataset_id) if dataset_id is not None else None
+        if dataset is None or len(dataset.get("keyAttributeNames", [])) == 0:
+            self.logger.error("Failed to get the key attribute of dataset {}".format(dataset_name))
+            return dataset_id, None
+        return dataset_id, dataset["keyAttributeNames"][0]
+
+    def get_record_ids(self, dataset_name, group):
+        """
+        Read the record IDs of a dataset, grouped by a function of the record
+        :param dataset_name: Name of dataset
+        :param group: Function that takes a record and returns its group, or None to leave the record out
+        :return: Dictionary of group to list of record IDs if successful. Otherwise None
+        """
+        dataset_id, key_attribute = self._get_key_attribute(dataset_name)
+        if key_attribute is None:
+            return None
+        record_ids = {}
+        for record in self.stream_dataset(dataset_name):
+            if record is None:
+                self.logger.error("Failed to read record IDs from dataset {}".format(dataset_name))
+                return None
+            name = group(record)
+            if name is not None:
+                record_ids.setdefault(name, []).append(record[key_attribute])
+        return record_ids
+
+    def delete_record_ids(self, dataset_name, record_ids, **upload_options):
+        """
+        Delete records of a dataset by record ID
+        :param dataset_name: Name of dataset
+        :param record_ids: List of record IDs
+        :param upload_options: Options passed to upload_records (workers, batch_records, batch_bytes, ...)
+        :return: Number of deleted records if successful. Otherwise None
+        """
+        if len(record_ids) == 0:
+            return 0
+        dataset_id = self.get_dataset_id(dataset_name)
+        commands = ({"action": "DELETE", "recordId": record_id} for record_id in record_ids)
+        if dataset_id is None or not self.upload_records(dataset_id, dataset_name, commands, **upload_options):
+            self.logger.error("Failed to delete records from dataset {}".format(dataset_name))
+            return None
+        self.invalidate_catalog()
+        self.logger.info("{} records deleted from dataset {}".format(len(record_ids), dataset_name))
+        return len(record_ids)
+
+    @staticmethod
+    def _delta_commands(data, primary_key_column, previous, current, state):
+        """
+        Generate updateRecords commands for the records that differ from the previous fingerprints
+        :param data: Records
+        :param primary_key_column: Column used as the unique ID
+        :param previous: Fingerprints of the last upload (record ID -> hash)
+        :param current: Filled with the fingerprints of this upload
+        :param state: Filled with "complete", "changed" and "deleted"
+        :return: Iterator of updateRecords commands
+        """
+        for record in data:
+            if record is None:
+                state["complete"] = False
+                continue
+            record_id = record[primary_key_column]
+            digest = hashlib.md5(json.dumps(record, sort_keys=True).encode("utf-8")).hexdigest()
+            current[record_id] = digest
+            if previous.get(record_id) != digest:
+                state["changed"] += 1
+                yield {"action": "CREATE", "record": record, "recordId": record_id}
+        # deletes are only safe when the whole file has been read
+        if state["complete"]:
+            for record_id in previous:
+                if record_id not in current:
+                    state["deleted"] += 1
+                    yield {"action": "DELETE", "recordId": record_id}
+
+    def _load_fingerprints(self, fingerprint_path, dataset_id):
+        """
+        Load the record fingerprints saved by the last successful upload of the dataset
+        :param fingerprint_path: Fingerprint file
+        :param dataset_id: Dataset ID. Fingerprints of another (recreated) dataset are ignored.
+        :return: Dictionary of record ID to hash. Empty if there is no usable fingerprint file.
+        """
+        if not os.path.exists(fingerprint_path):
+            return {}
+        try:
+            with open(fingerprint_path, "r", encoding="utf-8") as f:
+                fingerprints = json.load(f)
+            if str(fingerprints["datasetId"]) != str(dataset_id):
+                self.logger.info("Fingerprints of {} belong to another dataset. Uploading all records".format(
+                    fingerprint_path
+                ))
+                return {}
+            return fingerprints["records"]
+        except Exception as e:
+            self.logger.error("Problem reading fingerprints {}: {}".format(fingerprint_path, e))
+            return {}
+
+    def _save_fingerprints(self, fingerprint_path, dataset_id, records):
+        """
+        Save record fingerprints after a successful upload
+        :param fingerprint_path: Fingerprint file
+        :param dataset_id: Dataset ID
+        :param records: Dictionary of record ID to hash
+        """
+        try:
+            if not os.path.exists(os.path.dirname(fingerprint_path)):
+                os.makedirs(os.path.dirname(fingerprint_path))
+            with open(fingerprint_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"datasetId": dataset_id, "records": records}, f)
+            os.replace(fingerprint_path + ".tmp", fingerprint_path)
+        except Exception as e:
+            self.logger.error("Problem writing fingerprints {}: {}".format(fingerprint_path, e))
+
+    def upload_records(self, dataset_id, dataset_name, commands, workers=4, batch_records=10000,
+                       batch_bytes=16 * 1024 * 1024, memory_budget=256 * 1024 * 1024, retries=3):
+        """
+        Post updateRecords commands in batches. The calling thread keeps reading and encoding commands while
+        worker threads post the finished batches, so parsing overlaps with network latency.
+        :param dataset_id: Dataset ID
+        :param dataset_name: Dataset name (for logging)
+        :param commands: Iterable of updateRecords commands ({"action", "recordId", "record"})
+        :param workers: Number of concurrent uploads
+        :param batch_records: Max number of commands per batch
+        :param batch_bytes: Max size of one batch body in bytes
+        :param memory_budget: Max bytes of encoded batches held in memory (queued and in flight)
+        :param retries: Number of retries per batch
+        :return: True if every batch was uploaded. Otherwise False.
+        """
+        url = self._baseUrl + "/api/versioned/v1/datasets/{}:updateRecords?header=false".format(dataset_id)
+        headers = {"Content-Type": "application/json", "Accept": "application/json", "Authorization": self._basicCreds}
+        batches = queue.Queue(maxsize=max(1, memory_budget // batch_bytes - workers - 1))
+        failed = threading.Event()
+        lock = threading.Lock()
+        progress = {"records": 0}
+
+        def post_batch(body, count):
+            for attempt in range(0, retries + 1):
+                if attempt > 0:
+                    time.sleep(2 ** (attempt - 1))
+                try:
+                    response = get_session().post(url, headers=headers, data=body)
+                    if response.status_code in [200, 201, 202]:
+                        with lock:
+                            progress["records"] += count
+                            self.logger.info("{} records updated".format(progress["records"]))
+                        return True
+                    self.logger.error("Problem updating dataset {}: {}".format(dataset_name, response.text))
+                except Exception as e:
+                    self.logger.error(e)
+                    self.logger.error("Problem updating dataset {}".format(dataset_name))
+            return False
+
+        def worker():
+            while True:
+                batch = batches.get()
+                if batch is None:
+                    break
+                # after a failure keep draining so the reader never blocks on a full queue
+                if not failed.is_set() and not post_batch(*batch):
+                    failed.set()
+
+        threads = [threading.Thread(target=worker, daemon=True) for i in range(0, workers)]
+        for thread in threads:
+            thread.start()
+
+        lines = []
+        size = 0
+        try:
+            for command in commands:
+                if failed.is_set():
+                    break
+                # encode once here so batch_bytes and memory_budget count the bytes actually posted
+                line = json.dumps(command).encode("utf-8")
+                if len(lines) > 0 and size + len(line) + 1 > batch_bytes:
+                    batches.put((b"\n".join(lines), len(lines)))
+                    lines = []
+                    size = 0
+                lines.append(line)
+                size += len(line) + 1
+                if len(lines) >= batch_records:
+                    batches.put((b"\n".join(lines), len(lines)))
+                    lines = []
+                    size = 0
+            if len(lines) > 0 and not failed.is_set():
+                batches.put((b"\n".join(lines), len(lines)))
+        except Exception as e:
+            self.logger.error(e)
+            failed.set()
+        finally:
+            for thread in threads:
+                batches.put(None)
+            for thread in threads:
+                thread.join()
+
+        if failed.is_set():
+            self.logger.error("Failed to upload records to dataset {}".format(dataset_name))
+            return False
+        return True
+
     def get_input_datasets_for_project(self, project_id):
         """
         Get list of input datasets for project
@@ -451,7 +733,7 @@ class Unify:
         url = self._baseUrl + "/api/versioned/v1/projects/{}/inputDatasets".format(project_id)
         headers = {"Accept": "application/json", "Authorization": self._basicCreds}
         try:
-            response = requests.get(url, headers=headers)
+            response = get_session().get(url, headers=headers)
             if response.status_code == 200:
                 return json.loads(response.text)
             else:
@@ -471,7 +753,7 @@ class Unify:
         url = self._baseUrl + "/api/versioned/v1/projects/{}/inputDatasets".format(project_id)
         headers = {"Content-Type": "application/json", "Accept": "application/json", "Authorization": self._basicCreds}
         try:
-            response = requests.post(url+"?id={}".format(dataset_id), headers=headers)
+            response = get_session().post(url+"?id={}".format(dataset_id), headers=headers)
             if response.status_code != 204:
                 self.logger.error(response.text)
                 self.logger.error("Problem adding dataset {} to project {}".format(dataset_id, project_id))
@@ -507,7 +789,7 @@ class Unify:
         #          "unifiedAttributeName": "ODS_SRC_SYSTEM_ID"}
         for attribute in attributes:
             try:
-                response = requests.post(url, headers=headers, data=json.dumps(
+                response = get_session().post(url, headers=headers, data=json.dumps(
                     {
                         "inputDatasetName": dataset_name,
                         "inputAttributeName": attribute,
@@ -556,7 +838,7 @@ class Unify:
                       "/api/recipe/modules/{}/job/indexDraft".format(gr_module_id)
                 headers = {"Content-Type": "application/json", "Accept": "application/json", "Authorization": self._basicCreds}
                 try:
-                    response = requests.post(url, headers=headers)
+                    response = get_session().post(url, headers=headers)
                     if response.status_code == 200:
                         response_obj = json.loads(response.text)
                         if response_obj["documentId"] is None:
@@ -587,7 +869,7 @@ class Unify:
                       "/api/recipe/modules/{}/publish".format(gr_module_id)
                 headers = {"Content-Type": "application/json", "Accept": "application/json", "Authorization": self._basicCreds}
                 try:
-                    response = requests.post(url, headers=headers)
+                    response = get_session().post(url, headers=headers)
                     if response.status_code == 200:
                         return True
                     else:
@@ -606,10 +888,8 @@ class Unify:
         :param gr_project_name: GR Project name
         :return: True if successful. Otherwise False.
         """
-        all_datasets = self.get_datasets()
-        gr_dataset = [dataset for dataset in all_datasets if dataset["name"] == gr_project_name + "_golden_records"]
-        if len(gr_dataset) == 1:
-            gr_dataset_id = gr_dataset[0]["id"].split("/")[-1]
+        gr_dataset_id = self.get_dataset_id(gr_project_name + "_golden_records")
+        if gr_dataset_id is not None:
             gr_dataset_details = self.get_dataset_by_id(gr_dataset_id)
             export_config = {}
             export_config["columns"] = gr_dataset_details["data"]["fields"]
@@ -625,7 +905,7 @@ class Unify:
             url = self._baseUrl + "/api/export"
             headers = {"Content-Type": "application/json", "Accept": "application/json", "Authorization": self._basicCreds}
             try:
-                response = requests.post(url, headers=headers, data=json.dumps(export_config))
+                response = get_session().post(url, headers=headers, data=json.dumps(export_config))
                 if response.status_code == 200:
                     response_obj = json.loads(response.text)
                     job_id = response_obj["data"]["jobId"]
@@ -646,14 +926,12 @@ class Unify:
         :return: Stream of records in JSON string
         """
         self.logger.info("Streaming golden records from Unify for project '{}'".format(gr_project_name))
-        all_datasets = self.get_datasets()
-        gr_dataset = [dataset for dataset in all_datasets if dataset["name"] == gr_project_name + "_golden_records"]
-        if len(gr_dataset) == 1:
-            gr_dataset_id = gr_dataset[0]["id"].split("/")[-1]
+        gr_dataset_id = self.get_dataset_id(gr_project_name + "_golden_records")
+        if gr_dataset_id is not None:
             url = self._baseUrl + "/api/versioned/v1/datasets/{}/records".format(gr_dataset_id)
             headers = {"Accept": "application/json", "Authorization": self._basicCreds}
             try:
-                response = requests.get(url, headers=headers, stream=True)
+                response = get_session().get(url, headers=headers, stream=True)
                 if response.status_code == 200:
                     for line in response.iter_lines(decode_unicode=True):
                         if line:
@@ -681,15 +959,13 @@ class Unify:
         :return: Stream of records in JSON string
         """
         self.logger.info("Streaming records from Unify for dataset '{}'".format(dataset_name))
-        all_datasets = self.get_datasets()
-        dataset = [dataset for dataset in all_datasets if dataset["name"] == dataset_name]
-        if len(dataset) == 1:
-            dataset_id = dataset[0]["id"].split("/")[-1]
+        dataset_id = self.get_dataset_id(dataset_name)
+        if dataset_id is not None:
             url = self._baseUrl + "/api/versioned/v1/datasets/{}/records".format(dataset_id)
             headers = {"Accept": "application/json", "Authorization": self._basicCreds}
             try:
                 idx = 0
-                response = requests.get(url, headers=headers, stream=True)                
+                response = get_session().get(url, headers=headers, stream=True)                
                 if response.status_code == 200:
                     for line in response.iter_lines(decode_unicode=True):
                         if line:                            
@@ -722,14 +998,12 @@ class Unify:
         :return: Stream of records in JSON string
         """
         self.logger.info("Streaming golden records from Unify for project '{}'".format(project_name))
-        all_datasets = self.get_datasets()
-        gr_dataset = [dataset for dataset in all_datasets if dataset["name"] == project_name + " - Golden Record"]
-        if len(gr_dataset) == 1:
-            gr_dataset_id = gr_dataset[0]["id"].split("/")[-1]
+        gr_dataset_id = self.get_dataset_id(project_name + " - Golden Record")
+        if gr_dataset_id is not None:
             url = self._baseUrl + "/api/versioned/v1/datasets/{}/records".format(gr_dataset_id)
             headers = {"Accept": "application/json", "Authorization": self._basicCreds}
             try:
-                response = requests.get(url, headers=headers, stream=True)
+                response = get_session().get(url, headers=headers, stream=True)
                 if response.status_code == 200:
                     for line in response.iter_lines(decode_unicode=True):
                         if line:
@@ -764,7 +1038,7 @@ class Unify:
                 url = self._baseUrl + "/api/recipe/recipes/{}/run/trainPredictCluster".format(dedup_recipe_id)
                 headers = {"Content-Type": "application/json", "Accept": "application/json", "Authorization": self._basicCreds}
                 try:
-                    response = requests.post(url, headers=headers)
+                    response = get_session().post(url, headers=headers)
                     if response.status_code == 201:
                         response_obj = json.loads(response.text)
                         job_id = response_obj["documentId"]["id"]
@@ -888,7 +1162,7 @@ class Unify:
             trial = 1
             while trial <= NUM_TRIALS:
                 try:
-                    response = requests.get(url, headers=headers, stream=True,
+                    response = get_session().get(url, headers=headers, stream=True,
                                             data='\n'.join(persistent_cluster_ids[lower_index:lower_index+BATCH_SIZE])
                                             )
                     if response.status_code not in [200, 201, 202]:
@@ -937,7 +1211,7 @@ class Unify:
             trial = 1
             while trial <= NUM_TRIALS:
                 try:
-                    response = requests.post(url, headers=headers, stream=True,
+                    response = get_session().post(url, headers=headers, stream=True,
                                              data='"' + '"\n"'.join(persistent_cluster_ids[lower_index:lower_index+BATCH_SIZE]) + '"'
                                              )                    
                     if response.status_code not in [200, 201, 202]:
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# the modules import each other by file name, with their own directories on sys.path
+root_path = os.path.abspath(os.path.dirname(os.path.realpath(__file__)) + '/..')
+for path in ['/src', '/pnd', '/pnd/config', '/pnd/data']:
+    if root_path + path not in sys.path:
+        sys.path.append(root_path + path)
@@ -0,0 +1,118 @@
+import re
+import csv
+import json
+import random
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+np = pytest.importorskip('numpy')
+
+from column_profiler import ColumnProfiler
+
+
+def profile_by_loop(path, top_n=100):
+    # the per column / per value loop of DataPreprocessor.process_local_files that ColumnProfiler replaces,
+    # with every value read as text
+    df = pd.read_csv(path, delimiter=',', quotechar='"', escapechar='\\', index_col=None, dtype=str)
+    df = df.apply(lambda x: x.str.strip())
+    df = df.replace(r'^\s*$', np.nan, regex=True)
+    profiles = []
+    for column_name in list(df):
+        values_count = df[column_name].value_counts(normalize=True, dropna=True)
+        top_values = values_count.index.tolist()
+        keys = set()
+        for phrase in top_values:
+            try:
+                object_content = json.loads(phrase)
+                if type(object_content) is list and type(object_content[0]) is dict:
+                    keys = keys.union(set(object_content[0].keys()))
+                elif type(object_content) is dict:
+                    keys = keys.union(set(object_content.keys()))
+            except Exception:
+                continue
+        profile = {'column_name': column_name, 'keys': keys, 'unique': len(df) == df[column_name].nunique()}
+        if len(keys) == 0:
+            top_n_values = [str(item).replace('"', '') for item in top_values[:top_n]]
+            top_n_values_freq = values_count.nlargest(top_n).to_dict()
+            patterns_freq = {}
+            for value in top_n_values_freq:
+                pattern = re.sub(r'[a-zA-Z]', 'S', str(value))
+                pattern = re.sub(r'[0-9]', 'N', pattern)
+                pattern = re.sub(r'[\u3131-\uD79D]', 'K', pattern)
+                patterns_freq[pattern] = patterns_freq.get(pattern, 0.) + float(top_n_values_freq[value])
+            values = [value.strip() for value in top_n_values]
+            types = []
+            for name, regex in ColumnProfiler._business_types:
+                if any(re.search(regex, value, re.IGNORECASE) for value in values):
+                    types.append(name)
+            profile.update({
+                'top_n_values': set(top_n_values),
+                'top_n_values_freq': top_n_values_freq,
+                'patterns_freq': patterns_freq,
+                'business_type': ' '.join(types),
+                'length': set(len(value) for value in values if len(value) > 0)
+            })
+        profiles.append(profile)
+    return profiles
+
+
+def comparable(profile):
+    # fields built from sets have no fixed order
+    result = {'column_name': profile['column_name'], 'keys': set(profile['keys'].split()), 'unique': profile['unique']}
+    if profile['top_n_values_freq'] != '':
+        result.update({
+            'top_n_values': set(profile['top_n_values'].split(', ')) if profile['top_n_values'] != '' else set(),
+            'top_n_values_freq': json.loads(profile['top_n_values_freq']),
+            'patterns_freq': json.loads(profile['patterns_freq']),
+            'business_type': profile['business_type'],
+            'length': set(int(length) for length in profile['length'].split())
+        })
+    return result
+
+
+@pytest.fixture
+def sample_file(tmp_path):
+    rand = random.Random(1)
+    words = ['abc', '가나다', 'A1-2', ' x ', '3.5', '-12', '', ' ', '1.', 'NULL', 'a"b']
+    path = str(tmp_path / 'DB.T.csv')
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL, escapechar='\\', doublequote=False)
+        writer.writerow(['ID', 'NAME', 'CODE', 'JS', 'AMT', 'EMPTY'])
+        for i in range(500):
+            writer.writerow([i, rand.choice(words), 'C{:03d}'.format(rand.randint(0, 30)),
+                             rand.choice(['{"a": 1, "b": 2}', '[{"k": 1}]', 'x']), rand.randint(1, 50), ''])
+    return path
+
+
+@pytest.mark.parametrize('chunk_size', [100000, 70])
+def test_profile_matches_loop(sample_file, chunk_size):
+    # top_n above the number of distinct values, since ties at the top_n cut-off may be ordered differently
+    profiles = [comparable(profile) for profile in
+                ColumnProfiler(top_n=1000, chunk_size=chunk_size).profile(sample_file, 'utf-8')]
+    expected = profile_by_loop(sample_file, top_n=1000)
+    assert [profile['column_name'] for profile in profiles] == [profile['column_name'] for profile in expected]
+    for profile, expected_profile in zip(profiles, expected):
+        assert set(profile) == set(expected_profile)
+        for field in profile:
+            if field in ['top_n_values_freq', 'patterns_freq']:
+                # frequencies are summed in a different order
+                assert profile[field] == pytest.approx(expected_profile[field]), (profile['column_name'], field)
+            else:
+                assert profile[field] == expected_profile[field], (profile['column_name'], field)
+
+
+def test_profile_keeps_top_n_values(sample_file):
+    profile = ColumnProfiler(top_n=5).profile(sample_file, 'utf-8')[2]
+    assert profile['column_name'] == 'CODE'
+    assert len(json.loads(profile['top_n_values_freq'])) == 5
+    assert len(profile['top_n_values'].split(', ')) == 5
+
+
+def test_profile_of_header_only_file(tmp_path):
+    path = str(tmp_path / 'DB.H.csv')
+    with open(path, 'w') as f:
+        f.write('"A","B"\n')
+    profiles = ColumnProfiler().profile(path, 'utf-8')
+    assert [profile['column_name'] for profile in profiles] == ['A', 'B']
+    assert all(profile['top_n_values'] == '' and profile['unique'] for profile in profiles)
@@ -0,0 +1,75 @@
+import os
+import csv
+import json
+import time
+import logging
+from multiprocessing import Process, Queue, Event
+
+import pytest
+
+for module in ['pandas', 'numpy', 'cx_Oracle', 'chardet', 'pyhive', 'tamr_unify_client', 'requests', 'varyaml']:
+    pytest.importorskip(module)
+
+import data_multi_preprocessor
+from data_multi_preprocessor import DataMultiPreprocessor
+
+
+class FakeProfileManager(object):
+    def report_except(self, name):
+        pass
+
+
+def make_preprocessor(tmp_path, monkeypatch, rows):
+    # process_unify_dataset writes under <src>/../output, so point the module path at tmp_path
+    realpath = os.path.realpath
+    fake_file = str(tmp_path / 'src' / 'data_multi_preprocessor.py')
+    monkeypatch.setattr(os.path, 'realpath', lambda path, *args, **kwargs: fake_file if path == data_multi_preprocessor.__file__ else realpath(path, *args, **kwargs))
+    monkeypatch.setattr(os, 'cpu_count', lambda: 2)
+    # DataMultiPreprocessor without its token dictionary, Oracle and Unify config
+    preprocessor = DataMultiPreprocessor.__new__(DataMultiPreprocessor)
+    preprocessor._source_config = {'name': 'test', 'profileDatasetName': 'dataset'}
+    preprocessor.logger = logging.getLogger('DataMultiPreprocessor')
+    preprocessor.pnd_logger = logging.getLogger('DataMultiPreprocessor')
+    preprocessor._pm = FakeProfileManager()
+    preprocessor._profile_lines = lambda path_of_cache, cache=False, replay=False: (json.dumps({'No': i}) + '\n' for i in range(rows))
+    preprocessor._process_record = lambda line: json.loads(line)
+    return preprocessor
+
+
+def run_with_timeout(target, seconds=30):
+    proc = Process(target=lambda: os._exit(0 if target() else 1))
+    proc.start()
+    proc.join(seconds)
+    if proc.is_alive():
+        proc.terminate()
+        pytest.fail('process_unify_dataset did not return in {} seconds'.format(seconds))
+    return proc.exitcode == 0
+
+
+def test_process_unify_dataset_writes_in_input_order(tmp_path, monkeypatch):
+    preprocessor = make_preprocessor(tmp_path, monkeypatch, 50)
+    assert run_with_timeout(lambda: preprocessor.process_unify_dataset('unify', chunk_size=3))
+    with open(str(tmp_path / 'output' / 'dataset_profiled.csv')) as f:
+        assert [int(row['No']) for row in csv.DictReader(f)] == list(range(50))
+
+
+def test_process_unify_dataset_stops_workers_when_writer_dies(tmp_path, monkeypatch):
+    preprocessor = make_preprocessor(tmp_path, monkeypatch, 1000)
+    preprocessor.writer = lambda *args: os._exit(1)
+    assert not run_with_timeout(lambda: preprocessor.process_unify_dataset('unify', chunk_size=1))
+
+
+def test_worker_gives_up_on_a_full_queue_when_stopped(tmp_path, monkeypatch):
+    preprocessor = make_preprocessor(tmp_path, monkeypatch, 0)
+    in_queue = Queue()
+    out_queue = Queue(maxsize=1)
+    out_queue.put((-1, ''))
+    stop = Event()
+    in_queue.put((0, [json.dumps({'No': 0})]))
+    worker = Process(target=preprocessor.worker, args=(0, ['No'], in_queue, out_queue, stop))
+    worker.start()
+    time.sleep(0.5)
+    assert worker.is_alive()
+    stop.set()
+    worker.join(10)
+    assert not worker.is_alive() and worker.exitcode == 0
@@ -0,0 +1,64 @@
+import os
+import csv
+import logging
+
+import pytest
+
+for module in ['pandas', 'numpy', 'cx_Oracle', 'chardet', 'pyhive', 'tamr_unify_client', 'requests', 'varyaml']:
+    pytest.importorskip(module)
+
+from data_preprocessor import DataPreprocessor
+
+
+def make_preprocessor(tmp_path, names, processes):
+    input_folder = tmp_path / 'input'
+    output_folder = tmp_path / 'output'
+    input_folder.mkdir()
+    output_folder.mkdir()
+    for name in names:
+        (input_folder / 'DB.{}.csv'.format(name)).write_text('"A"\n"1"\n')
+    # DataPreprocessor without its token dictionary and Unify config
+    preprocessor = DataPreprocessor.__new__(DataPreprocessor)
+    preprocessor.input_folder = str(input_folder)
+    preprocessor.output_folder = str(output_folder)
+    preprocessor.logger = logging.getLogger('DataPreprocessor')
+    preprocessor._processes = processes
+
+    def profile_file(input_file):
+        table_name = os.path.basename(input_file)[3:-4]
+        if table_name == 'CRASH':
+            # the worker process dies without reporting the file
+            os._exit(1)
+        if table_name == 'ERROR':
+            raise ValueError('unreadable file')
+        return table_name, [{'table_name': table_name, 'column_name': 'A'}], ['A']
+    preprocessor._profile_file = profile_file
+    return preprocessor
+
+
+def written_tables(preprocessor):
+    with open(preprocessor.output_folder + '/table_column_metadata.csv', encoding='utf-8') as f:
+        return [row['table_name'] for row in csv.DictReader(f, escapechar='\\')]
+
+
+def test_process_local_files_writes_in_input_order(tmp_path):
+    preprocessor = make_preprocessor(tmp_path, ['T{}'.format(i) for i in range(8)], 3)
+    assert preprocessor.process_local_files()
+    input_files = sorted(os.listdir(preprocessor.input_folder))
+    assert sorted(written_tables(preprocessor)) == [name[3:-4] for name in input_files]
+
+
+@pytest.mark.parametrize('processes', [1, 3])
+def test_process_local_files_survives_a_crashed_worker(tmp_path, caplog, processes):
+    names = ['T{}'.format(i) for i in range(6)] + ['CRASH', 'ERROR']
+    preprocessor = make_preprocessor(tmp_path, names, processes)
+    assert preprocessor.process_local_files() is None
+    tables = written_tables(preprocessor)
+    if processes == 1:
+        # the only worker died: only the files before the crash were profiled
+        assert 'CRASH' not in tables
+    else:
+        # only the file of the crashed worker and the failed file are missing
+        assert sorted(tables) == ['T{}'.format(i) for i in range(6)]
+    failed = [record.getMessage() for record in caplog.records if record.getMessage().startswith('Failed to process')]
+    assert 'CRASH' in failed[-1] and 'ERROR' in failed[-1]
@@ -0,0 +1,123 @@
+import logging
+
+from data_sampler import DataSampler
+
+
+class FakeCursor:
+    def __init__(self, results):
+        self._results = results
+        self._rows = []
+        self.arraysize = 1
+
+    def execute(self, query):
+        result = self._results[query]
+        if isinstance(result, Exception):
+            raise result
+        self._rows = list(result)
+
+    def fetchmany(self, size=None):
+        rows, self._rows = self._rows[:2], self._rows[2:]
+        return rows
+
+
+class FakeConnection:
+    def __init__(self, results):
+        self._results = results
+
+    def cursor(self):
+        return FakeCursor(self._results)
+
+
+class FakeSampler(DataSampler):
+    """
+    DataSampler over canned query results (query -> rows, or the exception the query raises)
+    """
+    def __init__(self, results):
+        super().__init__()
+        self.logger = logging.getLogger('FakeSampler')
+        self.results = results
+        self.executed = []
+        self.files = {}
+
+    @staticmethod
+    def _is_ascii(s):
+        return all(ord(c) < 128 for c in s)
+
+    def get_sampled_data(self, output_dir, does_reload=False):
+        return True
+
+    def _acquire_connection(self, database):
+        return FakeConnection(self)
+
+    def _release_connection(self, database, conn, discard=False):
+        pass
+
+    def _write_to_file(self, database, table, data, output_dir):
+        self.files[database + '.' + table] = data
+
+    def __getitem__(self, query):
+        self.executed.append(query)
+        return self.results[query]
+
+
+def values_of(data):
+    return [value for i, value in data[1:]]
+
+
+def test_distinct_query():
+    assert DataSampler._distinct_query('T', ['A', 'B']) == \
+        'SELECT A, B, GROUPING(A), GROUPING(B), COUNT(*) FROM T GROUP BY GROUPING SETS ((A), (B))'
+
+
+def test_count_values_decodes_grouping_rows():
+    query = DataSampler._distinct_query('T', ['A', 'B'])
+    sampler = FakeSampler({query: [
+        # value of A, value of B, GROUPING(A), GROUPING(B), count
+        ('x', None, 0, 1, 3),
+        ('y', None, 0, 1, 1),
+        # NULL of A itself, grouped by A
+        (None, None, 0, 1, 2),
+        (None, 10, 1, 0, 4),
+        (None, 20, 1, 0, 2),
+        # no column grouped, e.g. a grand total
+        (None, None, 1, 1, 6),
+    ]})
+    counts = sampler._count_values('DB', 'T', ['A', 'B'])
+    assert counts == [{'x': 3, 'y': 1, None: 2}, {10: 4, 20: 2}]
+
+
+def test_table_distinct_values_writes_one_file_per_column():
+    query = DataSampler._distinct_query('T', ['A', 'B'])
+    sampler = FakeSampler({query: [
+        ('x', None, 0, 1, 1), ('y', None, 0, 1, 5), (' ', None, 0, 1, 9), (None, None, 0, 1, 2),
+        (None, 'b', 1, 0, 4),
+    ]})
+    assert sampler._get_table_distinct_values('DB', 'T', ['A', 'B'], '/tmp', top_k=1)
+    assert sampler.files['DB.T.A'][0] == ('primaryKey', 'A')
+    # blank and NULL values are left out, then the most frequent top_k are kept
+    assert values_of(sampler.files['DB.T.A']) == ['y']
+    assert values_of(sampler.files['DB.T.B']) == ['b']
+
+
+def test_table_distinct_values_falls_back_to_column_queries():
+    sampler = FakeSampler({
+        DataSampler._distinct_query('T', ['A', 'L', 'B']): Exception('ORA-00932: inconsistent datatypes'),
+        DataSampler._distinct_query('T', ['A']): [('x', 0, 1)],
+        DataSampler._distinct_query('T', ['L']): Exception('ORA-00932: inconsistent datatypes'),
+        DataSampler._distinct_query('T', ['B']): [('y', 0, 2)],
+    })
+    assert sampler._get_table_distinct_values('DB', 'T', ['A', 'L', 'B'], '/tmp')
+    assert sorted(sampler.files) == ['DB.T.A', 'DB.T.B']
+    # the combined query is not retried, the failing column is
+    assert sampler.executed.count(DataSampler._distinct_query('T', ['A', 'L', 'B'])) == 1
+    assert sampler.executed.count(DataSampler._distinct_query('T', ['L'])) == 3
+
+
+def test_table_distinct_values_fails_when_every_column_fails():
+    sampler = FakeSampler({
+        DataSampler._distinct_query('T', ['A', 'B']): Exception('failed'),
+        DataSampler._distinct_query('T', ['A']): Exception('failed'),
+        DataSampler._distinct_query('T', ['B']): Exception('failed'),
+    })
+    assert not sampler._get_table_distinct_values('DB', 'T', ['A', 'B'], '/tmp')
+    assert sampler.files == {}
@@ -0,0 +1,96 @@
+import pytest
+
+import except_rules
+from except_rules import ExceptRules
+
+
+def write_rules(path, name, text):
+    path.mkdir(parents=True, exist_ok=True)
+    (path / '{}.yaml'.format(name)).write_text(text, encoding='utf-8')
+
+
+@pytest.fixture
+def rules_path(tmp_path, monkeypatch):
+    # conf/except is resolved from the module path, move it under tmp_path
+    monkeypatch.setattr(except_rules, 'current_path', str(tmp_path / 'pnd' / 'data'))
+    path = tmp_path / 'pnd' / 'conf' / 'except'
+    write_rules(path, 'default', '\n'.join([
+        'tables: {}',
+        'columns:',
+        '  names: ["URL"]',
+        '  contains: ["RAWID"]',
+        '  prefixes: ["HEAD"]',
+        '  patterns: ["blob|clob"]',
+    ]))
+    write_rules(path, 'legacy', '\n'.join([
+        'tables:',
+        '  names: ["NAND_WTM"]',
+        '  contains: ["$"]',
+        '  patterns: ["_H_|_H$"]',
+    ]))
+    return path
+
+
+@pytest.mark.parametrize('table, expected', [
+    ('NAND_WTM', True),
+    ('NAND_WTM_2', False),
+    ('BIN$ABC', True),
+    ('LOT_H_INF', True),
+    ('LOT_H', True),
+    ('LOT_HX', False),
+])
+def test_except_table(rules_path, table, expected):
+    assert ExceptRules('legacy').except_table(table) == expected
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('URL', True),
+    ('URL_PATH', False),
+    ('EQP_RAWID', True),
+    ('HEADER', True),
+    ('SUBHEAD', False),
+    ('clob', True),
+])
+def test_except_column(rules_path, value, expected):
+    assert ExceptRules('legacy').except_column('T', 'C', value) == expected
+
+
+def test_source_rules_apply_only_to_their_source(rules_path):
+    assert not ExceptRules('mdm').except_table('NAND_WTM')
+    assert ExceptRules('mdm').except_column('T', 'C', 'URL')
+
+
+def test_rule_set_loads_its_own_directory(rules_path):
+    write_rules(rules_path / 'schema', 'default', 'columns:\n  names: ["COMMENT"]\n')
+    rules = ExceptRules('legacy', rule_set='schema')
+    assert rules.except_column('T', 'C', 'COMMENT')
+    assert not rules.except_column('T', 'C', 'URL')
+    assert not rules.except_table('NAND_WTM')
+
+
+def test_invalid_and_unknown_rules_are_skipped(rules_path):
+    write_rules(rules_path, 'mixed', 'columns:\n  patterns: ["(", "MODIFY"]\n  suffixes: ["_DT"]\n')
+    rules = ExceptRules('mixed')
+    assert rules.except_column('T', 'C', 'MODIFY_BY')
+    assert not rules.except_column('T', 'C', 'LOAD_DT')
+
+
+def test_matches_are_counted_per_rule(rules_path):
+    rules = ExceptRules('legacy')
+    for value in ['URL', 'URL', 'HEADER', 'NAME']:
+        rules.except_column('T', 'C', value)
+    rules.except_table('BIN$1')
+    assert rules.column_counts == {'names: URL': 2, 'prefixes: HEAD': 1}
+    assert rules.table_counts == {'contains: $': 1}
+
+
+def test_except_manager_keeps_its_original_rules():
+    # the shipped conf/except/schema rules of SchemaCompare, not the ProfileManager rules
+    rules = ExceptRules('legacy', rule_set='schema')
+    assert rules.except_table('LOT_HIST')
+    assert rules.except_table('SA_LOT')
+    assert not rules.except_table('LOT_SUMMARY')
+    assert not rules.except_table('TEMP_LOT')
+    assert not rules.except_column('T', 'C', 'COMMENT')
+    assert ExceptRules('legacy').except_table('TEMP_LOT')
+    assert ExceptRules('legacy').except_column('T', 'C', 'COMMENT')
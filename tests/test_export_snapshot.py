@@ -0,0 +1,87 @@
+import pytest
+
+import export_snapshot
+from export_snapshot import ExportSnapshot
+
+
+@pytest.fixture
+def snapshot(tmp_path, monkeypatch):
+    # snapshot/export is resolved from the module path, move it under tmp_path
+    monkeypatch.setattr(export_snapshot, 'current_path', str(tmp_path / 'pnd' / 'data'))
+    return ExportSnapshot('TEST_TABLE', ['id'])
+
+
+def test_diff_without_snapshot_upserts_every_row(snapshot):
+    rows = [{'id': 1, 'value': 'a'}, {'id': 2, 'value': 'b'}]
+    upserts, deletes, hashes = snapshot.diff(rows)
+    assert upserts == rows
+    assert deletes == []
+    assert set(hashes) == {snapshot.key(row) for row in rows}
+
+
+def test_diff_returns_changed_new_and_deleted_rows(snapshot):
+    snapshot.save(snapshot.diff([{'id': 1, 'value': 'a'}, {'id': 2, 'value': 'b'}, {'id': 3, 'value': 'c'}])[2])
+    upserts, deletes, hashes = snapshot.diff([{'id': 1, 'value': 'a'}, {'id': 2, 'value': 'B'}, {'id': 4, 'value': 'd'}])
+    assert upserts == [{'id': 2, 'value': 'B'}, {'id': 4, 'value': 'd'}]
+    assert deletes == [{'id': 3}]
+    assert len(hashes) == 3
+
+
+def test_diff_ignores_volatile_columns(snapshot):
+    snapshot.save(snapshot.diff([{'id': 1, 'value': 'a', 'create_dt': '2020-01-01', 'ver': 1}])[2])
+    upserts, deletes, hashes = snapshot.diff([{'id': 1, 'value': 'a', 'create_dt': '2020-01-02', 'ver': 2}])
+    assert upserts == []
+    assert deletes == []
+
+
+def test_diff_keeps_first_row_of_duplicate_keys(snapshot):
+    rows = [{'id': 1, 'value': 'a'}, {'id': 1, 'value': 'b'}]
+    upserts, deletes, hashes = snapshot.diff(rows)
+    assert upserts == [{'id': 1, 'value': 'a'}]
+    assert hashes == {snapshot.key(rows[0]): snapshot.hash(rows[0])}
+
+
+def test_unique_matches_diff_without_snapshot(snapshot):
+    rows = [{'id': 1, 'value': 'a'}, {'id': 2, 'value': 'b'}, {'id': 1, 'value': 'c'}]
+    unique_rows, hashes = snapshot.unique(rows)
+    upserts, deletes, diff_hashes = snapshot.diff(rows)
+    assert unique_rows == upserts
+    assert hashes == diff_hashes
+
+
+def test_composite_key_deletes_carry_every_key_column(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_snapshot, 'current_path', str(tmp_path / 'pnd' / 'data'))
+    snapshot = ExportSnapshot('TEST_VALUES', ['table_name', 'column_name'])
+    snapshot.save(snapshot.diff([{'table_name': 'T', 'column_name': 'C', 'value': 1}])[2])
+    upserts, deletes, hashes = snapshot.diff([])
+    assert deletes == [{'table_name': 'T', 'column_name': 'C'}]
+
+
+def test_save_load_and_invalidate(snapshot):
+    assert not snapshot.exists()
+    hashes = snapshot.diff([{'id': 1, 'value': 'a'}])[2]
+    snapshot.save(hashes)
+    assert snapshot.exists()
+    assert ExportSnapshot('TEST_TABLE', ['id']).load() == hashes
+    snapshot.invalidate()
+    assert not snapshot.exists()
+    assert snapshot.hashes is None
+
+
+def test_diff_returns_one_row_per_key_after_a_change(snapshot):
+    snapshot.save(snapshot.diff([{'id': 1, 'value': 'a'}])[2])
+    upserts, deletes, hashes = snapshot.diff([{'id': 1, 'value': 'b'}, {'id': 1, 'value': 'c'}])
+    assert upserts == [{'id': 1, 'value': 'b'}]
+    assert deletes == []
+
+
+@pytest.mark.parametrize('null_value', [None, ''])
+def test_null_key_rows_are_excluded_from_both_paths(snapshot, null_value):
+    rows = [{'id': 1, 'value': 'a'}, {'id': null_value, 'value': 'b'}]
+    unique_rows, hashes = snapshot.unique(rows)
+    upserts, deletes, diff_hashes = snapshot.diff(rows)
+    assert unique_rows == upserts == [{'id': 1, 'value': 'a'}]
+    assert hashes == diff_hashes == {snapshot.key(rows[0]): snapshot.hash(rows[0])}
+    snapshot.save(diff_hashes)
+    upserts, deletes, diff_hashes = snapshot.diff(rows)
+    assert upserts == [] and deletes == []
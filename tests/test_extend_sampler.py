@@ -0,0 +1,44 @@
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+for module in ['pandas', 'numpy', 'cx_Oracle', 'chardet', 'pyhive', 'tamr_unify_client', 'requests', 'varyaml']:
+    pytest.importorskip(module)
+
+import extend_sampler
+from http_session import TIMEOUT
+
+
+class FakeSession:
+    def __init__(self):
+        self.calls = []
+
+    def post(self, url, **kwargs):
+        self.calls.append((url, kwargs))
+        return SimpleNamespace(status_code=200, text='')
+
+
+def make_sampler(monkeypatch, profile_timeout):
+    # MixedSampler without its config files and connections
+    sampler = extend_sampler.MixedSampler.__new__(extend_sampler.MixedSampler)
+    sampler._MixedSampler__logger = logging.getLogger('MixedSampler')
+    sampler._url = 'http://df-connect:9030/api/jdbcIngest/profile'
+    sampler._basicCreds = 'BasicCreds abc'
+    sampler._jdbc_url = 'jdbc:tamr:oracle://db:1521;ServiceName=MIXED'
+    sampler._jdbc_user = 'user'
+    sampler._jdbc_password = 'pwd'
+    sampler._profileDatasetName = 'mixed_profile'
+    sampler._profile_timeout = profile_timeout
+    session = FakeSession()
+    monkeypatch.setattr(extend_sampler, 'get_session', lambda: session)
+    return sampler, session
+
+
+@pytest.mark.parametrize('profile_timeout, read_timeout', [(None, None), (14400, 14400)])
+def test_profile_forwards_profile_timeout(monkeypatch, profile_timeout, read_timeout):
+    sampler, session = make_sampler(monkeypatch, profile_timeout)
+    assert sampler.profile('MATL_A') is None
+    url, kwargs = session.calls[0]
+    assert url == sampler._url
+    assert kwargs['timeout'] == (TIMEOUT[0], read_timeout)
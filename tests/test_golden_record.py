@@ -0,0 +1,83 @@
+import random
+from types import SimpleNamespace
+
+import pytest
+
+for module in ['pandas', 'cx_Oracle', 'pyhive', 'tamr_unify_client', 'requests', 'varyaml']:
+    pytest.importorskip(module)
+
+import data_manager
+
+
+def join_by_loop(drafts, published, golden_records, overrides):
+    # the nested loop join get_golden_record replaces
+    dataset = [{"persistentId": row["persistentId"], "cluster_full_name": row["COLUMN_NAME_TOKENIZED_STD"], "column_name": row["COLUMN_NAME"]} for row in drafts]
+    clusters = [{"persistentId": row["persistentId"], "cluster_name": row["clusterName"]} for row in published]
+    aliases = [{"persistentId": row["persistentId"], "cluster_alias": row["value"]} for row in overrides]
+    alias_ids = [row["persistentId"] for row in aliases]
+    aliases += [{"persistentId": row["persistentId"], "cluster_alias": row["COLUMN_NAME_TOKENIZED"]} for row in golden_records if row["persistentId"] not in alias_ids]
+    result = []
+    for data in dataset:
+        for cluster in clusters:
+            if data["persistentId"] == cluster["persistentId"]:
+                data = {**data, **cluster}
+                break
+        for alias in aliases:
+            if data["persistentId"] == alias["persistentId"]:
+                data = {**data, **{"cluster_alias": str(alias["cluster_alias"]).strip()}}
+                break
+        if 'cluster_name' not in data:
+            data = {**data, **{"cluster_name": data["column_name"]}}
+        if 'cluster_alias' not in data:
+            data = {**data, **{"cluster_alias": ""}}
+        result.append(data)
+    return result
+
+
+def make_data_manager(monkeypatch, datasets):
+    versioned = SimpleNamespace(
+        get_golden_records_draft=lambda proj_nm: iter(datasets["drafts"]),
+        get_unified_dataset_dedup_published_clusters_with_data=lambda proj_nm: iter(datasets["published"]),
+        get_golden_records=lambda proj_nm: iter(datasets["golden_records"]),
+        get_golden_records_overrides=lambda proj_nm: iter(datasets["overrides"]))
+    monkeypatch.setattr(data_manager, 'ConfigManager', lambda name: SimpleNamespace(proj_nm='test'))
+    monkeypatch.setattr(data_manager, 'CustomUnify', lambda cm, logger_name: SimpleNamespace(versioned=versioned))
+    return data_manager.DataManager(SimpleNamespace(), 'test')
+
+
+def random_datasets(n):
+    rand = random.Random(1)
+    return {
+        "drafts": [{"persistentId": "p{}".format(rand.randrange(n)), "COLUMN_NAME_TOKENIZED_STD": "s{}".format(i), "COLUMN_NAME": "c{}".format(i)} for i in range(n)],
+        "published": [{"persistentId": "p{}".format(rand.randrange(n)), "clusterName": "n{}".format(i)} for i in range(3 * n)],
+        "golden_records": [{"persistentId": "p{}".format(rand.randrange(n)), "COLUMN_NAME_TOKENIZED": " g{} ".format(i)} for i in range(n // 2)],
+        "overrides": [{"persistentId": "p{}".format(rand.randrange(n)), "value": "o{}".format(i)} for i in range(n // 5)],
+    }
+
+
+def test_golden_record_matches_loop(monkeypatch):
+    datasets = random_datasets(300)
+    expected = join_by_loop(datasets["drafts"], datasets["published"], datasets["golden_records"], datasets["overrides"])
+    result = make_data_manager(monkeypatch, datasets).get_golden_record()
+    # same rows, same field order
+    assert [list(row.items()) for row in result] == [list(row.items()) for row in expected]
+
+
+def test_golden_record_alias_priority_and_defaults(monkeypatch):
+    datasets = {
+        "drafts": [{"persistentId": id, "COLUMN_NAME_TOKENIZED_STD": "std", "COLUMN_NAME": "col_" + id} for id in ["a", "b", "c"]],
+        "published": [{"persistentId": "a", "clusterName": "first"}, {"persistentId": "a", "clusterName": "second"}],
+        "golden_records": [{"persistentId": "a", "COLUMN_NAME_TOKENIZED": " golden "}, {"persistentId": "b", "COLUMN_NAME_TOKENIZED": " golden "}],
+        "overrides": [{"persistentId": "a", "value": "override"}],
+    }
+    result = make_data_manager(monkeypatch, datasets).get_golden_record()
+    assert [(row["cluster_name"], row["cluster_alias"]) for row in result] == [
+        ("first", "override"), ("col_b", "golden"), ("col_c", "")]
+
+
+def test_golden_record_returns_none_when_a_dataset_fails(monkeypatch):
+    def failed(proj_nm):
+        raise Exception("stream failed")
+    data_manager_ = make_data_manager(monkeypatch, random_datasets(10))
+    monkeypatch.setattr(data_manager_._DataManager__unify.versioned, 'get_golden_records', failed)
+    assert data_manager_.get_golden_record() is None
@@ -0,0 +1,56 @@
+import threading
+
+import pytest
+
+pytest.importorskip('pyhive')
+
+from hive2_sampler import Hive2Sampler
+
+
+class FakeConnection:
+    def __init__(self, database):
+        self.database = database
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def make_sampler(pool_size):
+    # Hive2Sampler without its source config and HS2 connections
+    sampler = Hive2Sampler.__new__(Hive2Sampler)
+    sampler._idle_connections = []
+    sampler._max_idle = pool_size
+    sampler._pool_lock = threading.Lock()
+    sampler._get_connection = FakeConnection
+    return sampler
+
+
+def test_idle_connections_are_reused_per_database():
+    sampler = make_sampler(4)
+    conn = sampler._acquire_connection('DB1')
+    sampler._release_connection('DB1', conn)
+    assert sampler._acquire_connection('DB2') is not conn
+    assert sampler._acquire_connection('DB1') is conn
+
+
+def test_idle_connections_are_capped_over_all_databases():
+    sampler = make_sampler(2)
+    conns = [sampler._acquire_connection('DB{}'.format(i)) for i in range(4)]
+    for i, conn in enumerate(conns):
+        sampler._release_connection('DB{}'.format(i), conn)
+    # the oldest idle connections are closed
+    assert [conn.closed for conn in conns] == [True, True, False, False]
+    assert [database for database, conn in sampler._idle_connections] == ['DB2', 'DB3']
+
+
+def test_open_connections_sets_the_cap():
+    sampler = make_sampler(4)
+    conns = [sampler._acquire_connection('DB') for i in range(4)]
+    for conn in conns:
+        sampler._release_connection('DB', conn)
+    sampler._open_connections(1)
+    assert [conn.closed for conn in conns] == [True, True, True, False]
+    sampler._close_connections()
+    assert all(conn.closed for conn in conns)
+    assert sampler._idle_connections == []
@@ -0,0 +1,21 @@
+import pytest
+
+from retry_queue import classify_error, TRANSIENT, PERMANENT
+
+
+@pytest.mark.parametrize('status_code, message, expected', [
+    # the request itself failed: connection errors are retried
+    (None, "HTTPConnectionPool(host='df-connect', port=9030): Max retries exceeded", TRANSIENT),
+    (None, None, TRANSIENT),
+    # a read timeout may still be profiling on df-connect, so it is not sent again
+    (None, "HTTPConnectionPool(host='df-connect', port=9030): Read timed out. (read timeout=600)", PERMANENT),
+    (500, "Internal Server Error", TRANSIENT),
+    (503, None, TRANSIENT),
+    (400, "Bad Request", PERMANENT),
+    (404, "Not Found", PERMANENT),
+    # source database errors fail again on retry, whatever the status
+    (500, "java.sql.SQLSyntaxErrorException: ORA-00942: table or view does not exist", PERMANENT),
+    (None, "ORA-01017: invalid username/password", PERMANENT),
+])
+def test_classify_error(status_code, message, expected):
+    assert classify_error(status_code, message) == expected
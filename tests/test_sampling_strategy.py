@@ -0,0 +1,68 @@
+import pytest
+
+from sampling_strategy import get_sampling_strategy, FullTableSampling, RandomSortSampling, BucketSampling, \
+    PercentSampling, RowCountSampling
+
+data_query = 'SELECT * FROM {}'
+
+
+def test_full_table_sampling():
+    assert FullTableSampling('hive').query(data_query, 'T') == 'SELECT * FROM T'
+    assert FullTableSampling('oracle').query(data_query, 'T') == 'SELECT * FROM T'
+
+
+def test_random_sort_sampling():
+    assert RandomSortSampling('hive', 100).query(data_query, 'T') == \
+        'SELECT * FROM T distribute by rand() sort by rand() limit 100'
+    assert RandomSortSampling('oracle', 100).query(data_query, 'T') == \
+        'SELECT * FROM (SELECT * FROM T ORDER BY dbms_random.value) WHERE ROWNUM <= 100'
+
+
+@pytest.mark.parametrize('row_cnt, expected', [
+    (None, 'SELECT * FROM T TABLESAMPLE(BUCKET 1 OUT OF 100 ON rand()) limit 1000'),
+    (50000, 'SELECT * FROM T TABLESAMPLE(BUCKET 1 OUT OF 50 ON rand()) limit 1000'),
+    # one bucket would be the whole table
+    (1500, 'SELECT * FROM T limit 1000'),
+])
+def test_bucket_sampling(row_cnt, expected):
+    assert BucketSampling('hive', 1000).query(data_query, 'T', row_cnt) == expected
+
+
+def test_percent_sampling():
+    assert PercentSampling('hive', 1000, 5).query(data_query, 'T') == \
+        'SELECT * FROM T TABLESAMPLE(5 PERCENT) limit 1000'
+    assert PercentSampling('oracle', 1000, 0.5).query(data_query, 'T') == \
+        'SELECT * FROM (SELECT * FROM T SAMPLE(0.5)) WHERE ROWNUM <= 1000'
+    assert PercentSampling('oracle', 1000, 2, block=True).query(data_query, 'T') == \
+        'SELECT * FROM (SELECT * FROM T SAMPLE BLOCK(2)) WHERE ROWNUM <= 1000'
+
+
+@pytest.mark.parametrize('row_cnt, expected', [
+    (None, 'SELECT * FROM (SELECT * FROM T) WHERE ROWNUM <= 1000'),
+    (800, 'SELECT * FROM (SELECT * FROM T) WHERE ROWNUM <= 1000'),
+    # 1000 rows * 1.5 oversample out of 1,000,000
+    (1000000, 'SELECT * FROM (SELECT * FROM T SAMPLE(0.15)) WHERE ROWNUM <= 1000'),
+    (1200, 'SELECT * FROM (SELECT * FROM T) WHERE ROWNUM <= 1000'),
+    # Oracle SAMPLE does not accept less than 0.000001
+    (10 ** 15, 'SELECT * FROM (SELECT * FROM T SAMPLE(0.000001)) WHERE ROWNUM <= 1000'),
+])
+def test_row_count_sampling(row_cnt, expected):
+    assert RowCountSampling('oracle', 1000).query(data_query, 'T', row_cnt) == expected
+
+
+@pytest.mark.parametrize('config, dialect, cls', [
+    ({}, 'hive', FullTableSampling),
+    ({'samplingStrategy': 'rand_sort'}, 'oracle', RandomSortSampling),
+    ({'samplingStrategy': 'bucket'}, 'hive', BucketSampling),
+    ({'samplingStrategy': 'percent', 'samplePercent': 3}, 'oracle', PercentSampling),
+    ({'samplingStrategy': 'row_count_block'}, 'oracle', RowCountSampling),
+])
+def test_get_sampling_strategy(config, dialect, cls):
+    assert type(get_sampling_strategy(config, dialect)) == cls
+
+
+def test_get_sampling_strategy_rejects_unknown_names():
+    with pytest.raises(ValueError):
+        get_sampling_strategy({'samplingStrategy': 'bucket'}, 'oracle')
+    with pytest.raises(ValueError):
+        get_sampling_strategy({'samplingStrategy': 'unknown'}, 'hive')
@@ -0,0 +1,49 @@
+import pytest
+
+import schema_snapshot
+from schema_snapshot import SchemaSnapshot
+
+
+@pytest.fixture
+def snapshot(tmp_path, monkeypatch):
+    # snapshot/schema is resolved from the module path, move it under tmp_path
+    monkeypatch.setattr(schema_snapshot, 'current_path', str(tmp_path / 'pnd' / 'data'))
+    return SchemaSnapshot('legacy')
+
+
+def columns(table, *names):
+    return [{'TABLE_NAME': table, 'COLUMN_NAME': name, 'TABLE_COLUMN': '{}-{}'.format(table, name)} for name in names]
+
+
+def test_changed_without_snapshot_returns_every_table(snapshot):
+    assert not snapshot.exists()
+    assert snapshot.changed({'B': 'f2', 'A': 'f1'}) == (['A', 'B'], [])
+
+
+def test_changed_returns_new_changed_and_deleted_tables(snapshot):
+    snapshot.update('A', 'f1', columns('A', 'X'))
+    snapshot.update('B', 'f2', columns('B', 'X'))
+    snapshot.update('C', 'f3', columns('C', 'X'))
+    changed_tables, deleted_tables = snapshot.changed({'A': 'f1', 'B': 'f2-changed', 'D': 'f4'})
+    assert changed_tables == ['B', 'D']
+    assert deleted_tables == ['C']
+
+
+def test_save_and_load(snapshot):
+    snapshot.update('A', 'f1', columns('A', 'X', 'Y'))
+    snapshot.save()
+    loaded = SchemaSnapshot('legacy')
+    assert loaded.exists()
+    assert loaded.tables == snapshot.tables
+    assert loaded.changed({'A': 'f1'}) == ([], [])
+    # the snapshot of another consumer of the same source is kept apart
+    assert not SchemaSnapshot('legacy_profile').exists()
+
+
+def test_remove_and_columns(snapshot):
+    snapshot.update('A', 'f1', columns('A', 'X', 'Y'))
+    snapshot.update('B', 'f2', columns('B', 'Z'))
+    snapshot.remove('B')
+    snapshot.remove('missing')
+    assert snapshot.table_columns() == {'A': {'A-X', 'A-Y'}}
+    assert snapshot.rows() == columns('A', 'X', 'Y')
@@ -0,0 +1,59 @@
+import os
+import re
+import csv
+import random
+
+import pytest
+
+from token_normalizer import TokenNormalizer
+
+root_path = os.path.abspath(os.path.dirname(os.path.realpath(__file__)) + '/..')
+
+
+def normalize_by_loop(token_dictionary, column_name):
+    # the re.sub loop TokenNormalizer replaces
+    result = column_name.lower()
+    if token_dictionary is None:
+        return result
+    for token in token_dictionary.keys():
+        regex_token = re.compile(r'\b{}\b'.format(token), re.IGNORECASE)
+        result = regex_token.sub(token_dictionary[token], result)
+    return result
+
+
+def read_token_dict():
+    result = {}
+    with open(root_path + '/token_dict.csv', encoding='utf-8') as input_file:
+        for row in csv.DictReader(input_file):
+            if row['full_words'] != '':
+                result[row['token']] = row['full_words']
+    return result
+
+
+@pytest.mark.parametrize('token_dictionary, column_name', [
+    (None, 'Cust NM'),
+    ({}, 'Cust NM'),
+    ({'cust': 'customer', 'nm': 'name'}, 'CUST NM'),
+    ({'cust': 'customer', 'nm': 'name'}, 'cust_nm custnm'),
+    # a replacement is rewritten again by a later entry, but not by an earlier one
+    ({'no': 'number', 'number': 'num'}, 'no'),
+    ({'number': 'num', 'no': 'number'}, 'no'),
+    ({'a': 'a b', 'b': 'c'}, 'a b a'),
+    ({'id': ''}, 'user id'),
+    # tokens that are not plain words keep the regex substitution
+    ({'e-mail': 'email', 'addr': 'address'}, 'E-Mail addr'),
+])
+def test_normalize_matches_loop(token_dictionary, column_name):
+    assert TokenNormalizer(token_dictionary).normalize(column_name) == normalize_by_loop(token_dictionary, column_name)
+
+
+def test_normalize_matches_loop_with_repo_dictionary():
+    token_dictionary = read_token_dict()
+    normalizer = TokenNormalizer(token_dictionary)
+    tokens = list(token_dictionary.keys()) + ['x', 'col', '1', 'ABC']
+    rand = random.Random(0)
+    for i in range(500):
+        column_name = ' '.join(rand.choice(tokens) for j in range(rand.randint(1, 5)))
+        if rand.random() < 0.5:
+            column_name = column_name.upper()
+        assert normalizer.normalize(column_name) == normalize_by_loop(token_dictionary, column_name)